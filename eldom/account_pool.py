@@ -0,0 +1,259 @@
+import asyncio
+import random
+from collections import deque
+
+import aiohttp
+
+from .constants import DEFAULT_POLL_CONCURRENCY
+from .fanout import gather_bounded, stream_bounded
+from .models import AccountDeviceResult
+from .session import DEFAULT_TIMEOUT, create_connector, create_session
+
+
+class _Account:
+    __slots__ = ("key", "create", "login", "cookie_jar", "client", "logged_in")
+
+    def __init__(self, key, create, login, cookie_jar):
+        self.key = key
+        self.create = create
+        self.login = login
+        self.cookie_jar = cookie_jar
+        self.client = None
+        self.logged_in = False
+
+
+class AccountPool:
+    """
+    Many authenticated clients, for devices spread across many accounts.
+
+    Every account has its own client and session, so that its cookies and token stay separate,
+    but all sessions share one connection pool. `concurrency` caps the connections, and with
+    them the requests in flight, across all accounts.
+
+    Logins are started `login_interval` seconds apart instead of all at once. Tokens of the
+    `iot.myeldom.com` accounts are refreshed a random time between `refresh_margin` and
+    `refresh_margin + refresh_jitter` seconds before they expire, so that accounts that logged
+    in together don't refresh together.
+
+    Polls go through the devices of the accounts in turns, one device per account at a time,
+    so an account with many devices doesn't delay the others until all its devices are done.
+
+        pool = AccountPool(concurrency=64)
+        pool.add_iot_account("alice@example.com", "secret")
+        pool.add_eldom_account("bob@example.com", "secret")
+        async with pool:
+            async for result in pool.poll():
+                print(result.account, result.device, result.result)
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_POLL_CONCURRENCY,
+        timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+        login_interval: float = 0.1,
+        refresh_margin: float = 60,
+        refresh_jitter: float = 240,
+    ):
+        """
+        Initialize the account pool.
+
+        :param concurrency: The maximum number of requests in flight across all accounts, i.e. the size of the shared connection pool.
+        :param timeout: The default timeouts of the requests.
+        :param login_interval: How many seconds apart the logins of the accounts are started.
+        :param refresh_margin: The minimum number of seconds before the expiry of a token to start refreshing it.
+        :param refresh_jitter: The maximum number of seconds added to the refresh margin of each account at random.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, got {concurrency}")
+
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.login_interval = login_interval
+        self.refresh_margin = refresh_margin
+        self.refresh_jitter = refresh_jitter
+
+        self._accounts = {}
+        self._connector = None
+
+    def add_account(self, key, create, login, cookie_jar=None):
+        """
+        Add an account with a custom client.
+
+        :param key: The account key, unique within the pool.
+        :param create: A function creating the client from a session. The client must close the session on close.
+        :param login: A coroutine function logging the client in.
+        :param cookie_jar: An optional function creating the cookie jar of the session, called on start from the event loop.
+        """
+        if key in self._accounts:
+            raise ValueError(f"Duplicate account: {key}")
+
+        self._accounts[key] = _Account(key, create, login, cookie_jar)
+
+    def add_eldom_account(self, email, password, key=None, cookie_jar=None, **kwargs):
+        """
+        Add a `myeldom.com` account.
+
+        :param email: The email for login.
+        :param password: The password for login.
+        :param key: The account key. Defaults to the email.
+        :param cookie_jar: An optional function creating the cookie jar of the session, e.g. `lambda: aiohttp.CookieJar(unsafe=True)` for a base URL with an IP address.
+        :param kwargs: The other arguments of the client, except for the session.
+        """
+        from .client import Client
+
+        self.add_account(
+            key or email,
+            lambda session: Client(session, owns_session=True, **kwargs),
+            lambda client: client.login(email, password),
+            cookie_jar,
+        )
+
+    def add_iot_account(self, username, password, key=None, **kwargs):
+        """
+        Add an `iot.myeldom.com` account.
+
+        :param username: The username for login.
+        :param password: The password for login.
+        :param key: The account key. Defaults to the username.
+        :param kwargs: The other arguments of the client, except for the session and the credentials.
+        """
+        from ioteldom.client import Client
+
+        kwargs.setdefault(
+            "token_refresh_margin",
+            self.refresh_margin + random.uniform(0, self.refresh_jitter),
+        )
+        self.add_account(
+            key or username,
+            lambda session: Client(session, username, password, owns_session=True, **kwargs),
+            lambda client: client.token_provider.provide(),
+        )
+
+    @property
+    def accounts(self):
+        """
+        The keys of the accounts.
+        """
+        return list(self._accounts)
+
+    def client(self, key):
+        """
+        Get the client of an account. The pool must be started.
+
+        :param key: The account key.
+        :return: The client.
+        """
+        client = self._accounts[key].client
+        if client is None:
+            raise RuntimeError("The account pool is not started")
+        return client
+
+    async def start(self):
+        """
+        Create the clients of the accounts added since the last start, and log them in.
+
+        A failed login doesn't stop the other accounts; the client is still created and logs in
+        again on its next request where the API allows it.
+
+        :return: A dict of the keys of the accounts that failed to log in to their errors.
+        """
+        if self._connector is None:
+            self._connector = create_connector(self.concurrency)
+
+        accounts = [account for account in self._accounts.values() if not account.logged_in]
+        for account in accounts:
+            if account.client is None:
+                session = create_session(
+                    timeout=self.timeout,
+                    cookie_jar=account.cookie_jar() if account.cookie_jar else None,
+                    connector=self._connector,
+                )
+                account.client = account.create(session)
+
+        if not accounts:
+            return {}
+
+        async def login(indexed_account):
+            index, account = indexed_account
+            await asyncio.sleep(index * self.login_interval)
+            await account.login(account.client)
+            account.logged_in = True
+
+        results = await gather_bounded(list(enumerate(accounts)), login, len(accounts))
+        return {result.device[1].key: result.error for result in results if not result.ok}
+
+    async def get_devices(self, accounts=None):
+        """
+        Get the devices of many accounts concurrently.
+
+        :param accounts: The keys of the accounts. Defaults to all accounts.
+        :return: A dict of the account keys to their lists of devices, or to the error if getting them failed.
+        """
+        keys = list(self._accounts) if accounts is None else list(accounts)
+        results = await gather_bounded(
+            keys,
+            lambda key: self.client(key).get_devices(),
+            self.concurrency,
+        )
+        return {result.device: result.result if result.ok else result.error for result in results}
+
+    async def poll(self, accounts=None):
+        """
+        Get the status of the devices of many accounts, with at most `concurrency` requests in
+        flight, taking turns between the accounts.
+
+        A failure for one device or account doesn't cancel the others; it is reported on its result.
+
+        :param accounts: The keys of the accounts. Defaults to all accounts.
+        :return: An async generator of account device results, in completion order. A failure to get the devices of an account yields a result without a device.
+        """
+        devices = await self.get_devices(accounts)
+
+        queues = deque()
+        for key, account_devices in devices.items():
+            if isinstance(account_devices, BaseException):
+                yield AccountDeviceResult(key, error=account_devices)
+            elif account_devices:
+                queues.append((key, deque(account_devices)))
+
+        async def get_status(item):
+            key, device = item
+            return await self.client(key).get_device_status(device)
+
+        async for result in stream_bounded(_take_turns(queues), get_status, self.concurrency):
+            key, device = result.device
+            yield AccountDeviceResult(key, device, result.result, result.error)
+
+    async def close(self):
+        """
+        Close the clients of all accounts, and the shared connection pool.
+        """
+        clients = [account.client for account in self._accounts.values() if account.client is not None]
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+        for account in self._accounts.values():
+            account.client = None
+            account.logged_in = False
+
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _take_turns(queues):
+    """
+    Yield an (account key, device) pair from each account in turn until all are exhausted.
+
+    :param queues: A deque of (account key, deque of devices) pairs. It is consumed.
+    """
+    while queues:
+        key, devices = queues.popleft()
+        yield key, devices.popleft()
+        if devices:
+            queues.append((key, devices))
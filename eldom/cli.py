@@ -0,0 +1,276 @@
+"""
+Command-line tool for both Eldom APIs.
+
+Every command writes one JSON object per line to stdout as soon as it's known, so the output
+can be piped into other tools while a batch is still running:
+
+    pyeldom devices
+    pyeldom poll
+    pyeldom --api iot set-state 16 AD5B221071124F28 "Living room"
+    pyeldom devices | jq -r 'select(.deviceType == 5) | .id' | pyeldom set-temperature 55 -
+
+Devices are selected by their ID (UUID for the IoT API) or by their name. A `-` selector reads
+more selectors from stdin, one per line. Without selectors all devices are used.
+
+The credentials are read from the ELDOM_USERNAME and ELDOM_PASSWORD environment variables,
+unless given with --username and --password.
+
+The exit status is 1 if any device failed, and 0 otherwise.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from dataclasses import asdict, is_dataclass
+from enum import Enum
+
+import aiohttp
+
+from .constants import DEFAULT_POLL_CONCURRENCY
+from .fanout import stream_bounded
+from .session import ClientFactory
+
+
+class _Api:
+    """
+    The differences between the two APIs that matter to the commands.
+    """
+
+    def __init__(self, name, create, device_key):
+        self.name = name
+        self.create = create
+        self.device_key = device_key
+
+
+def _create_eldom_client(args):
+    from .client import Client
+    from .constants import BASE_URL
+
+    async def create():
+        # An unsafe cookie jar also keeps the cookie of a --base-url with an IP address, e.g. the fake server.
+        client = await Client.create(
+            args.concurrency,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            base_url=args.base_url or BASE_URL,
+        )
+        try:
+            await client.login(args.username, args.password)
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    return ClientFactory(create)
+
+
+def _create_iot_client(args):
+    from ioteldom.client import Client
+    from ioteldom.constants import BASE_URL
+
+    return Client.create(
+        args.username,
+        args.password,
+        args.concurrency,
+        base_url=args.base_url or BASE_URL,
+    )
+
+
+_APIS = {
+    "eldom": _Api("eldom", _create_eldom_client, lambda device: str(device.id)),
+    "iot": _Api("iot", _create_iot_client, lambda device: device.uuid),
+}
+
+
+def _to_json(value):
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, Enum):
+        return value.name
+    return str(value)
+
+
+def _write(record):
+    sys.stdout.write(json.dumps(record, default=_to_json) + "\n")
+    sys.stdout.flush()
+
+
+def _format_error(err):
+    message = str(err)
+    return f"{type(err).__name__}: {message}" if message else type(err).__name__
+
+
+def _read_selectors(selectors):
+    """
+    Expand the `-` selectors with the lines of stdin.
+
+    :param selectors: The selectors given on the command line.
+    :return: A list of the selectors.
+    """
+    expanded = []
+    for selector in selectors:
+        if selector != "-":
+            expanded.append(selector)
+            continue
+
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                expanded.append(line)
+    return expanded
+
+
+def _select_devices(api, devices, selectors):
+    """
+    Select the devices matching the selectors, and report the selectors that match none.
+
+    :param api: The API of the devices.
+    :param devices: All devices of the account.
+    :param selectors: The device IDs or names, or None to select all devices.
+    :return: The selected devices, and the number of selectors that match no device.
+    """
+    if selectors is None:
+        return devices, 0
+
+    by_selector = {}
+    for device in devices:
+        by_selector.setdefault(api.device_key(device), []).append(device)
+        if device.name:
+            by_selector.setdefault(device.name, []).append(device)
+
+    selected = {}
+    unmatched = 0
+    for selector in selectors:
+        matches = by_selector.get(selector)
+        if not matches:
+            _write({"selector": selector, "ok": False, "error": "No matching device"})
+            unmatched += 1
+            continue
+        for device in matches:
+            selected.setdefault(api.device_key(device), device)
+    return list(selected.values()), unmatched
+
+
+async def _run(args):
+    api = _APIS[args.api]
+    # Selectors that expand to nothing, e.g. an empty pipe, select nothing rather than every device.
+    selectors = getattr(args, "selectors", None)
+    if selectors:
+        selectors = _read_selectors(selectors)
+    else:
+        selectors = None
+
+    async with api.create(args) as client:
+        devices = await client.get_devices()
+
+        if args.command == "devices":
+            for device in devices:
+                _write(device)
+            return 0
+
+        devices, failures = _select_devices(api, devices, selectors)
+
+        async def operation(device):
+            if args.command == "poll":
+                return await client.get_device_status(device)
+            if args.command == "set-state":
+                return await client.set_device_state(device, args.state)
+            return await client.set_device_temperature(device, args.temperature)
+
+        async for result in stream_bounded(devices, operation, args.concurrency):
+            record = {
+                "device": api.device_key(result.device),
+                "name": result.device.name,
+                "ok": result.ok,
+            }
+            if result.ok:
+                record["result"] = result.result
+            else:
+                record["error"] = _format_error(result.error)
+                failures += 1
+            _write(record)
+
+    return 1 if failures else 0
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="pyeldom",
+        description="Query and control Eldom devices. Results are written as JSON lines.",
+    )
+    parser.add_argument(
+        "--api",
+        choices=sorted(_APIS),
+        default=os.environ.get("ELDOM_API", "eldom"),
+        help="The API to use: eldom for myeldom.com, iot for iot.myeldom.com. Defaults to $ELDOM_API or eldom.",
+    )
+    parser.add_argument(
+        "--username",
+        default=os.environ.get("ELDOM_USERNAME"),
+        help="The email or username. Defaults to $ELDOM_USERNAME.",
+    )
+    parser.add_argument(
+        "--password",
+        default=os.environ.get("ELDOM_PASSWORD"),
+        help="The password. Defaults to $ELDOM_PASSWORD.",
+    )
+    parser.add_argument("--base-url", help="The base URL of the API.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_POLL_CONCURRENCY,
+        help="The maximum number of requests in flight.",
+    )
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("devices", help="List the devices.")
+
+    poll = commands.add_parser("poll", help="Get the status of devices.")
+    poll.add_argument("selectors", nargs="*", help="Device IDs or names, or - to read them from stdin.")
+
+    set_state = commands.add_parser("set-state", help="Set the state of devices.")
+    set_state.add_argument(
+        "state",
+        type=int,
+        help="The state. On the IoT API, 0 or 16 for convector heaters, and 0, 2, 4, 6 or 8 for flat boilers.",
+    )
+    set_state.add_argument("selectors", nargs="*", help="Device IDs or names, or - to read them from stdin.")
+
+    set_temperature = commands.add_parser("set-temperature", help="Set the temperature of devices.")
+    set_temperature.add_argument("temperature", type=int)
+    set_temperature.add_argument(
+        "selectors", nargs="*", help="Device IDs or names, or - to read them from stdin."
+    )
+
+    args = parser.parse_args(argv)
+    if not args.username or not args.password:
+        parser.error("the credentials are required: set ELDOM_USERNAME and ELDOM_PASSWORD, or use --username and --password")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    return args
+
+
+def main(argv=None):
+    """
+    Run the command-line tool.
+
+    :param argv: The command-line arguments. Defaults to sys.argv.
+    """
+    args = _parse_args(argv)
+    try:
+        status = asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        status = 130
+    except BrokenPipeError:
+        # The reader of the output went away, e.g. `head`. Python would complain again when flushing stdout on exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        status = 1
+    except Exception as err:
+        _write({"ok": False, "error": _format_error(err)})
+        status = 1
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
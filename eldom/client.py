@@ -1,18 +1,43 @@
-import json
+import asyncio
+import time
+from functools import cached_property
+from email.utils import parsedate_to_datetime
+from http.cookies import SimpleCookie
+
 import aiohttp
+from yarl import URL
 
-from .convector_heater import ConvectorHeaterClient
-from .constants import BASE_URL
-from .flat_boiler import FlatBoilerClient
+from .codec import read_json
+from .constants import (
+    BASE_URL,
+    CONVECTOR_HEATER_DEVICE_TYPE,
+    DEFAULT_POLL_CONCURRENCY,
+    DEFAULT_WATCH_INTERVAL,
+    FLAT_BOILER_DEVICE_TYPE,
+    NATURELA_BOILER_DEVICE_TYPE,
+    SMART_BOILER_DEVICE_TYPE,
+)
+from .credential_store import CredentialStore
+from .decoding import decoder, decode
+from .fanout import gather_bounded
+from .request_executor import RequestExecutor
+from .metrics import MetricsHook
 from .models import Device, Language, User
-from .naturela_boiler import NaturelaBoilerClient
-from .smart_boiler import SmartBoilerClient
+from .retry import CircuitBreaker, RetryPolicy
+from .session import DEFAULT_TIMEOUT, ClientFactory, create_session
+from .shadow import DeviceShadow
+from .status_cache import StatusCache
+from .watch import watch
 
 
 class InvalidCredentialsError(Exception):
     """Raised when the API rejects the session as unauthorized (401/403)."""
 
 
+class UnsupportedDeviceError(Exception):
+    """Raised when a device's type has no matching device client."""
+
+
 class Client:
     """
     Eldom main API client for the `myeldom.com` APIs.
@@ -22,11 +47,23 @@ class Client:
     It also offers access to the flat boiler, smart boiler, naturela boiler, and convector heater clients.
 
     Before using the client, you need to login with the login method.
+
+    The client closes its session on close only if it owns it. A session passed to the
+    constructor is owned unless `owns_session=False` is given, e.g. when it is shared with other
+    clients. A session created by `Client.create` is always owned.
     """
 
     def __init__(
         self,
         session: aiohttp.ClientSession,
+        credential_store: CredentialStore = None,
+        status_cache_ttl: float = None,
+        base_url: str = BASE_URL,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        metrics: MetricsHook = None,
+        owns_session: bool = True,
+        device_shadow: bool = False,
     ):
         """
         Initialize the Eldom API client.
@@ -34,40 +71,186 @@ class Client:
         Make sure to login with the login method before using the other methods of the client.
 
         :param session: A session object.
+        :param credential_store: An optional store to persist the authentication cookie in between restarts.
+        :param status_cache_ttl: If set, device statuses are cached for this many seconds and concurrent reads of the same device share one request. Use 0 to only share concurrent reads.
+        :param base_url: The base URL of the API.
+        :param retry_policy: An optional retry policy for transient failures.
+        :param circuit_breaker: An optional per-device circuit breaker, keyed by device ID.
+        :param metrics: An optional hook receiving the metrics of every request, e.g. a PrometheusMetrics.
+        :param owns_session: Whether the client owns the session and closes it on close.
+        :param device_shadow: Whether to keep the latest known status of every device, updated by polls and by the effects of successful commands. See get_device_shadow.
         """
         self.session = session
+        self.owns_session = owns_session
+        self.base_url = base_url
+        self.request_executor = RequestExecutor(
+            session, retry_policy, circuit_breaker, metrics
+        )
+        self.credential_store = credential_store
+        self._credential_key = None
+        self._restored_login = None
+        self._login_lock = asyncio.Lock()
+
+        self.status_cache = (
+            StatusCache(status_cache_ttl) if status_cache_ttl is not None else None
+        )
+
+        self.shadow = DeviceShadow() if device_shadow else None
+
+    @cached_property
+    def flat_boiler(self):
+        """
+        The flat boiler client, loaded on first use.
+        """
+        from .flat_boiler import FlatBoilerClient
+
+        return FlatBoilerClient(
+            self.session,
+            self.status_cache,
+            self.base_url,
+            self.request_executor,
+            self.shadow,
+        )
+
+    @cached_property
+    def smart_boiler(self):
+        """
+        The smart boiler client, loaded on first use.
+        """
+        from .smart_boiler import SmartBoilerClient
+
+        return SmartBoilerClient(
+            self.session,
+            self.status_cache,
+            self.base_url,
+            self.request_executor,
+            self.shadow,
+        )
+
+    @cached_property
+    def naturela_boiler(self):
+        """
+        The naturela boiler client, loaded on first use.
+        """
+        from .naturela_boiler import NaturelaBoilerClient
+
+        return NaturelaBoilerClient(
+            self.session,
+            self.status_cache,
+            self.base_url,
+            self.request_executor,
+            self.shadow,
+        )
+
+    @cached_property
+    def convector_heater(self):
+        """
+        The convector heater client, loaded on first use.
+        """
+        from .convector_heater import ConvectorHeaterClient
+
+        return ConvectorHeaterClient(
+            self.session,
+            self.status_cache,
+            self.base_url,
+            self.request_executor,
+            self.shadow,
+        )
 
-        self.flat_boiler = FlatBoilerClient(session)
-        self.smart_boiler = SmartBoilerClient(session)
-        self.naturela_boiler = NaturelaBoilerClient(session)
-        self.convector_heater = ConvectorHeaterClient(session)
+    @classmethod
+    def create(
+        cls,
+        concurrency: int = DEFAULT_POLL_CONCURRENCY,
+        timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+        cookie_jar: aiohttp.abc.AbstractCookieJar = None,
+        **kwargs,
+    ):
+        """
+        Create a client with its own session, tuned for polling with the given concurrency.
+
+        Either await the result, or use it as an async context manager to close the client on exit:
+
+            async with Client.create() as client:
+                await client.login(email, password)
+
+        :param concurrency: The maximum number of requests in flight, i.e. the size of the connection pool.
+        :param timeout: The default timeouts of the requests.
+        :param cookie_jar: An optional cookie jar for the session.
+        :param kwargs: The other arguments of the client, except for the session.
+        :return: An awaitable async context manager of the client.
+        """
+
+        async def create_client():
+            session = create_session(concurrency, timeout, cookie_jar=cookie_jar)
+            return cls(session, owns_session=True, **kwargs)
+
+        return ClientFactory(create_client)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
 
     async def close(self):
         """
-        Close the session.
+        Close the session if the client owns it.
         """
-        await self.session.close()
+        if self.owns_session:
+            await self.session.close()
 
     async def login(self, email, password):
         """
         Perform login and store the authentication cookie in the session.
 
+        If a credential store is configured and holds an unexpired cookie for this account,
+        the cookie is restored into the session instead of logging in again. If the restored
+        cookie is then rejected as unauthorized, it is forgotten, the client logs in again once,
+        and the rejected request is retried.
+
         :param email: The email for login.
         :param password: The password for login.
         """
-        login_url = f"{BASE_URL}/Account/Login"
+        self._credential_key = f"eldom:{self.base_url}:{email}"
+        if self._restore_cookies():
+            self._restored_login = (email, password)
+            self.request_executor.on_unauthorized = self._login_again
+            return
+
+        await self._login(email, password)
+
+    async def _login(self, email, password):
+        login_url = f"{self.base_url}/Account/Login"
         payload = {"Email": email, "Password": password}
-        response = await self.session.post(login_url, data=payload)
-        response.raise_for_status()
+        await self.request_executor.request(
+            "POST", login_url, idempotent=True, reauthenticate=False, data=payload
+        )
+
+        self._store_cookies()
+
+    async def _login_again(self, error, kwargs):
+        # Concurrent requests rejected with the restored cookie share one login.
+        async with self._login_lock:
+            if self._restored_login is not None:
+                email, password = self._restored_login
+                self._restored_login = None
+                self._forget_cookies()
+                self.session.cookie_jar.clear()
+                await self._login(email, password)
+        return kwargs
 
     async def logout(self):
         """
         Perform logout and clear the authentication cookie from the session.
         """
-        logout_url = f"{BASE_URL}/account/logout"
-        response = await self.session.get(logout_url)
-        response.raise_for_status()
+        logout_url = f"{self.base_url}/account/logout"
+        await self.request_executor.request(
+            "GET", logout_url, idempotent=True, reauthenticate=False
+        )
         self.session.cookie_jar.clear()
+        self._forget_cookies()
+        self._restored_login = None
+        self.request_executor.on_unauthorized = None
 
     async def get_user(self):
         """
@@ -75,14 +258,11 @@ class Client:
 
         :return: The user information.
         """
-        user_url = f"{BASE_URL}/api/user/get"
-        response = await self.session.get(user_url)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
+        user_url = f"{self.base_url}/api/user/get"
+        response = await self.request_executor.request("GET", user_url, idempotent=True)
+        response_json = await read_json(response)
         response_json["language"] = Language(response_json["language"])
-        response_json["lastLoginDate"] = response_json["lastLoginDate"]
-        response_json["lastActiveDate"] = response_json["lastActiveDate"]
-        return User(**response_json)
+        return decode(User, response_json)
 
     async def get_devices(self):
         """
@@ -90,15 +270,164 @@ class Client:
 
         :return: The devices information.
         """
-        devices_url = f"{BASE_URL}/api/device/getmy"
-        response = await self.session.get(devices_url)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-        devices = []
-        for device_json in response_json:
-            device_json["lastDataRefreshDate"] = device_json["lastDataRefreshDate"]
-            devices.append(Device(**device_json))
-        return devices
+        devices_url = f"{self.base_url}/api/device/getmy"
+        response = await self.request_executor.request(
+            "GET", devices_url, idempotent=True
+        )
+        response_json = await read_json(response)
+        decode_device = decoder(Device)
+        return [decode_device(device_json) for device_json in response_json]
+
+    async def get_device_status(self, device: Device):
+        """
+        Get the status of a device, using the device client that matches its type.
+
+        :param device: The device object.
+        :return: The status details of the device.
+        :raises UnsupportedDeviceError: If the device type is not supported.
+        """
+        if device.deviceType == FLAT_BOILER_DEVICE_TYPE:
+            return await self.flat_boiler.get_flat_boiler_status(device.id)
+        if device.deviceType == SMART_BOILER_DEVICE_TYPE:
+            return await self.smart_boiler.get_smart_boiler_status(device.id)
+        if device.deviceType == NATURELA_BOILER_DEVICE_TYPE:
+            return await self.naturela_boiler.get_naturela_boiler_status(device.id)
+        if device.deviceType == CONVECTOR_HEATER_DEVICE_TYPE:
+            return await self.convector_heater.get_convector_heater_status(device.id)
+        raise UnsupportedDeviceError(f"Unsupported device type: {device.deviceType}")
+
+    async def poll_all(self, devices=None, concurrency=DEFAULT_POLL_CONCURRENCY):
+        """
+        Get the status of many devices concurrently.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result.
+
+        :param devices: The devices to poll. Defaults to all devices returned by get_devices.
+        :param concurrency: The maximum number of status requests in flight at once.
+        :return: A list of device results, in the same order as the devices.
+        """
+        if devices is None:
+            devices = await self.get_devices()
+        return await gather_bounded(devices, self.get_device_status, concurrency)
+
+    def get_device_shadow(self, device: Device):
+        """
+        Get the latest known status of a device without making a request.
+
+        Requires the client to be created with `device_shadow=True`.
+
+        :param device: The device object.
+        :return: The latest polled status with the effects of later successful commands applied, or None if the device was never polled.
+        """
+        if self.shadow is None:
+            raise ValueError("The device shadow is not enabled")
+        return self.shadow.get(device.id)
+
+    async def set_device_state(self, device: Device, state):
+        """
+        Set the state of a device, using the device client that matches its type.
+
+        :param device: The device object.
+        :param state: The state to set. See the state setter of the matching device client for the values.
+        :raises UnsupportedDeviceError: If the device type is not supported.
+        """
+        if device.deviceType == FLAT_BOILER_DEVICE_TYPE:
+            return await self.flat_boiler.set_flat_boiler_state(device.id, state)
+        if device.deviceType == SMART_BOILER_DEVICE_TYPE:
+            return await self.smart_boiler.set_smart_boiler_state(device.id, state)
+        if device.deviceType == NATURELA_BOILER_DEVICE_TYPE:
+            return await self.naturela_boiler.set_naturela_boiler_state(device.id, state)
+        if device.deviceType == CONVECTOR_HEATER_DEVICE_TYPE:
+            return await self.convector_heater.set_convector_heater_state(device.id, state)
+        raise UnsupportedDeviceError(f"Unsupported device type: {device.deviceType}")
+
+    async def set_device_temperature(self, device: Device, temperature):
+        """
+        Set the temperature of a device, using the device client that matches its type.
+
+        :param device: The device object.
+        :param temperature: The temperature to set.
+        :raises UnsupportedDeviceError: If the device type is not supported.
+        """
+        if device.deviceType == FLAT_BOILER_DEVICE_TYPE:
+            return await self.flat_boiler.set_flat_boiler_temperature(device.id, temperature)
+        if device.deviceType == SMART_BOILER_DEVICE_TYPE:
+            return await self.smart_boiler.set_smart_boiler_temperature(device.id, temperature)
+        if device.deviceType == NATURELA_BOILER_DEVICE_TYPE:
+            return await self.naturela_boiler.set_naturela_boiler_temperature(
+                device.id, temperature
+            )
+        if device.deviceType == CONVECTOR_HEATER_DEVICE_TYPE:
+            return await self.convector_heater.set_convector_heater_temperature(
+                device.id, temperature
+            )
+        raise UnsupportedDeviceError(f"Unsupported device type: {device.deviceType}")
+
+    async def set_state_many(
+        self, devices, state, concurrency=DEFAULT_POLL_CONCURRENCY, timeout=None
+    ):
+        """
+        Set the state of many devices concurrently.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result.
+
+        :param devices: The devices to set the state of.
+        :param state: The state to set.
+        :param concurrency: The maximum number of requests in flight at once.
+        :param timeout: An optional deadline in seconds for the whole batch. Devices not done by then get an asyncio.TimeoutError.
+        :return: A list of device results, in the same order as the devices.
+        """
+        return await gather_bounded(
+            devices,
+            lambda device: self.set_device_state(device, state),
+            concurrency,
+            timeout,
+        )
+
+    async def set_temperature_many(
+        self, devices, temperature, concurrency=DEFAULT_POLL_CONCURRENCY, timeout=None
+    ):
+        """
+        Set the temperature of many devices concurrently.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result.
+
+        :param devices: The devices to set the temperature of.
+        :param temperature: The temperature to set.
+        :param concurrency: The maximum number of requests in flight at once.
+        :param timeout: An optional deadline in seconds for the whole batch. Devices not done by then get an asyncio.TimeoutError.
+        :return: A list of device results, in the same order as the devices.
+        """
+        return await gather_bounded(
+            devices,
+            lambda device: self.set_device_temperature(device, temperature),
+            concurrency,
+            timeout,
+        )
+
+    async def watch(
+        self,
+        devices=None,
+        interval=DEFAULT_WATCH_INTERVAL,
+        concurrency=DEFAULT_POLL_CONCURRENCY,
+    ):
+        """
+        Poll the status of many devices periodically and yield only the fields that changed.
+
+        The first poll of a device yields all of its fields. A failed poll yields a change with
+        the error instead, without stopping the watch.
+
+        :param devices: The devices to watch. Defaults to all devices returned by get_devices.
+        :param interval: The time between the starts of two polls in seconds.
+        :param concurrency: The maximum number of status requests in flight at once.
+        :return: An async iterator of device changes.
+        """
+        if devices is None:
+            devices = await self.get_devices()
+        async for change in watch(
+            devices, self.get_device_status, interval, concurrency
+        ):
+            yield change
 
     async def is_connected(self):
         """
@@ -114,9 +443,66 @@ class Client:
             return True
         except aiohttp.ClientResponseError as err:
             if err.status in (401, 403):
+                self._forget_cookies()
                 raise InvalidCredentialsError(
                     "Invalid email or password"
                 ) from err
             return False
         except Exception:
             return False
+
+    def _restore_cookies(self):
+        if self.credential_store is None:
+            return False
+
+        stored = self.credential_store.load(self._credential_key) or {}
+        cookies = stored.get("cookies")
+        expiry = stored.get("expiry")
+        if not cookies or (expiry is not None and time.time() >= expiry):
+            return False
+
+        simple_cookie = SimpleCookie()
+        for cookie in cookies:
+            simple_cookie[cookie["name"]] = cookie["value"]
+            for attribute in ("domain", "path", "expires"):
+                if cookie.get(attribute):
+                    simple_cookie[cookie["name"]][attribute] = cookie[attribute]
+        self.session.cookie_jar.update_cookies(simple_cookie, URL(self.base_url))
+        return True
+
+    def _store_cookies(self):
+        if self.credential_store is None:
+            return
+
+        cookies = []
+        expiries = []
+        for morsel in self.session.cookie_jar:
+            cookies.append(
+                {
+                    "name": morsel.key,
+                    "value": morsel.value,
+                    "domain": morsel["domain"],
+                    "path": morsel["path"],
+                    "expires": morsel["expires"],
+                }
+            )
+            # Max-Age takes precedence over Expires, as in the cookie jar.
+            if morsel["max-age"]:
+                try:
+                    expiries.append(time.time() + int(morsel["max-age"]))
+                except ValueError:
+                    pass
+            elif morsel["expires"]:
+                try:
+                    expiries.append(parsedate_to_datetime(morsel["expires"]).timestamp())
+                except (TypeError, ValueError):
+                    pass
+
+        self.credential_store.save(
+            self._credential_key,
+            {"cookies": cookies, "expiry": min(expiries) if expiries else None},
+        )
+
+    def _forget_cookies(self):
+        if self.credential_store is not None and self._credential_key is not None:
+            self.credential_store.delete(self._credential_key)
@@ -0,0 +1,130 @@
+import json
+
+from .tracing import span
+
+
+class _JsonCodec:
+    """
+    JSON codec using the standard library.
+    """
+
+    name = "json"
+
+    def __init__(self):
+        self.loads = json.loads
+
+    def loads_object_json(self, data):
+        return self.loads(self.loads(data)["objectJson"])
+
+
+class _OrjsonCodec:
+    """
+    JSON codec using the `orjson` package.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self.loads = orjson.loads
+
+    def loads_object_json(self, data):
+        return self.loads(self.loads(data)["objectJson"])
+
+
+class _MsgspecCodec:
+    """
+    JSON codec using the `msgspec` package.
+    """
+
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        class Envelope(msgspec.Struct):
+            objectJson: str
+
+        self.loads = msgspec.json.decode
+        # Only the objectJson string is decoded from the envelope; the other fields are skipped.
+        self._decode_envelope = msgspec.json.Decoder(Envelope).decode
+
+    def loads_object_json(self, data):
+        return self.loads(self._decode_envelope(data).objectJson)
+
+
+_codecs = {
+    _OrjsonCodec.name: _OrjsonCodec,
+    _MsgspecCodec.name: _MsgspecCodec,
+    _JsonCodec.name: _JsonCodec,
+}
+_codec = None
+
+
+def use_codec(name):
+    """
+    Select the JSON codec used to decode responses explicitly.
+
+    By default `orjson` is used when it's installed, then `msgspec`, and the standard library otherwise.
+
+    :param name: The codec name - "orjson", "msgspec" or "json".
+    """
+    global _codec
+
+    if name not in _codecs:
+        raise ValueError(f"Unknown JSON codec: {name}. Supported codecs: {list(_codecs)}")
+
+    _codec = _codecs[name]()
+
+
+def get_codec():
+    """
+    Get the JSON codec used to decode responses, selecting the default one on first use.
+
+    :return: The codec.
+    """
+    global _codec
+
+    if _codec is None:
+        for codec in _codecs.values():
+            try:
+                _codec = codec()
+                break
+            except ImportError:
+                continue
+    return _codec
+
+
+def loads(data):
+    """
+    Parse JSON.
+
+    :param data: The JSON as bytes or str.
+    :return: The parsed JSON.
+    """
+    return get_codec().loads(data)
+
+
+async def read_json(response):
+    """
+    Parse the JSON body of a response, without decoding it to text first.
+
+    :param response: The response.
+    :return: The parsed JSON.
+    """
+    data = await response.read()
+    with span("json", size=len(data)):
+        return get_codec().loads(data)
+
+
+async def read_object_json(response):
+    """
+    Parse the JSON document embedded as a string in the `objectJson` field of a response body.
+
+    :param response: The response.
+    :return: The parsed `objectJson` document.
+    """
+    data = await response.read()
+    with span("json", size=len(data)):
+        return get_codec().loads_object_json(data)
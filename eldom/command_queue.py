@@ -0,0 +1,95 @@
+import asyncio
+
+
+class _Command:
+    __slots__ = ("send", "waiters")
+
+    def __init__(self, send):
+        self.send = send
+        self.waiters = []
+
+
+class CommandQueue:
+    """
+    Per-device command queue with last-write-wins debouncing.
+
+    Commands to the same device are sent one at a time, in order. A command waits in the queue
+    for `debounce` seconds before it is sent, and a newer command of the same kind for the same
+    device replaces it in the meantime, so only the latest value goes out. Everyone who
+    submitted a replaced command gets the result of the command that was actually sent.
+    """
+
+    def __init__(self, debounce: float = 0.0):
+        """
+        Initialize the command queue.
+
+        :param debounce: How many seconds a command waits for newer commands of the same kind before it is sent.
+        """
+        if debounce < 0:
+            raise ValueError(f"Debounce must not be negative, got {debounce}")
+
+        self.debounce = debounce
+
+        self._pending = {}
+        self._workers = {}
+
+    async def submit(self, device_key, kind, send):
+        """
+        Queue a command for a device and wait for its result.
+
+        :param device_key: The device key.
+        :param kind: The kind of the command, e.g. "state" or "temperature". Pending commands of the same kind replace each other.
+        :param send: A coroutine function without arguments that sends the command.
+        :return: The result of the sent command.
+        """
+        pending = self._pending.setdefault(device_key, {})
+
+        # A replaced command moves to the end of the queue, so it isn't sent before the commands submitted in between.
+        command = pending.pop(kind, None)
+        if command is None:
+            command = _Command(send)
+        command.send = send
+        pending[kind] = command
+
+        waiter = asyncio.get_running_loop().create_future()
+        command.waiters.append(waiter)
+
+        if device_key not in self._workers:
+            self._workers[device_key] = asyncio.ensure_future(self._run(device_key))
+
+        return await waiter
+
+    async def _run(self, device_key):
+        pending = self._pending[device_key]
+        waiters = []
+        try:
+            while pending:
+                if self.debounce:
+                    await asyncio.sleep(self.debounce)
+
+                kind = next(iter(pending))
+                command = pending.pop(kind)
+
+                # Commands whose submitters all gave up are dropped.
+                waiters = [waiter for waiter in command.waiters if not waiter.done()]
+                if not waiters:
+                    continue
+
+                try:
+                    result = await command.send()
+                except Exception as err:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(err)
+                else:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_result(result)
+        finally:
+            # Only reached with commands left if the worker itself was cancelled.
+            for command in pending.values():
+                waiters.extend(command.waiters)
+            for waiter in waiters:
+                waiter.cancel()
+            del self._pending[device_key]
+            del self._workers[device_key]
@@ -1 +1,10 @@
 BASE_URL = "https://myeldom.com"
+
+NATURELA_BOILER_DEVICE_TYPE = 1
+SMART_BOILER_DEVICE_TYPE = 2
+CONVECTOR_HEATER_DEVICE_TYPE = 3
+FLAT_BOILER_DEVICE_TYPE = 5
+
+DEFAULT_POLL_CONCURRENCY = 16
+
+DEFAULT_WATCH_INTERVAL = 30
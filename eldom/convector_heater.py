@@ -1,8 +1,14 @@
-import json
+import time
+
 import aiohttp
 
+from .codec import read_object_json
 from .constants import BASE_URL
+from .decoding import decode
+from .request_executor import RequestExecutor
 from .models import ConvectorHeaterDetails
+from .shadow import DeviceShadow
+from .status_cache import StatusCache
 
 
 class ConvectorHeaterClient:
@@ -15,6 +21,10 @@ class ConvectorHeaterClient:
     def __init__(
         self,
         session: aiohttp.ClientSession,
+        status_cache: StatusCache = None,
+        base_url: str = BASE_URL,
+        request_executor: RequestExecutor = None,
+        shadow: DeviceShadow = None,
     ):
         """
         Initialize the Eldom convector heater API client.
@@ -22,8 +32,16 @@ class ConvectorHeaterClient:
         Make sure to login with the login method before using the other methods of the client.
 
         :param session: A session object.
+        :param status_cache: An optional cache for the device statuses.
+        :param base_url: The base URL of the API.
+        :param request_executor: An optional request executor, e.g. one with a retry policy. Defaults to plain requests on the session.
+        :param shadow: An optional device shadow to keep up to date with the statuses and commands.
         """
         self.session = session
+        self.status_cache = status_cache
+        self.base_url = base_url
+        self.request_executor = request_executor or RequestExecutor(session)
+        self.shadow = shadow
 
     async def get_convector_heater_status(self, device_id):
         """
@@ -32,20 +50,23 @@ class ConvectorHeaterClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/panelconvector/{device_id}"
-        response = await self.session.get(url)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-        heater_json = json.loads(response_json.get("objectJson"))
+        if self.status_cache is None:
+            return await self._fetch_convector_heater_status(device_id)
+        return await self.status_cache.get(
+            ("convector_heater", device_id), lambda: self._fetch_convector_heater_status(device_id)
+        )
 
-        supported_heater_fields = {
-            field.name for field in ConvectorHeaterDetails.__dataclass_fields__.values()
-        }
-        filtered_heater_json = {
-            k: v for k, v in heater_json.items() if k in supported_heater_fields
-        }
+    async def _fetch_convector_heater_status(self, device_id):
+        fetched_at = time.monotonic()
+        url = f"{self.base_url}/api/panelconvector/{device_id}"
+        response = await self.request_executor.request(
+            "GET", url, device_key=device_id, idempotent=True
+        )
+        heater_json = await read_object_json(response)
+        status = decode(ConvectorHeaterDetails, heater_json)
+        self._report_status(device_id, status, fetched_at)
 
-        return ConvectorHeaterDetails(**filtered_heater_json)
+        return status
 
     async def set_convector_heater_state(self, device_id, state):
         """
@@ -55,10 +76,15 @@ class ConvectorHeaterClient:
         :param state: The state to set (e.g., 0 to turn off, 1 to turn on heating, 2 to turn on Smart mode, 3 to turn on Study mode).
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/panelconvector/setState"
+        url = f"{self.base_url}/api/panelconvector/setState"
         payload = {"deviceId": device_id, "state": state}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"State": state})
 
     async def set_convector_heater_temperature(self, device_id, temperature):
         """
@@ -68,7 +94,24 @@ class ConvectorHeaterClient:
         :param temperature: The temperature to set.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/panelconvector/setTemperature"
+        url = f"{self.base_url}/api/panelconvector/setTemperature"
         payload = {"deviceId": device_id, "temperature": temperature}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"SetTemp": temperature})
+
+    def _report_status(self, device_id, status, fetched_at):
+        if self.shadow is not None:
+            self.shadow.report(device_id, status, fetched_at)
+
+    def _apply_to_shadow(self, device_id, changes):
+        if self.shadow is not None:
+            self.shadow.apply(device_id, changes)
+
+    def _invalidate_status(self, device_id):
+        if self.status_cache is not None:
+            self.status_cache.invalidate(("convector_heater", device_id))
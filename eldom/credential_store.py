@@ -0,0 +1,100 @@
+import abc
+import hashlib
+import json
+import os
+import tempfile
+
+
+class CredentialStore(abc.ABC):
+    """
+    Credential store base class.
+
+    A credential store keeps authentication state (tokens, cookies) between process restarts,
+    so that clients can skip the login round trip while the stored credentials are still valid.
+    Implement load, save and delete to plug in a different storage backend; a subclass missing
+    any of them can't be instantiated.
+    """
+
+    @abc.abstractmethod
+    def load(self, key):
+        """
+        Load stored credentials.
+
+        :param key: The credentials key.
+        :return: The stored credentials dictionary, or None if there is none.
+        """
+
+    @abc.abstractmethod
+    def save(self, key, credentials):
+        """
+        Store credentials, replacing any previously stored ones.
+
+        :param key: The credentials key.
+        :param credentials: A JSON-serializable credentials dictionary.
+        """
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """
+        Delete stored credentials, if any.
+
+        :param key: The credentials key.
+        """
+
+
+class FileCredentialStore(CredentialStore):
+    """
+    Credential store that keeps one JSON file per key in a private directory.
+
+    The directory is created with 0700 permissions and files with 0600 permissions.
+    File names are hashes of the keys, so they don't reveal the account names.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Initialize the file credential store.
+
+        :param directory: The directory to keep the credentials in. Defaults to `pyeldom` in the user cache directory.
+        """
+        if directory is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            directory = os.path.join(cache_home, "pyeldom")
+
+        self.directory = directory
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as file:
+                credentials = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        return credentials if isinstance(credentials, dict) else None
+
+    def save(self, key, credentials):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+        # Write to a private temporary file first so that readers never see a partial file.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(credentials, file)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
@@ -0,0 +1,44 @@
+from dataclasses import fields
+from functools import lru_cache
+from operator import itemgetter
+
+from .tracing import span
+
+
+@lru_cache(maxsize=None)
+def decoder(model):
+    """
+    Get a decoder for a dataclass model.
+
+    The decoder builds the model from a JSON object, ignoring keys the model doesn't have.
+    The field lookup is computed once per model class and reused for every call.
+
+    :param model: The dataclass model.
+    :return: A function taking a JSON object and returning a model instance.
+    """
+    field_names = tuple(field.name for field in fields(model))
+    getter = itemgetter(*field_names)
+    single_field = len(field_names) == 1
+
+    def decode(json_object):
+        try:
+            values = getter(json_object)
+        except KeyError as err:
+            raise TypeError(
+                f"{model.__name__} is missing required field {err.args[0]!r}"
+            ) from None
+        return model(values) if single_field else model(*values)
+
+    return decode
+
+
+def decode(model, json_object):
+    """
+    Build a dataclass model from a JSON object, ignoring keys the model doesn't have.
+
+    :param model: The dataclass model.
+    :param json_object: The JSON object.
+    :return: The model instance.
+    """
+    with span("model", model=model.__name__):
+        return decoder(model)(json_object)
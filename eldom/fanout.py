@@ -0,0 +1,100 @@
+import asyncio
+
+from .models import DeviceResult
+
+
+async def gather_bounded(devices, func, concurrency, timeout=None):
+    """
+    Run `func` for every device concurrently, with at most `concurrency` calls in flight.
+
+    A failing call does not cancel the others; its exception is stored on the result instead.
+
+    :param devices: The devices to run the function for.
+    :param func: A coroutine function taking a single device.
+    :param concurrency: The maximum number of concurrent calls.
+    :param timeout: An optional deadline in seconds for all calls. Calls still queued or in flight when it passes are cancelled, and their results hold an asyncio.TimeoutError.
+    :return: A list of device results, in the same order as the devices.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(device):
+        async with semaphore:
+            try:
+                return DeviceResult(device, result=await func(device))
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                return DeviceResult(device, error=err)
+
+    if timeout is None:
+        return list(await asyncio.gather(*(run(device) for device in devices)))
+
+    devices = list(devices)
+    tasks = [asyncio.ensure_future(run(device)) for device in devices]
+    if not tasks:
+        return []
+
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        for task in tasks:
+            task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+
+    return [
+        DeviceResult(device, error=asyncio.TimeoutError(f"Deadline of {timeout}s exceeded"))
+        if task.cancelled()
+        else task.result()
+        for device, task in zip(devices, tasks)
+    ]
+
+
+async def stream_bounded(devices, func, concurrency):
+    """
+    Run `func` for every device concurrently, with at most `concurrency` calls in flight, and
+    yield the results as they arrive.
+
+    A failing call does not cancel the others; its exception is stored on the result instead.
+    Closing the generator early cancels the calls still in flight.
+
+    :param devices: The devices to run the function for. It may be a lazy iterable; devices are taken from it only as calls finish.
+    :param func: A coroutine function taking a single device.
+    :param concurrency: The maximum number of concurrent calls.
+    :return: An async generator of device results, in completion order.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}")
+
+    devices = iter(devices)
+    results = asyncio.Queue()
+
+    async def worker():
+        try:
+            # The workers share the iterator, so each device is handled by exactly one of them.
+            for device in devices:
+                try:
+                    results.put_nowait(DeviceResult(device, result=await func(device)))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    results.put_nowait(DeviceResult(device, error=err))
+        finally:
+            results.put_nowait(None)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is None:
+                running -= 1
+                continue
+            yield result
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
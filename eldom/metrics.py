@@ -0,0 +1,146 @@
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+from yarl import URL
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsHook:
+    """
+    Receives the metrics of the API clients.
+
+    This base class ignores everything. Subclass it and override the methods of interest to
+    feed the metrics into a monitoring system.
+    """
+
+    def on_request(self, endpoint, method, status, duration, bytes_sent, bytes_received):
+        """
+        Called after every HTTP request attempt, including retries.
+
+        :param endpoint: The endpoint, e.g. "/api/flatboiler/{id}" or "/api/direct-req:SetParams" for direct requests.
+        :param method: The HTTP method.
+        :param status: The HTTP status, or the name of the exception if the request failed without a response, e.g. "TimeoutError".
+        :param duration: The time from sending the request until the whole response body was read, in seconds.
+        :param bytes_sent: The size of the request body.
+        :param bytes_received: The size of the response body.
+        """
+
+    def on_token_refresh(self, success):
+        """
+        Called after every attempt to get a new token.
+
+        :param success: Whether a token was received.
+        """
+
+
+class PrometheusMetrics(MetricsHook):
+    """
+    Collects the metrics of the API clients and renders them in the Prometheus text format.
+
+    Serve the output of `exposition` on a `/metrics` endpoint to have Prometheus scrape it.
+    """
+
+    def __init__(self, prefix: str = "pyeldom", buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the metrics.
+
+        :param prefix: The prefix of the metric names.
+        :param buckets: The upper bounds of the latency histogram buckets in seconds.
+        """
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+
+        # Clients only record from their event loop, but exposition may run in a server thread.
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._requests = {}
+        self._errors = {}
+        self._bytes_sent = {}
+        self._bytes_received = {}
+        self._token_refreshes = {}
+
+    def on_request(self, endpoint, method, status, duration, bytes_sent, bytes_received):
+        labels = (("endpoint", endpoint), ("method", method))
+        status_labels = labels + (("status", str(status)),)
+        failed = not isinstance(status, int) or status >= 400
+
+        with self._lock:
+            histogram = self._durations.get(labels)
+            if histogram is None:
+                histogram = self._durations[labels] = [[0] * len(self.buckets), 0.0, 0]
+            bucket = bisect_left(self.buckets, duration)
+            if bucket < len(self.buckets):
+                histogram[0][bucket] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+
+            self._requests[status_labels] = self._requests.get(status_labels, 0) + 1
+            if failed:
+                self._errors[status_labels] = self._errors.get(status_labels, 0) + 1
+            self._bytes_sent[labels] = self._bytes_sent.get(labels, 0) + bytes_sent
+            self._bytes_received[labels] = self._bytes_received.get(labels, 0) + bytes_received
+
+    def on_token_refresh(self, success):
+        labels = (("result", "success" if success else "failure"),)
+        with self._lock:
+            self._token_refreshes[labels] = self._token_refreshes.get(labels, 0) + 1
+
+    def exposition(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        :return: The metrics as text.
+        """
+        prefix = self.prefix
+        lines = []
+        with self._lock:
+            lines.append(f"# HELP {prefix}_request_duration_seconds Duration of the HTTP requests.")
+            lines.append(f"# TYPE {prefix}_request_duration_seconds histogram")
+            for labels, (counts, total, count) in sorted(self._durations.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(labels + (("le", repr(float(bound))),))
+                    lines.append(f"{prefix}_request_duration_seconds_bucket{bucket_labels} {cumulative}")
+                lines.append(
+                    f"{prefix}_request_duration_seconds_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}"
+                )
+                lines.append(f"{prefix}_request_duration_seconds_sum{_format_labels(labels)} {total}")
+                lines.append(f"{prefix}_request_duration_seconds_count{_format_labels(labels)} {count}")
+
+            _append_counter(lines, f"{prefix}_requests_total", "HTTP requests by status.", self._requests)
+            _append_counter(lines, f"{prefix}_request_errors_total", "Failed HTTP requests by status or error.", self._errors)
+            _append_counter(lines, f"{prefix}_request_bytes_total", "Bytes of the HTTP request bodies.", self._bytes_sent)
+            _append_counter(lines, f"{prefix}_response_bytes_total", "Bytes of the HTTP response bodies.", self._bytes_received)
+            _append_counter(lines, f"{prefix}_token_refreshes_total", "Attempts to get a new token.", self._token_refreshes)
+
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=1024)
+def endpoint_of(url):
+    """
+    Get the endpoint of a URL for the metrics, with the numeric path segments like device IDs replaced by "{id}".
+
+    :param url: The URL.
+    :return: The endpoint.
+    """
+    segments = URL(url).path.split("/")
+    return "/".join("{id}" if segment.isdigit() else segment for segment in segments)
+
+
+def _append_counter(lines, name, help_text, values):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in sorted(values.items()):
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+
+def _format_labels(labels):
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
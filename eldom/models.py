@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 from enum import Enum
 
@@ -7,7 +7,7 @@ class Language(Enum):
     ENGLISH = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: int
     firstName: str
@@ -23,7 +23,7 @@ class User:
     ip: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Device:
     id: int
     realDeviceId: str
@@ -40,7 +40,7 @@ class Device:
     timeZoneName: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class FlatBoilerDetails:
     ID: int
     DeviceID: str
@@ -77,7 +77,7 @@ class FlatBoilerDetails:
     HasBoost: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class SmartBoilerDetails:
     ID: int
     DeviceID: str
@@ -102,7 +102,7 @@ class SmartBoilerDetails:
     SavedEnergy: int
 
 
-@dataclass
+@dataclass(slots=True)
 class NaturelaBoilerDetails:
     ID: int
     DeviceID: str
@@ -162,7 +162,7 @@ class NaturelaBoilerDetails:
     TimerNDate: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ConvectorHeaterDetails:
     ID: int
     DeviceID: str
@@ -184,3 +184,37 @@ class ConvectorHeaterDetails:
     PowerIDX: int
     PCBTemp: int
     ErrorFlag: int
+
+
+@dataclass(slots=True)
+class DeviceResult:
+    device: Device
+    result: Optional[object] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass(slots=True)
+class DeviceChange:
+    device: Device
+    changes: dict = field(default_factory=dict)
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass(slots=True)
+class AccountDeviceResult:
+    account: str
+    device: Optional[object] = None
+    result: Optional[object] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self):
+        return self.error is None
@@ -1,8 +1,44 @@
-import json
+import time
+from collections import OrderedDict
+
 import aiohttp
 
+from .codec import read_object_json
 from .constants import BASE_URL
+from .decoding import decode
+from .request_executor import RequestExecutor
 from .models import NaturelaBoilerDetails
+from .shadow import DeviceShadow
+from .status_cache import StatusCache
+
+# Settings that can be changed with a save, mapped from their NaturelaBoilerDetails names
+# to their save payload names. The order matches the payload the web app sends.
+_SETTINGS_PAYLOAD_KEYS = {
+    "ElSetTemp": "elSetTemp",
+    "HeaterOnTemp": "heaterOnTemp",
+    "Sensor": "sensor",
+    "Rate1Start": "rate1Start",
+    "Rate2Start": "rate2Start",
+    "SolarDT1On": "solarDT1On",
+    "SolarDT1Off": "solarDT1Off",
+    "DHWPriorityDT2On": "DHWPriorityDT2On",
+    "DHWPriorityDT2Off": "DHWPriorityDT2Off",
+    "CHPriorityT4On": "CHPriorityT4On",
+    "CHPriorityT4Off": "CHPriorityT4Off",
+    "BoilerPumpPriority": "BoilerPumpPriority",
+    "ElHeaterKW": "elHeaterKw",
+    "ElHeater": "elHeater",
+    "SolarColector": "solarColector",
+    "BoilerHeatingInstalation": "boilerHeatingInstalation",
+    "Anode": "anode",
+    "AntiLegionella": "antiLegionella",
+    "SolarAntiFrost": "solarAntiFrost",
+    "SolarAntiFrostTemperature": "solarAntiFrostTemperature",
+    "AutoHolidayMode": "autoHolidayMode",
+    "UseBoilerPump": "useBoilerPump",
+    "TankMinTemp": "tankMinTemp",
+    "SolarOverheating": "solarOverheating",
+}
 
 
 class NaturelaBoilerClient:
@@ -15,6 +51,10 @@ class NaturelaBoilerClient:
     def __init__(
         self,
         session: aiohttp.ClientSession,
+        status_cache: StatusCache = None,
+        base_url: str = BASE_URL,
+        request_executor: RequestExecutor = None,
+        shadow: DeviceShadow = None,
     ):
         """
         Initialize the Eldom Naturela boiler API client.
@@ -22,8 +62,20 @@ class NaturelaBoilerClient:
         Make sure to login with the login method before using the other methods of the client.
 
         :param session: A session object.
+        :param status_cache: An optional cache for the device statuses.
+        :param base_url: The base URL of the API.
+        :param request_executor: An optional request executor, e.g. one with a retry policy. Defaults to plain requests on the session.
+        :param shadow: An optional device shadow to keep up to date with the statuses and commands.
         """
         self.session = session
+        self.status_cache = status_cache
+        self.base_url = base_url
+        self.request_executor = request_executor or RequestExecutor(session)
+        self.shadow = shadow
+
+        # Raw state of the devices whose settings are updated with snapshot reuse, as
+        # (fetch time, state, max age) tuples, oldest first.
+        self._snapshots = OrderedDict()
 
     async def get_naturela_boiler_status(self, device_id):
         """
@@ -32,20 +84,20 @@ class NaturelaBoilerClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/boiler/{device_id}"
-        response = await self.session.get(url)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-        boiler_json = json.loads(response_json.get("objectJson"))
-
-        supported_boiler_fields = {
-            field.name for field in NaturelaBoilerDetails.__dataclass_fields__.values()
-        }
-        filtered_boiler_json = {
-            k: v for k, v in boiler_json.items() if k in supported_boiler_fields
-        }
+        if self.status_cache is None:
+            return await self._fetch_naturela_boiler_status(device_id)
+        return await self.status_cache.get(
+            ("naturela_boiler", device_id),
+            lambda: self._fetch_naturela_boiler_status(device_id),
+        )
+
+    async def _fetch_naturela_boiler_status(self, device_id):
+        fetched_at = time.monotonic()
+        boiler_json = await self._get_boiler_json(device_id)
+        status = decode(NaturelaBoilerDetails, boiler_json)
+        self._report_status(device_id, status, fetched_at)
 
-        return NaturelaBoilerDetails(**filtered_boiler_json)
+        return status
 
     async def set_naturela_boiler_state(self, device_id, state):
         """
@@ -55,10 +107,15 @@ class NaturelaBoilerClient:
         :param state: The state to set (0 = Off, 1 = On, 2 = Holiday) as an int.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/boiler/setState"
+        url = f"{self.base_url}/api/boiler/setState"
         payload = {"deviceId": device_id, "state": state}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"State": state})
 
     async def set_naturela_boiler_powerful_mode_on(self, device_id):
         """
@@ -67,10 +124,15 @@ class NaturelaBoilerClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/boiler/setHeater"
+        url = f"{self.base_url}/api/boiler/setHeater"
         payload = {"deviceId": device_id, "heater": True}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"Heater": True})
 
     async def set_naturela_boiler_temperature(self, device_id, temperature):
         """
@@ -83,66 +145,93 @@ class NaturelaBoilerClient:
         :param temperature: The target temperature to set.
         :return: The response from the server.
         """
-        get_url = f"{BASE_URL}/api/boiler/{device_id}"
-        get_response = await self.session.get(get_url)
-        get_response.raise_for_status()
-        response_json = json.loads(await get_response.text())
-        boiler_json = json.loads(response_json.get("objectJson"))
-
-        alarms = [
-            {
-                "listeners": {},
-                "validateTime": True,
-                "daysEnabled": alarm["DaysEnabled"],
-                "step": 1,
-                "id": alarm["ID"],
-                "enabled": alarm["Enabled"],
-                "begin": alarm["Begin"],
-                "end": alarm["End"],
-                "temperature": alarm["Temperature"],
-            }
-            for alarm in boiler_json.get("Alarms", [])
-        ]
-
-        payload = {
-            "listeners": {},
-            "INVALID_TEMPERATURE": -128,
-            "formid": device_id,
-            "alarms": alarms,
-            "elSetTemp": temperature,
-            "heaterOnTemp": boiler_json.get("HeaterOnTemp"),
-            "sensor": boiler_json.get("Sensor"),
-            "rate1Start": boiler_json.get("Rate1Start"),
-            "rate2Start": boiler_json.get("Rate2Start"),
-            "solarDT1On": boiler_json.get("SolarDT1On"),
-            "solarDT1Off": boiler_json.get("SolarDT1Off"),
-            "DHWPriorityDT2On": boiler_json.get("DHWPriorityDT2On"),
-            "DHWPriorityDT2Off": boiler_json.get("DHWPriorityDT2Off"),
-            "CHPriorityT4On": boiler_json.get("CHPriorityT4On"),
-            "CHPriorityT4Off": boiler_json.get("CHPriorityT4Off"),
-            "BoilerPumpPriority": boiler_json.get("BoilerPumpPriority"),
-            "elHeaterKw": boiler_json.get("ElHeaterKW"),
-            "elHeater": boiler_json.get("ElHeater"),
-            "solarColector": boiler_json.get("SolarColector"),
-            "boilerHeatingInstalation": boiler_json.get("BoilerHeatingInstalation"),
-            "anode": boiler_json.get("Anode"),
-            "antiLegionella": boiler_json.get("AntiLegionella"),
-            "solarAntiFrost": boiler_json.get("SolarAntiFrost"),
-            "solarAntiFrostTemperature": boiler_json.get("SolarAntiFrostTemperature"),
-            "autoHolidayMode": boiler_json.get("AutoHolidayMode"),
-            "useBoilerPump": boiler_json.get("UseBoilerPump"),
-            "tankMinTemp": boiler_json.get("TankMinTemp"),
-            "solarOverheating": boiler_json.get("SolarOverheating"),
-            "deviceId": boiler_json.get("DeviceID"),
-            "state": boiler_json.get("State"),
-            "HardwareVersion": boiler_json.get("HardwareVersion"),
-            "SoftwareVersion": boiler_json.get("SoftwareVersion"),
-            "hardwareGroup": 2,
-        }
+        await self.update_naturela_boiler_settings(device_id, ElSetTemp=temperature)
+
+    async def update_naturela_boiler_settings(self, device_id, max_snapshot_age=0, **changes):
+        """
+        Change many settings of a Naturela boiler device with a single save.
+
+        The API requires the complete settings payload on every save, so the current state is
+        needed to fill in the unchanged settings. If the state of the device was fetched (by this
+        method or by get_naturela_boiler_status) no more than `max_snapshot_age` seconds ago,
+        that snapshot is reused instead of fetching the state again. Snapshots are only kept for
+        devices updated with a positive `max_snapshot_age`, and only for that long.
+
+        Example: `update_naturela_boiler_settings(device_id, ElSetTemp=60, AntiLegionella=True, TankMinTemp=40)`
+
+        :param device_id: The device ID (integer).
+        :param max_snapshot_age: The maximum age in seconds of a previously fetched state to reuse. Use 0 to always fetch.
+        :param changes: The settings to change, named as in NaturelaBoilerDetails.
+        :return: The response from the server.
+        """
+        unsupported_settings = changes.keys() - _SETTINGS_PAYLOAD_KEYS.keys()
+        if unsupported_settings:
+            raise ValueError(
+                f"Unsupported settings: {sorted(unsupported_settings)}. "
+                f"Supported settings: {sorted(_SETTINGS_PAYLOAD_KEYS)}"
+            )
+        if not changes:
+            return
+
+        snapshot = self._snapshots.get(device_id) if max_snapshot_age > 0 else None
+        if snapshot is not None and time.monotonic() - snapshot[0] <= max_snapshot_age:
+            fetched_at, boiler_json, _ = snapshot
+        else:
+            fetched_at = time.monotonic()
+            boiler_json = await self._get_boiler_json(device_id)
 
-        save_url = f"{BASE_URL}/api/boiler/save"
-        save_response = await self.session.post(save_url, json=payload)
-        save_response.raise_for_status()
+        boiler_json = {**boiler_json, **changes}
+
+        save_url = f"{self.base_url}/api/boiler/save"
+        payload = _build_save_payload(device_id, boiler_json)
+        try:
+            await self.request_executor.request(
+                "POST", save_url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, changes)
+
+        if max_snapshot_age > 0:
+            self._store_snapshot(device_id, fetched_at, boiler_json, max_snapshot_age)
+        else:
+            self._snapshots.pop(device_id, None)
+
+    def _store_snapshot(self, device_id, fetched_at, boiler_json, max_age):
+        self._snapshots.pop(device_id, None)
+        self._snapshots[device_id] = (fetched_at, boiler_json, max_age)
+
+        now = time.monotonic()
+        while self._snapshots:
+            oldest_fetched_at, _, oldest_max_age = next(iter(self._snapshots.values()))
+            if now - oldest_fetched_at <= oldest_max_age:
+                break
+            self._snapshots.popitem(last=False)
+
+    def _report_status(self, device_id, status, fetched_at):
+        if self.shadow is not None:
+            self.shadow.report(device_id, status, fetched_at)
+
+    def _apply_to_shadow(self, device_id, changes):
+        if self.shadow is not None:
+            self.shadow.apply(device_id, changes)
+
+    def _invalidate_status(self, device_id):
+        if self.status_cache is not None:
+            self.status_cache.invalidate(("naturela_boiler", device_id))
+
+    async def _get_boiler_json(self, device_id):
+        url = f"{self.base_url}/api/boiler/{device_id}"
+        response = await self.request_executor.request(
+            "GET", url, device_key=device_id, idempotent=True
+        )
+        boiler_json = await read_object_json(response)
+
+        snapshot = self._snapshots.get(device_id)
+        if snapshot is not None:
+            self._store_snapshot(device_id, time.monotonic(), boiler_json, snapshot[2])
+
+        return boiler_json
 
     async def reset_naturela_boiler_energy_usage(self, device_id):
         """
@@ -151,7 +240,48 @@ class NaturelaBoilerClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/boiler/resetEnergyDate"
+        url = f"{self.base_url}/api/boiler/resetEnergyDate"
         payload = {"deviceId": device_id}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+
+
+def _build_save_payload(device_id, boiler_json):
+    alarms = [
+        {
+            "listeners": {},
+            "validateTime": True,
+            "daysEnabled": alarm["DaysEnabled"],
+            "step": 1,
+            "id": alarm["ID"],
+            "enabled": alarm["Enabled"],
+            "begin": alarm["Begin"],
+            "end": alarm["End"],
+            "temperature": alarm["Temperature"],
+        }
+        for alarm in boiler_json.get("Alarms", [])
+    ]
+
+    payload = {
+        "listeners": {},
+        "INVALID_TEMPERATURE": -128,
+        "formid": device_id,
+        "alarms": alarms,
+    }
+    for setting, payload_key in _SETTINGS_PAYLOAD_KEYS.items():
+        payload[payload_key] = boiler_json.get(setting)
+    payload.update(
+        {
+            "deviceId": boiler_json.get("DeviceID"),
+            "state": boiler_json.get("State"),
+            "HardwareVersion": boiler_json.get("HardwareVersion"),
+            "SoftwareVersion": boiler_json.get("SoftwareVersion"),
+            "hardwareGroup": 2,
+        }
+    )
+
+    return payload
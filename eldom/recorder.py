@@ -0,0 +1,341 @@
+import math
+import mmap
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import fields
+from functools import lru_cache
+from typing import Optional, Union, get_args, get_origin
+from urllib.parse import quote
+
+_TIMESTAMP_COLUMN = "_timestamp"
+_COLUMN_SUFFIX = ".f64"
+_ITEM_SIZE = array("d").itemsize
+_GROWTH_ROWS = 4096
+_EMPTY = memoryview(array("d"))
+_STRING_READINGS_MODULE = "ioteldom.models"
+# Without fd tracking (Python 3.13+), a mapping doesn't keep a duplicate file descriptor open.
+_MMAP_OPTIONS = {"trackfd": False} if sys.version_info >= (3, 13) else {}
+
+
+class _Column:
+    """
+    A column of float64 values in a memory-mapped file.
+
+    The file grows in chunks, so appending doesn't resize it on every row. On close it is
+    truncated to the rows actually written. The file itself is only open while it is being
+    mapped, so an open column holds at most the descriptor of its mapping.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        open(path, "ab").close()
+        self._mmap = None
+        self.capacity = os.stat(path).st_size // _ITEM_SIZE
+        self.length = self.capacity
+        self._map()
+
+    def _map(self):
+        self._unmap()
+        if self.capacity:
+            with open(self.path, "r+b") as file:
+                self._mmap = mmap.mmap(
+                    file.fileno(), self.capacity * _ITEM_SIZE, **_MMAP_OPTIONS
+                )
+            self._bytes = memoryview(self._mmap)
+            self.values = self._bytes.cast("d")
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self.values.release()
+            self._bytes.release()
+            self._mmap.close()
+            self._mmap = None
+        self._bytes = memoryview(b"")
+        self.values = _EMPTY
+
+    def reserve(self, rows):
+        if rows <= self.capacity:
+            return
+        capacity = max(rows, self.capacity + max(_GROWTH_ROWS, self.capacity // 2))
+        os.truncate(self.path, capacity * _ITEM_SIZE)
+        self.capacity = capacity
+        self._map()
+
+    def fill(self, length, value):
+        self.reserve(length)
+        self.values[self.length:length] = array("d", [value]) * (length - self.length)
+        self.length = length
+
+    def read(self, start, end):
+        result = array("d")
+        with self._bytes[start * _ITEM_SIZE:end * _ITEM_SIZE] as part:
+            result.frombytes(part)
+        return result
+
+    def flush(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        self._unmap()
+        os.truncate(self.path, self.length * _ITEM_SIZE)
+
+    def remove(self):
+        self._unmap()
+        os.remove(self.path)
+
+
+class _Series:
+    """
+    The columns of a single device, sharing one timestamp column.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self.timestamps = _Column(self._path(_TIMESTAMP_COLUMN))
+        self.columns = {}
+        try:
+            for file_name in os.listdir(directory):
+                name = file_name.removesuffix(_COLUMN_SUFFIX)
+                if file_name.endswith(_COLUMN_SUFFIX) and name != _TIMESTAMP_COLUMN:
+                    self.columns[name] = _Column(self._path(name))
+        except BaseException:
+            self.close()
+            raise
+
+        # Chunked growth leaves zeroed rows at the end of the files after a crash. Timestamps
+        # are written last and are never zero, so they tell how many rows are complete.
+        length = self.timestamps.length
+        while length and self.timestamps.values[length - 1] == 0:
+            length -= 1
+        for column in self.columns.values():
+            length = min(length, column.length)
+
+        self.timestamps.length = length
+        for column in self.columns.values():
+            column.length = length
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + _COLUMN_SUFFIX)
+
+    def append(self, timestamp, values):
+        length = self.timestamps.length
+        for name in values:
+            if name not in self.columns:
+                self.columns[name] = self._new_column(name, length)
+
+        # Grow every column before writing any value, so a failure leaves no partial row.
+        for column in self.columns.values():
+            column.reserve(length + 1)
+        self.timestamps.reserve(length + 1)
+
+        for name, column in self.columns.items():
+            column.values[length] = values.get(name, math.nan)
+            column.length = length + 1
+        self.timestamps.values[length] = timestamp
+        self.timestamps.length = length + 1
+
+    def _new_column(self, name, length):
+        column = _Column(self._path(name))
+        column.length = 0
+        try:
+            column.fill(length, math.nan)
+        except BaseException:
+            column.remove()
+            raise
+        return column
+
+    def column_count(self):
+        return len(self.columns) + 1
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+        self.timestamps.flush()
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+        self.timestamps.close()
+
+
+@lru_cache(maxsize=None)
+def _numeric_fields(model):
+    # The `iot.myeldom.com` models keep their readings as strings. Their ID is the pair token.
+    string_readings = model.__module__ == _STRING_READINGS_MODULE
+    numeric = []
+    for model_field in fields(model):
+        annotation = model_field.type
+        if get_origin(annotation) is Union:
+            annotation = next(
+                (arg for arg in get_args(annotation) if arg is not type(None)), None
+            )
+        if annotation in (int, float, bool):
+            numeric.append((model_field.name, False))
+        elif annotation is str and string_readings and model_field.name != "ID":
+            numeric.append((model_field.name, True))
+    return tuple(numeric)
+
+
+class TelemetryRecorder:
+    """
+    Records the numeric fields of device statuses into memory-mapped column files.
+
+    Every device gets a directory with one file of float64 values per field, plus one file of
+    timestamps. Appending a sample writes 8 bytes per field, and range queries binary-search
+    the timestamps, so only the pages of the requested range are read from disk.
+
+    Integer, float and boolean fields are recorded, as well as the string readings of
+    `iot.myeldom.com` devices that hold numbers. A field missing from a sample is recorded
+    as NaN. A sample is written to all columns of a device or to none of them.
+
+    Column files stay mapped for the most recently used devices only, up to a total number of
+    columns, so recording thousands of devices doesn't run out of file descriptors.
+    """
+
+    def __init__(self, directory: str, fields=None, max_open_columns: int = 512):
+        """
+        Initialize the recorder.
+
+        Existing recordings in the directory are reopened and appended to.
+
+        :param directory: The directory of the recordings.
+        :param fields: The names of the fields to record. Defaults to all numeric fields.
+        :param max_open_columns: The maximum number of column files kept mapped, including the
+            timestamp columns. The columns of the device being recorded are always kept open,
+            even if they alone exceed it.
+        """
+        if max_open_columns < 1:
+            raise ValueError(
+                f"Max open columns must be at least 1, got {max_open_columns}"
+            )
+
+        self.directory = directory
+        self.fields = frozenset(fields) if fields is not None else None
+        self.max_open_columns = max_open_columns
+
+        self._series = OrderedDict()
+        self._open_columns = 0
+
+    def record(self, device_key, status, timestamp: Optional[float] = None):
+        """
+        Record the numeric fields of a device status.
+
+        :param device_key: The device key, e.g. the device ID or UUID.
+        :param status: The status, one of the `*Details` models.
+        :param timestamp: The time of the status as a Unix timestamp. Defaults to now.
+        :raises ValueError: If the timestamp is older than the last recorded one.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        values = {}
+        for name, parse in _numeric_fields(type(status)):
+            if self.fields is not None and name not in self.fields:
+                continue
+            value = getattr(status, name)
+            if value is None:
+                continue
+            if parse:
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+            values[name] = value
+
+        series = self._get_series(device_key)
+        timestamps = series.timestamps
+        if timestamps.length and timestamp < timestamps.values[timestamps.length - 1]:
+            raise ValueError(
+                f"Timestamp {timestamp} is older than the last recorded one of device {device_key}"
+            )
+        column_count = series.column_count()
+        try:
+            series.append(timestamp, values)
+        finally:
+            self._open_columns += series.column_count() - column_count
+        self._evict(keep=series)
+
+    def query(self, device_key, field, start: float = None, end: float = None):
+        """
+        Get the recorded values of a field in a time range.
+
+        :param device_key: The device key.
+        :param field: The field name.
+        :param start: The start of the range, inclusive. Defaults to the first sample.
+        :param end: The end of the range, inclusive. Defaults to the last sample.
+        :return: A tuple of two arrays of float64: the timestamps and the values.
+        """
+        series = self._get_series(device_key)
+        timestamps = series.timestamps
+        first, last = 0, timestamps.length
+        if start is not None:
+            first = bisect_left(timestamps.values, start, 0, last)
+        if end is not None:
+            last = bisect_right(timestamps.values, end, first, last)
+
+        column = series.columns.get(field)
+        if column is None:
+            values = array("d", [math.nan]) * (last - first)
+        else:
+            values = column.read(first, last)
+        return timestamps.read(first, last), values
+
+    def recorded_fields(self, device_key):
+        """
+        Get the names of the recorded fields of a device.
+
+        :param device_key: The device key.
+        :return: A sorted list of field names.
+        """
+        return sorted(self._get_series(device_key).columns)
+
+    def flush(self):
+        """
+        Flush the recorded samples of the open devices to disk.
+        """
+        for series in self._series.values():
+            series.flush()
+
+    def close(self):
+        """
+        Close all column files, trimming them to the recorded samples.
+        """
+        while self._series:
+            _, series = self._series.popitem(last=False)
+            self._open_columns -= series.column_count()
+            series.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_series(self, device_key):
+        key = str(device_key)
+        series = self._series.get(key)
+        if series is not None:
+            self._series.move_to_end(key)
+            return series
+
+        series = _Series(os.path.join(self.directory, quote(key, safe="")))
+        self._series[key] = series
+        self._open_columns += series.column_count()
+        self._evict(keep=series)
+        return series
+
+    def _evict(self, keep):
+        while self._open_columns > self.max_open_columns:
+            key, series = next(iter(self._series.items()))
+            if series is keep:
+                break
+            del self._series[key]
+            self._open_columns -= series.column_count()
+            series.close()
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+from aiohttp.payload import JsonPayload
+
+from .metrics import MetricsHook, endpoint_of
+from .retry import CircuitBreaker, RetryPolicy
+from .tracing import span
+
+
+class RequestExecutor:
+    """
+    Executes the HTTP requests of the API clients.
+
+    It applies the optional retry policy and per-device circuit breaker, and reads the response
+    body before returning, so that failures while reading the body are retried too. Every
+    attempt is reported to the optional metrics hook.
+
+    If `on_unauthorized` is set, a request rejected as unauthorized (401/403) is retried once
+    after awaiting `on_unauthorized(error, kwargs)`. The hook logs in again and returns the
+    request arguments to retry with, e.g. with a new token, or None to not retry.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        metrics: MetricsHook = None,
+    ):
+        """
+        Initialize the request executor.
+
+        :param session: A session object.
+        :param retry_policy: An optional retry policy. Without one, every request is attempted once.
+        :param circuit_breaker: An optional per-device circuit breaker.
+        :param metrics: An optional hook receiving the metrics of every request.
+        """
+        self.session = session
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.metrics = metrics
+        self.on_unauthorized = None
+
+    async def request(
+        self,
+        method,
+        url,
+        device_key=None,
+        idempotent=False,
+        safe_write=False,
+        endpoint=None,
+        reauthenticate=True,
+        **kwargs,
+    ):
+        """
+        Perform a request and check its status.
+
+        :param method: The HTTP method.
+        :param url: The URL.
+        :param device_key: The key of the device the request targets, for the circuit breaker.
+        :param idempotent: Whether the request has no side effects, e.g. a read or a login, and can always be retried.
+        :param safe_write: Whether the request is a write that is safe to repeat, e.g. setting an absolute value.
+        :param endpoint: The endpoint for the metrics. Defaults to the URL path, with numeric segments replaced by "{id}".
+        :param reauthenticate: Whether to log in again and retry once if the request is rejected as unauthorized. Disable it for the login requests themselves.
+        :param kwargs: Extra arguments for the session request.
+        :return: The response, with its body already read.
+        :raises aiohttp.ClientResponseError: If the response has an error status.
+        :raises CircuitOpenError: If the circuit breaker of the device is open.
+        """
+        policy = self.retry_policy
+        breaker = self.circuit_breaker if device_key is not None else None
+
+        retryable = policy is not None and (
+            idempotent or (safe_write and policy.retry_safe_writes)
+        )
+        attempts = policy.attempts if retryable else 1
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.timeout if policy and policy.timeout else None
+
+        probe = breaker.before_call(device_key) if breaker is not None else False
+
+        if self.metrics is not None:
+            if "json" in kwargs:
+                # Serialize the body once here, as aiohttp would, to know its size.
+                kwargs["data"] = JsonPayload(kwargs.pop("json"))
+            endpoint = endpoint or endpoint_of(url)
+            bytes_sent = _body_size(kwargs.get("data"))
+
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                started = time.perf_counter()
+                try:
+                    response = await self._attempt(method, url, deadline, loop, kwargs)
+                except Exception as error:
+                    if self.metrics is not None:
+                        self.metrics.on_request(
+                            endpoint,
+                            method,
+                            getattr(error, "status", None) or type(error).__name__,
+                            time.perf_counter() - started,
+                            bytes_sent,
+                            0,
+                        )
+
+                    if (
+                        reauthenticate
+                        and self.on_unauthorized is not None
+                        and isinstance(error, aiohttp.ClientResponseError)
+                        and error.status in (401, 403)
+                    ):
+                        reauthenticate = False
+                        retry_kwargs = await self.on_unauthorized(error, kwargs)
+                        if retry_kwargs is not None:
+                            # The rejected attempt doesn't count against the retry policy.
+                            kwargs = retry_kwargs
+                            attempts += 1
+                            continue
+
+                    transient = policy.is_transient(error) if policy else _is_transient(error)
+                    if not transient or attempt >= attempts:
+                        if breaker is not None and transient:
+                            breaker.record_failure(device_key, probe)
+                        raise
+
+                    delay = policy.delay(attempt, error)
+                    if deadline is not None and loop.time() + delay >= deadline:
+                        if breaker is not None:
+                            breaker.record_failure(device_key, probe)
+                        raise
+                    await asyncio.sleep(delay)
+                else:
+                    if self.metrics is not None:
+                        self.metrics.on_request(
+                            endpoint,
+                            method,
+                            response.status,
+                            time.perf_counter() - started,
+                            bytes_sent,
+                            len(await response.read()),
+                        )
+                    if breaker is not None:
+                        breaker.record_success(device_key)
+                    return response
+        finally:
+            if probe:
+                breaker.release(device_key)
+
+    async def _attempt(self, method, url, deadline, loop, kwargs):
+        if deadline is not None and "timeout" not in kwargs:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            kwargs = {**kwargs, "timeout": aiohttp.ClientTimeout(total=remaining)}
+
+        with span("http", method=method, url=url) as current:
+            response = await self.session.request(method, url, **kwargs)
+            current.set_attribute("status", response.status)
+            try:
+                response.raise_for_status()
+                # Reading the whole body returns the connection to the pool; the body stays cached on the response.
+                await response.read()
+            except BaseException:
+                response.release()
+                raise
+            return response
+
+
+def _body_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    if isinstance(data, dict):
+        return len(urlencode(data))
+    return getattr(data, "size", None) or 0
+
+
+def _is_transient(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
@@ -0,0 +1,174 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call to a device is rejected because its circuit breaker is open."""
+
+
+class RetryPolicy:
+    """
+    Retry policy with exponential backoff and full jitter.
+
+    Only transient failures are retried: connection errors, timeouts, and responses with one of
+    the `retry_statuses`. Reads are always retryable; writes only when they are marked safe to
+    repeat by the client and `retry_safe_writes` is enabled.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        timeout: float = None,
+        retry_statuses=(429, 500, 502, 503, 504),
+        retry_safe_writes: bool = False,
+    ):
+        """
+        Initialize the retry policy.
+
+        :param attempts: The maximum number of attempts per call, including the first one.
+        :param base_delay: The backoff base in seconds. The n-th retry waits up to `base_delay * 2 ** (n - 1)` seconds.
+        :param max_delay: The maximum backoff in seconds.
+        :param timeout: An optional limit in seconds for a whole call, including all attempts and backoffs.
+        :param retry_statuses: The HTTP statuses to retry on.
+        :param retry_safe_writes: Whether to retry writes that set an absolute value and are safe to repeat.
+        """
+        if attempts < 1:
+            raise ValueError(f"Attempts must be at least 1, got {attempts}")
+
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_safe_writes = retry_safe_writes
+
+    def delay(self, retry, error=None):
+        """
+        Get the backoff before a retry.
+
+        A `Retry-After` header in seconds on the failed response is honoured, up to `max_delay`.
+
+        :param retry: The retry number, starting at 1.
+        :param error: The error of the failed attempt.
+        :return: The delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+
+        return delay
+
+    def is_transient(self, error):
+        """
+        Check whether an error is a transient failure worth retrying.
+
+        :param error: The error.
+        :return: True if the error is transient.
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.retry_statuses
+        return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Per-device circuit breaker.
+
+    After `failure_threshold` consecutive transient failures of a device, calls to it fail fast
+    with CircuitOpenError for `reset_timeout` seconds. After that, a single probe call is let
+    through: if it succeeds the circuit closes, otherwise it opens again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the circuit breaker.
+
+        :param failure_threshold: The number of consecutive failures that opens the circuit of a device.
+        :param reset_timeout: How many seconds the circuit stays open before a probe is let through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = {}
+        self._opened_at = {}
+        self._probing = set()
+
+    def before_call(self, key):
+        """
+        Check whether a call to a device may proceed.
+
+        :param key: The device key.
+        :return: True if the call is the probe of an open circuit. Only the probe may be released.
+        :raises CircuitOpenError: If the circuit of the device is open.
+        """
+        opened_at = self._opened_at.get(key)
+        if opened_at is None:
+            return False
+
+        if key in self._probing or time.monotonic() - opened_at < self.reset_timeout:
+            raise CircuitOpenError(f"Circuit for device {key} is open")
+
+        self._probing.add(key)
+        return True
+
+    def record_success(self, key):
+        """
+        Record a successful call to a device, closing its circuit.
+
+        :param key: The device key.
+        """
+        self._failures.pop(key, None)
+        self._opened_at.pop(key, None)
+        self._probing.discard(key)
+
+    def record_failure(self, key, probe=False):
+        """
+        Record a failed call to a device, opening its circuit once the threshold is reached.
+
+        :param key: The device key.
+        :param probe: Whether the call was the probe of an open circuit, as returned by before_call.
+        """
+        failures = self._failures.get(key, 0) + 1
+        self._failures[key] = failures
+
+        if probe or failures >= self.failure_threshold:
+            self._opened_at[key] = time.monotonic()
+        if probe:
+            self._probing.discard(key)
+
+    def release(self, key):
+        """
+        Release a probe that ended without a verdict, e.g. because it was cancelled or failed permanently.
+
+        Call it only for the call that before_call let through as the probe, so that a call
+        started before the circuit opened doesn't let a second probe through.
+
+        :param key: The device key.
+        """
+        self._probing.discard(key)
+
+    def is_open(self, key):
+        """
+        Check whether the circuit of a device is open.
+
+        :param key: The device key.
+        :return: True if calls to the device currently fail fast.
+        """
+        return key in self._opened_at
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
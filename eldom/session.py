@@ -0,0 +1,89 @@
+import aiohttp
+
+from .constants import DEFAULT_POLL_CONCURRENCY
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10, sock_read=20)
+
+
+def create_connector(
+    concurrency: int = DEFAULT_POLL_CONCURRENCY,
+    keepalive_timeout: float = 60,
+    dns_cache_ttl: int = 300,
+):
+    """
+    Create a connector keeping up to `concurrency` keep-alive connections to a single API host.
+
+    Must be called from a running event loop.
+
+    :param concurrency: The maximum number of requests in flight, i.e. the size of the connection pool.
+    :param keepalive_timeout: How many seconds to keep idle connections open.
+    :param dns_cache_ttl: How many seconds to cache DNS lookups for.
+    :return: The connector.
+    """
+    return aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=dns_cache_ttl,
+    )
+
+
+def create_session(
+    concurrency: int = DEFAULT_POLL_CONCURRENCY,
+    timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+    keepalive_timeout: float = 60,
+    dns_cache_ttl: int = 300,
+    cookie_jar: aiohttp.abc.AbstractCookieJar = None,
+    connector: aiohttp.BaseConnector = None,
+):
+    """
+    Create a session tuned for polling many devices on a single API host.
+
+    The connector keeps up to `concurrency` keep-alive connections to the host, so that a
+    bounded fan-out reuses connections instead of opening new ones and repeating TLS
+    handshakes. DNS lookups are cached, TCP_NODELAY is set on every connection (aiohttp does
+    this by default), and compressed responses are negotiated and decoded automatically
+    (brotli as well when the `Brotli` package is installed).
+
+    Must be called from a running event loop.
+
+    :param concurrency: The maximum number of requests in flight, i.e. the size of the connection pool.
+    :param timeout: The default timeouts of the requests.
+    :param keepalive_timeout: How many seconds to keep idle connections open.
+    :param dns_cache_ttl: How many seconds to cache DNS lookups for.
+    :param cookie_jar: An optional cookie jar.
+    :param connector: An optional connector shared with other sessions, e.g. from create_connector. The session doesn't close it, and `concurrency`, `keepalive_timeout` and `dns_cache_ttl` are ignored.
+    :return: The session.
+    """
+    connector_owner = connector is None
+    if connector is None:
+        connector = create_connector(concurrency, keepalive_timeout, dns_cache_ttl)
+    return aiohttp.ClientSession(
+        connector=connector,
+        connector_owner=connector_owner,
+        timeout=timeout,
+        cookie_jar=cookie_jar,
+        auto_decompress=True,
+    )
+
+
+class ClientFactory:
+    """
+    The result of `Client.create`.
+
+    Await it to get the client, or use it as an async context manager to close the client on exit.
+    """
+
+    def __init__(self, create):
+        self._create = create
+        self._client = None
+
+    def __await__(self):
+        return self._create().__await__()
+
+    async def __aenter__(self):
+        self._client = await self._create()
+        return self._client
+
+    async def __aexit__(self, *exc_info):
+        await self._client.close()
@@ -0,0 +1,117 @@
+import time
+from dataclasses import fields, replace
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _field_names(model):
+    return frozenset(model_field.name for model_field in fields(model))
+
+
+class _ShadowEntry:
+    __slots__ = ("status", "pending", "confirmed", "changed_at")
+
+    def __init__(self):
+        self.status = None
+        self.pending = {}
+        self.confirmed = True
+        self.changed_at = float("-inf")
+
+
+class DeviceShadow:
+    """
+    The latest known status of every device, kept up to date by polls and commands.
+
+    A successful command applies its known effect to the shadow right away, e.g. a new target
+    temperature. Such changes stay pending until a poll reports the real status of the device.
+    A poll that started before the last change may not include it yet, so the pending changes
+    are applied on top of it instead of being dropped.
+
+    Reading the shadow never makes a request.
+    """
+
+    def __init__(self):
+        """
+        Initialize the device shadow.
+        """
+        self._entries = {}
+
+    def get(self, key):
+        """
+        Get the shadow status of a device.
+
+        :param key: The device key.
+        :return: The latest known status with the pending changes applied, or None if the device was never polled.
+        """
+        entry = self._entries.get(key)
+        return entry.status if entry is not None else None
+
+    def pending(self, key):
+        """
+        Get the changes applied by commands that no poll has reported yet.
+
+        :param key: The device key.
+        :return: A dict of the changed field names to their values.
+        """
+        entry = self._entries.get(key)
+        return dict(entry.pending) if entry is not None else {}
+
+    def is_confirmed(self, key):
+        """
+        Check whether the device confirmed all pending changes in its command responses.
+
+        :param key: The device key.
+        :return: True if there are no pending changes, or the device confirmed them all.
+        """
+        entry = self._entries.get(key)
+        return entry is None or entry.confirmed
+
+    def report(self, key, status, fetched_at):
+        """
+        Reconcile the shadow with a status reported by the device.
+
+        :param key: The device key.
+        :param status: The reported status.
+        :param fetched_at: The `time.monotonic()` time at which the status request started.
+        """
+        entry = self._entries.setdefault(key, _ShadowEntry())
+        if entry.pending and fetched_at < entry.changed_at:
+            entry.status = replace(status, **entry.pending)
+            return
+
+        entry.status = status
+        entry.pending = {}
+        entry.confirmed = True
+
+    def apply(self, key, changes, confirmed=False):
+        """
+        Apply the effect of a successful command to the shadow.
+
+        Changes to fields the status doesn't have are ignored. Nothing is applied to a device
+        that was never polled, as there is no status to apply the changes to.
+
+        :param key: The device key.
+        :param changes: A dict of the changed field names to their new values.
+        :param confirmed: Whether the device confirmed the changes in its response.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.status is None:
+            return
+
+        names = _field_names(type(entry.status))
+        changes = {name: value for name, value in changes.items() if name in names}
+        if not changes:
+            return
+
+        entry.status = replace(entry.status, **changes)
+        entry.confirmed = confirmed and (entry.confirmed or not entry.pending)
+        entry.pending.update(changes)
+        entry.changed_at = time.monotonic()
+
+    def forget(self, key):
+        """
+        Drop the shadow of a device.
+
+        :param key: The device key.
+        """
+        self._entries.pop(key, None)
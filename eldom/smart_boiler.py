@@ -1,8 +1,14 @@
-import json
+import time
+
 import aiohttp
 
+from .codec import read_object_json
 from .constants import BASE_URL
+from .decoding import decode
+from .request_executor import RequestExecutor
 from .models import SmartBoilerDetails
+from .shadow import DeviceShadow
+from .status_cache import StatusCache
 
 
 class SmartBoilerClient:
@@ -15,6 +21,10 @@ class SmartBoilerClient:
     def __init__(
         self,
         session: aiohttp.ClientSession,
+        status_cache: StatusCache = None,
+        base_url: str = BASE_URL,
+        request_executor: RequestExecutor = None,
+        shadow: DeviceShadow = None,
     ):
         """
         Initialize the Eldom smart boiler API client.
@@ -22,8 +32,16 @@ class SmartBoilerClient:
         Make sure to login with the login method before using the other methods of the client.
 
         :param session: A session object.
+        :param status_cache: An optional cache for the device statuses.
+        :param base_url: The base URL of the API.
+        :param request_executor: An optional request executor, e.g. one with a retry policy. Defaults to plain requests on the session.
+        :param shadow: An optional device shadow to keep up to date with the statuses and commands.
         """
         self.session = session
+        self.status_cache = status_cache
+        self.base_url = base_url
+        self.request_executor = request_executor or RequestExecutor(session)
+        self.shadow = shadow
 
     async def get_smart_boiler_status(self, device_id):
         """
@@ -32,20 +50,23 @@ class SmartBoilerClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/smartboiler/{device_id}"
-        response = await self.session.get(url)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-        boiler_json = json.loads(response_json.get("objectJson"))
-
-        supported_boiler_fields = {
-            field.name for field in SmartBoilerDetails.__dataclass_fields__.values()
-        }
-        filtered_boiler_json = {
-            k: v for k, v in boiler_json.items() if k in supported_boiler_fields
-        }
-
-        return SmartBoilerDetails(**filtered_boiler_json)
+        if self.status_cache is None:
+            return await self._fetch_smart_boiler_status(device_id)
+        return await self.status_cache.get(
+            ("smart_boiler", device_id), lambda: self._fetch_smart_boiler_status(device_id)
+        )
+
+    async def _fetch_smart_boiler_status(self, device_id):
+        fetched_at = time.monotonic()
+        url = f"{self.base_url}/api/smartboiler/{device_id}"
+        response = await self.request_executor.request(
+            "GET", url, device_key=device_id, idempotent=True
+        )
+        boiler_json = await read_object_json(response)
+        status = decode(SmartBoilerDetails, boiler_json)
+        self._report_status(device_id, status, fetched_at)
+
+        return status
 
     async def set_smart_boiler_state(self, device_id, state):
         """
@@ -55,10 +76,15 @@ class SmartBoilerClient:
         :param state: The state to set (e.g., 0 to turn off, 1 to turn on heating, 2 to turn on Smart mode, 3 to turn on Study mode).
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/smartboiler/setState"
+        url = f"{self.base_url}/api/smartboiler/setState"
         payload = {"deviceId": device_id, "state": state}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"State": state})
 
     async def set_smart_boiler_powerful_mode_on(self, device_id):
         """
@@ -67,10 +93,15 @@ class SmartBoilerClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/smartboiler/setHeater"
+        url = f"{self.base_url}/api/smartboiler/setHeater"
         payload = {"deviceId": device_id, "heater": True}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"Heater": True})
 
     async def set_smart_boiler_temperature(self, device_id, temperature):
         """
@@ -80,10 +111,15 @@ class SmartBoilerClient:
         :param temperature: The temperature to set.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/smartboiler/setTemperature"
+        url = f"{self.base_url}/api/smartboiler/setTemperature"
         payload = {"deviceId": device_id, "temperature": temperature}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+        self._apply_to_shadow(device_id, {"SetTemp": temperature})
 
     async def reset_smart_boiler_energy_usage(self, device_id):
         """
@@ -92,7 +128,23 @@ class SmartBoilerClient:
         :param device_id: The device ID.
         :return: The response from the server.
         """
-        url = f"{BASE_URL}/api/smartboiler/resetEnergyDate"
+        url = f"{self.base_url}/api/smartboiler/resetEnergyDate"
         payload = {"deviceId": device_id}
-        response = await self.session.post(url, json=payload)
-        response.raise_for_status()
+        try:
+            await self.request_executor.request(
+                "POST", url, device_key=device_id, safe_write=True, json=payload
+            )
+        finally:
+            self._invalidate_status(device_id)
+
+    def _report_status(self, device_id, status, fetched_at):
+        if self.shadow is not None:
+            self.shadow.report(device_id, status, fetched_at)
+
+    def _apply_to_shadow(self, device_id, changes):
+        if self.shadow is not None:
+            self.shadow.apply(device_id, changes)
+
+    def _invalidate_status(self, device_id):
+        if self.status_cache is not None:
+            self.status_cache.invalidate(("smart_boiler", device_id))
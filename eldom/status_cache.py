@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+
+class StatusCache:
+    """
+    Device status cache with request coalescing.
+
+    Concurrent reads of the same key share a single fetch, and successful results are
+    cached for `ttl` seconds. Failed fetches are not cached. Invalidating a key drops both
+    its cached value and any fetch in flight, so that the next read goes to the server.
+
+    The device clients invalidate a device after every write attempt, including failed ones,
+    as a write that timed out may still have been applied by the device.
+    """
+
+    def __init__(self, ttl: float):
+        """
+        Initialize the status cache.
+
+        :param ttl: How many seconds to cache a status for. Use 0 to only coalesce concurrent reads.
+        """
+        self.ttl = ttl
+
+        self._entries = {}
+        self._in_flight = {}
+
+    async def get(self, key, fetch):
+        """
+        Get a cached status, or fetch it if there is no fresh one.
+
+        :param key: The cache key, e.g. a (device kind, device ID) tuple.
+        :param fetch: A coroutine function fetching the status from the server.
+        :return: The status.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            task.add_done_callback(_consume_exception)
+            self._in_flight[key] = task
+
+        # Shield the shared fetch so that a cancelled caller doesn't cancel it for the others.
+        return await asyncio.shield(task)
+
+    def invalidate(self, key):
+        """
+        Drop the cached status for a key.
+
+        :param key: The cache key.
+        """
+        self._entries.pop(key, None)
+        self._in_flight.pop(key, None)
+
+    def clear(self):
+        """
+        Drop all cached statuses.
+        """
+        self._entries.clear()
+        self._in_flight.clear()
+
+    async def _fetch(self, key, fetch):
+        task = asyncio.current_task()
+        try:
+            value = await fetch()
+        finally:
+            # Only the latest fetch for a key may complete it; invalidated fetches are stale.
+            is_current = self._in_flight.get(key) is task
+            if is_current:
+                del self._in_flight[key]
+
+        if is_current and self.ttl > 0:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+        return value
+
+
+def _consume_exception(task):
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,215 @@
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _has_coroutine_methods(cls):
+    return any(
+        inspect.iscoroutinefunction(member) or inspect.isasyncgenfunction(member)
+        for _, member in inspect.getmembers(cls, inspect.isfunction)
+    )
+
+
+class _LoopThread:
+    """
+    An event loop running forever in a daemon thread.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="pyeldom-sync", daemon=True
+        )
+        self._thread.start()
+
+    def run(self, coroutine, timeout=None):
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("Blocking calls can't be made from the event loop thread of the client")
+
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class _SyncIterator:
+    """
+    A blocking iterator over an async iterator running on the loop thread.
+    """
+
+    def __init__(self, loop_thread, iterator):
+        self._loop_thread = loop_thread
+        self._iterator = iterator
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._loop_thread.run(self._next())
+        except StopAsyncIteration:
+            raise StopIteration from None
+
+    async def _next(self):
+        return await self._iterator.__anext__()
+
+    def close(self):
+        """
+        Stop the iteration, e.g. to end a `watch` early.
+        """
+        aclose = getattr(self._iterator, "aclose", None)
+        if aclose is not None:
+            self._loop_thread.run(aclose())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _SyncProxy:
+    """
+    Blocking access to an object living on the loop thread.
+
+    Methods run on the loop thread and block until they're done. Async generators become
+    blocking iterators, and attributes with async methods, like the device clients, become
+    proxies themselves. Other attributes are returned as they are.
+    """
+
+    def __init__(self, loop_thread, target, timeout):
+        self._loop_thread = loop_thread
+        self._target = target
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._proxies = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+        with self._lock:
+            proxy = self._proxies.get(name)
+            if proxy is not None:
+                return proxy
+
+            # Attributes like the lazily created device clients are resolved on the loop thread.
+            value = self._loop_thread.run(self._resolve(name), self._timeout)
+            if callable(value):
+                proxy = self._blocking(value)
+            elif _has_coroutine_methods(type(value)):
+                proxy = _SyncProxy(self._loop_thread, value, self._timeout)
+            else:
+                return value
+
+            self._proxies[name] = proxy
+            return proxy
+
+    async def _resolve(self, name):
+        return getattr(self._target, name)
+
+    def _blocking(self, func):
+        loop_thread = self._loop_thread
+        timeout = self._timeout
+
+        async def call(args, kwargs):
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+        def blocking(*args, **kwargs):
+            result = loop_thread.run(call(args, kwargs), timeout)
+            if inspect.isasyncgen(result):
+                # A step may wait long on purpose, e.g. for the next poll of `watch`, so it has no timeout.
+                return _SyncIterator(loop_thread, result)
+            return result
+
+        blocking.__name__ = getattr(func, "__name__", "blocking")
+        blocking.__doc__ = getattr(func, "__doc__", None)
+        return blocking
+
+
+class SyncClient(_SyncProxy):
+    """
+    A blocking facade of an async API client for synchronous code.
+
+    The client lives on an event loop running in a background thread for the lifetime of the
+    facade, so its session, connections and token are reused by all calls, instead of being
+    set up again for every call like with `asyncio.run`. Calls are safe from any number of
+    threads, and calls from different threads run concurrently.
+
+    Every method of the client is available as a blocking method, including the ones of the
+    device clients:
+
+        with SyncClient(Client.create(username, password)) as client:
+            for device in client.get_devices():
+                print(client.get_device_status(device))
+
+    Methods returning async iterators, like `watch`, return blocking iterators instead.
+    """
+
+    def __init__(self, client, timeout: float = None):
+        """
+        Initialize the facade and create the client on the background event loop.
+
+        :param client: An awaitable of the client, e.g. the result of `Client.create`, or an async function creating it. The client is created on the background event loop, as its session must be.
+        :param timeout: An optional timeout for every blocking call in seconds. A call that times out is cancelled.
+        """
+        loop_thread = _LoopThread()
+        try:
+            target = loop_thread.run(self._create(client), timeout)
+        except BaseException:
+            loop_thread.stop()
+            raise
+
+        super().__init__(loop_thread, target, timeout)
+
+    @staticmethod
+    async def _create(client):
+        if callable(client):
+            client = client()
+        return await client
+
+    @property
+    def client(self):
+        """
+        The async client, to be used only on `loop`.
+        """
+        return self._target
+
+    @property
+    def loop(self):
+        """
+        The background event loop of the client.
+        """
+        return self._loop_thread.loop
+
+    def close(self):
+        """
+        Close the client and stop the background event loop.
+        """
+        if self._loop_thread.loop.is_closed():
+            return
+
+        try:
+            self._loop_thread.run(self._target.close(), self._timeout)
+        finally:
+            self._loop_thread.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,64 @@
+class _NoopSpan:
+    """
+    A span that does nothing, used while tracing is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_tracer = None
+
+
+def enable_tracing(tracer=None):
+    """
+    Enable tracing of the phases of the API calls: token, crc, encrypt, http, json and model.
+
+    Spans are named "pyeldom.<phase>", and are children of the span current at the time of the call.
+
+    :param tracer: An OpenTelemetry compatible tracer. Defaults to the "pyeldom" tracer of the global OpenTelemetry tracer provider.
+    :return: True if tracing was enabled, False if no tracer was given and OpenTelemetry is not installed.
+    """
+    global _tracer
+
+    if tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            return False
+        tracer = trace.get_tracer("pyeldom")
+
+    _tracer = tracer
+    return True
+
+
+def disable_tracing():
+    """
+    Disable tracing.
+    """
+    global _tracer
+
+    _tracer = None
+
+
+def span(name, **attributes):
+    """
+    Start a span for a phase of an API call.
+
+    While tracing is disabled this returns a shared no-op span, so disabled tracing costs a
+    function call per phase.
+
+    :param name: The phase name, without the "pyeldom." prefix.
+    :param attributes: The span attributes.
+    :return: A context manager of the span.
+    """
+    if _tracer is None:
+        return _NOOP_SPAN
+    return _tracer.start_as_current_span(f"pyeldom.{name}", attributes=attributes)
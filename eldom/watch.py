@@ -0,0 +1,78 @@
+import asyncio
+import time
+from dataclasses import fields
+from functools import lru_cache
+from operator import attrgetter
+
+from .fanout import gather_bounded
+from .models import DeviceChange
+
+
+@lru_cache(maxsize=None)
+def _field_getter(model):
+    names = tuple(model_field.name for model_field in fields(model))
+    return names, attrgetter(*names)
+
+
+def diff(previous, current):
+    """
+    Get the fields of a status that changed since the previous status of the same device.
+
+    :param previous: The previous status, or None if there is none.
+    :param current: The current status.
+    :return: A dict of the changed field names to their current values. All fields if there is no previous status.
+    """
+    names, get_values = _field_getter(type(current))
+    current_values = get_values(current)
+    if len(names) == 1:
+        current_values = (current_values,)
+
+    if previous is None or type(previous) is not type(current):
+        return dict(zip(names, current_values))
+
+    previous_values = get_values(previous)
+    if len(names) == 1:
+        previous_values = (previous_values,)
+    if previous_values == current_values:
+        return {}
+
+    return {
+        name: current_value
+        for name, previous_value, current_value in zip(
+            names, previous_values, current_values
+        )
+        if previous_value != current_value
+    }
+
+
+async def watch(devices, get_status, interval, concurrency):
+    """
+    Poll the status of devices periodically and yield only what changed.
+
+    The first poll of a device yields all of its fields. A failed poll yields a change with the
+    error and keeps the last good status, so the next successful poll is diffed against it.
+
+    :param devices: The devices to watch.
+    :param get_status: A coroutine function taking a single device and returning its status.
+    :param interval: The time between the starts of two polls in seconds.
+    :param concurrency: The maximum number of status requests in flight at once.
+    :return: An async iterator of device changes.
+    """
+    devices = list(devices)
+    snapshots = [None] * len(devices)
+
+    while True:
+        started = time.monotonic()
+        results = await gather_bounded(devices, get_status, concurrency)
+
+        for index, result in enumerate(results):
+            if not result.ok:
+                yield DeviceChange(result.device, error=result.error)
+                continue
+
+            changes = diff(snapshots[index], result.result)
+            snapshots[index] = result.result
+            if changes:
+                yield DeviceChange(result.device, changes)
+
+        await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
@@ -0,0 +1,12 @@
+import importlib
+
+
+def __getattr__(name):
+    # Submodules are imported on first access, so importing the package alone stays cheap.
+    try:
+        module = importlib.import_module(f"{__name__}.{name}")
+    except ModuleNotFoundError as err:
+        if err.name != f"{__name__}.{name}":
+            raise
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return module
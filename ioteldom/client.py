@@ -1,9 +1,28 @@
-import json
+import asyncio
+from functools import cached_property
+
 import aiohttp
 
-from .convector_heater import ConvectorHeaterClient
-from .constants import BASE_URL
-from .flat_boiler import FlatBoilerClient
+from eldom.codec import read_json
+from eldom.command_queue import CommandQueue
+from eldom.credential_store import CredentialStore
+from eldom.decoding import decoder, decode
+from eldom.fanout import gather_bounded
+from eldom.constants import DEFAULT_POLL_CONCURRENCY, DEFAULT_WATCH_INTERVAL
+from eldom.metrics import MetricsHook
+from eldom.request_executor import RequestExecutor
+from eldom.retry import CircuitBreaker, RetryPolicy
+from eldom.session import DEFAULT_TIMEOUT, ClientFactory, create_session
+from eldom.shadow import DeviceShadow
+from eldom.status_cache import StatusCache
+from eldom.watch import watch
+
+from .constants import (
+    BASE_URL,
+    CONVECTOR_HEATER_MODEL,
+    DEVICE_PAGE_SIZE,
+    FLAT_BOILER_MODEL,
+)
 from .models import Device, User
 from .token_provider import TokenProvider
 
@@ -12,6 +31,10 @@ class InvalidCredentialsError(Exception):
     """Raised when the API rejects the session as unauthorized (401/403)."""
 
 
+class UnsupportedDeviceError(Exception):
+    """Raised when a device's model has no matching device client."""
+
+
 class Client:
     """
     Eldom main API client for the `iot.myeldom.com` APIs.
@@ -21,6 +44,10 @@ class Client:
     It also offers access to a convector heater client.
 
     Before using the client, you need to login with the login method.
+
+    The client closes its session on close only if it owns it. A session passed to the
+    constructor is owned unless `owns_session=False` is given, e.g. when it is shared with other
+    clients. A session created by `Client.create` is always owned.
     """
 
     def __init__(
@@ -28,6 +55,16 @@ class Client:
         session: aiohttp.ClientSession,
         username: str,
         password: str,
+        credential_store: CredentialStore = None,
+        status_cache_ttl: float = None,
+        base_url: str = BASE_URL,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: CircuitBreaker = None,
+        metrics: MetricsHook = None,
+        owns_session: bool = True,
+        command_debounce: float = None,
+        device_shadow: bool = False,
+        token_refresh_margin: float = 60,
     ):
         """
         Initialize the Eldom API client.
@@ -35,18 +72,123 @@ class Client:
         Make sure to login with the login method before using the other methods of the client.
 
         :param session: A session object.
+        :param username: The username for login.
+        :param password: The password for login.
+        :param credential_store: An optional store to persist the token in between restarts.
+        :param status_cache_ttl: If set, device statuses are cached for this many seconds and concurrent reads of the same device share one request. Use 0 to only share concurrent reads.
+        :param base_url: The base URL of the API.
+        :param retry_policy: An optional retry policy for transient failures.
+        :param circuit_breaker: An optional per-device circuit breaker, keyed by device UUID.
+        :param metrics: An optional hook receiving the metrics of every request and token refresh, e.g. a PrometheusMetrics.
+        :param owns_session: Whether the client owns the session and closes it on close.
+        :param command_debounce: If set, commands are sent one at a time per device, and a command waits this many seconds to be replaced by a newer one of the same kind before it is sent. Use 0 to only serialize the commands.
+        :param device_shadow: Whether to keep the latest known status of every device, updated by polls and by the effects of successful commands. See get_device_shadow.
+        :param token_refresh_margin: How many seconds before the expiry of the token to start refreshing it.
         """
         self.session = session
-        self.token_provider = TokenProvider(session, username, password)
+        self.owns_session = owns_session
+        self.base_url = base_url
+        self.request_executor = RequestExecutor(
+            session, retry_policy, circuit_breaker, metrics
+        )
+        self.token_provider = TokenProvider(
+            session,
+            username,
+            password,
+            refresh_margin=token_refresh_margin,
+            credential_store=credential_store,
+            base_url=base_url,
+            request_executor=self.request_executor,
+        )
+        self.request_executor.on_unauthorized = self.token_provider.reauthenticate
+
+        self.status_cache = (
+            StatusCache(status_cache_ttl) if status_cache_ttl is not None else None
+        )
+
+        self.command_queue = (
+            CommandQueue(command_debounce) if command_debounce is not None else None
+        )
+
+        self.shadow = DeviceShadow() if device_shadow else None
+
+    @cached_property
+    def convector_heater(self):
+        """
+        The convector heater client, loaded on first use.
+        """
+        from .convector_heater import ConvectorHeaterClient
+
+        return ConvectorHeaterClient(
+            self.session,
+            self.token_provider,
+            self.status_cache,
+            self.base_url,
+            self.request_executor,
+            self.command_queue,
+            self.shadow,
+        )
+
+    @cached_property
+    def flat_boiler(self):
+        """
+        The flat boiler client, loaded on first use.
+        """
+        from .flat_boiler import FlatBoilerClient
+
+        return FlatBoilerClient(
+            self.session,
+            self.token_provider,
+            self.status_cache,
+            self.base_url,
+            self.request_executor,
+            self.command_queue,
+            self.shadow,
+        )
+
+    @classmethod
+    def create(
+        cls,
+        username: str,
+        password: str,
+        concurrency: int = DEFAULT_POLL_CONCURRENCY,
+        timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+        **kwargs,
+    ):
+        """
+        Create a client with its own session, tuned for polling with the given concurrency.
 
-        self.convector_heater = ConvectorHeaterClient(session, self.token_provider)
-        self.flat_boiler = FlatBoilerClient(session, self.token_provider)
+        Either await the result, or use it as an async context manager to close the client on exit:
+
+            async with Client.create(username, password) as client:
+                devices = await client.get_devices()
+
+        :param username: The username for login.
+        :param password: The password for login.
+        :param concurrency: The maximum number of requests in flight, i.e. the size of the connection pool.
+        :param timeout: The default timeouts of the requests.
+        :param kwargs: The other arguments of the client, except for the session.
+        :return: An awaitable async context manager of the client.
+        """
+
+        async def create_client():
+            session = create_session(concurrency, timeout)
+            return cls(session, username, password, owns_session=True, **kwargs)
+
+        return ClientFactory(create_client)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
 
     async def close(self):
         """
-        Close the session.
+        Close the session if the client owns it.
         """
-        await self.session.close()
+        if self.owns_session:
+            await self.session.close()
 
     async def get_user(self):
         """
@@ -55,21 +197,17 @@ class Client:
         :return: The user information.
         """
 
-        user_url = f"{BASE_URL}/api/account"
+        user_url = f"{self.base_url}/api/account"
         headers = {
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:144.0) Gecko/20100101 Firefox/144.0",
             "Authorization": f"Bearer {await self.token_provider.provide()}",
         }
-        response = await self.session.get(user_url, headers=headers)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
+        response = await self.request_executor.request(
+            "GET", user_url, idempotent=True, headers=headers
+        )
+        response_json = await read_json(response)
 
-        supported_fields = {field.name for field in User.__dataclass_fields__.values()}
-        filtered_user_json = {
-            k: v for k, v in response_json.items() if k in supported_fields
-        }
-
-        return User(**filtered_user_json)
+        return decode(User, response_json)
 
     async def get_devices(self):
         """
@@ -77,28 +215,195 @@ class Client:
 
         :return: The devices information.
         """
+        return [device async for device in self.iter_devices()]
+
+    async def iter_devices(self, page_size=DEVICE_PAGE_SIZE):
+        """
+        Iterate over the devices information, page by page.
+
+        The next page is requested while the devices of the current one are being consumed,
+        so work on the first devices can start before the whole list is fetched.
+
+        :param page_size: The number of devices to request per page.
+        :return: An async iterator of the devices information.
+        """
+        if page_size < 1:
+            raise ValueError(f"Page size must be at least 1, got {page_size}")
+
+        decode_device = decoder(Device)
+        page = 1
+        next_page = asyncio.ensure_future(self._get_device_page(page, page_size))
+        try:
+            while next_page is not None:
+                devices_json = await next_page
+                next_page = None
+                if len(devices_json) >= page_size:
+                    page += 1
+                    next_page = asyncio.ensure_future(
+                        self._get_device_page(page, page_size)
+                    )
+
+                for device_json in devices_json:
+                    yield decode_device(device_json)
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+                next_page.add_done_callback(_consume_exception)
 
-        devices_url = f"{BASE_URL}/api/device-list?page=1&size=1000"
+    async def _get_device_page(self, page, page_size):
+        devices_url = f"{self.base_url}/api/device-list"
+        params = {"page": page, "size": page_size}
         headers = {
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:144.0) Gecko/20100101 Firefox/144.0",
             "Authorization": f"Bearer {await self.token_provider.provide()}",
             "Content-Type": "application/json",
             "ionic-idd": "0",
         }
-        response = await self.session.get(devices_url, headers=headers)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-        devices = []
-        for device_json in response_json:
-            supported_fields = {
-                field.name for field in Device.__dataclass_fields__.values()
-            }
-            filtered_json = {
-                k: v for k, v in device_json.items() if k in supported_fields
-            }
-
-            devices.append(Device(**filtered_json))
-        return devices
+        response = await self.request_executor.request(
+            "GET", devices_url, idempotent=True, params=params, headers=headers
+        )
+        return await read_json(response)
+
+    async def get_device_status(self, device: Device):
+        """
+        Get the status of a device, using the device client that matches its model.
+
+        :param device: The device object.
+        :return: The status details of the device.
+        :raises UnsupportedDeviceError: If the device model is not supported.
+        """
+        if device.model == CONVECTOR_HEATER_MODEL:
+            return await self.convector_heater.get_convector_heater_status(device)
+        if device.model == FLAT_BOILER_MODEL:
+            return await self.flat_boiler.get_flat_boiler_status(device)
+        raise UnsupportedDeviceError(f"Unsupported device model: {device.model}")
+
+    async def poll_all(self, devices=None, concurrency=DEFAULT_POLL_CONCURRENCY):
+        """
+        Get the status of many devices concurrently.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result.
+
+        :param devices: The devices to poll. Defaults to all devices returned by get_devices.
+        :param concurrency: The maximum number of status requests in flight at once.
+        :return: A list of device results, in the same order as the devices.
+        """
+        if devices is None:
+            devices = await self.get_devices()
+        return await gather_bounded(devices, self.get_device_status, concurrency)
+
+    def get_device_shadow(self, device: Device):
+        """
+        Get the latest known status of a device without making a request.
+
+        Requires the client to be created with `device_shadow=True`.
+
+        :param device: The device object.
+        :return: The latest polled status with the effects of later successful commands applied, or None if the device was never polled.
+        """
+        if self.shadow is None:
+            raise ValueError("The device shadow is not enabled")
+        return self.shadow.get(device.uuid)
+
+    async def set_device_state(self, device: Device, state: int):
+        """
+        Set the state of a device, using the device client that matches its model.
+
+        :param device: The device object.
+        :param state: The state to set. See the state setter of the matching device client for the values.
+        :return: The parsed state change response, if the device client returns one.
+        :raises UnsupportedDeviceError: If the device model is not supported.
+        """
+        if device.model == CONVECTOR_HEATER_MODEL:
+            return await self.convector_heater.set_convector_heater_state(device, state)
+        if device.model == FLAT_BOILER_MODEL:
+            return await self.flat_boiler.set_flat_boiler_state(device, state)
+        raise UnsupportedDeviceError(f"Unsupported device model: {device.model}")
+
+    async def set_device_temperature(self, device: Device, temperature: int):
+        """
+        Set the temperature of a device, using the device client that matches its model.
+
+        Only convector heaters support setting the temperature.
+
+        :param device: The device object.
+        :param temperature: The temperature to set.
+        :return: The parsed state change response.
+        :raises UnsupportedDeviceError: If the device model is not supported.
+        """
+        if device.model == CONVECTOR_HEATER_MODEL:
+            return await self.convector_heater.set_convector_heater_temperature(
+                device, temperature
+            )
+        raise UnsupportedDeviceError(
+            f"Setting the temperature is not supported for device model: {device.model}"
+        )
+
+    async def set_state_many(
+        self, devices, state, concurrency=DEFAULT_POLL_CONCURRENCY, timeout=None
+    ):
+        """
+        Set the state of many devices concurrently.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result.
+
+        :param devices: The devices to set the state of.
+        :param state: The state to set.
+        :param concurrency: The maximum number of requests in flight at once.
+        :param timeout: An optional deadline in seconds for the whole batch. Devices not done by then get an asyncio.TimeoutError.
+        :return: A list of device results, in the same order as the devices.
+        """
+        return await gather_bounded(
+            devices,
+            lambda device: self.set_device_state(device, state),
+            concurrency,
+            timeout,
+        )
+
+    async def set_temperature_many(
+        self, devices, temperature, concurrency=DEFAULT_POLL_CONCURRENCY, timeout=None
+    ):
+        """
+        Set the temperature of many devices concurrently.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result.
+
+        :param devices: The devices to set the temperature of.
+        :param temperature: The temperature to set.
+        :param concurrency: The maximum number of requests in flight at once.
+        :param timeout: An optional deadline in seconds for the whole batch. Devices not done by then get an asyncio.TimeoutError.
+        :return: A list of device results, in the same order as the devices.
+        """
+        return await gather_bounded(
+            devices,
+            lambda device: self.set_device_temperature(device, temperature),
+            concurrency,
+            timeout,
+        )
+
+    async def watch(
+        self,
+        devices=None,
+        interval=DEFAULT_WATCH_INTERVAL,
+        concurrency=DEFAULT_POLL_CONCURRENCY,
+    ):
+        """
+        Poll the status of many devices periodically and yield only the fields that changed.
+
+        The first poll of a device yields all of its fields. A failed poll yields a change with
+        the error instead, without stopping the watch.
+
+        :param devices: The devices to watch. Defaults to all devices returned by get_devices.
+        :param interval: The time between the starts of two polls in seconds.
+        :param concurrency: The maximum number of status requests in flight at once.
+        :return: An async iterator of device changes.
+        """
+        if devices is None:
+            devices = await self.get_devices()
+        async for change in watch(
+            devices, self.get_device_status, interval, concurrency
+        ):
+            yield change
 
     async def is_connected(self):
         """
@@ -114,9 +419,16 @@ class Client:
             return True
         except aiohttp.ClientResponseError as err:
             if err.status in (401, 403):
+                self.token_provider.invalidate()
                 raise InvalidCredentialsError(
                     "Invalid email or password"
                 ) from err
             return False
         except Exception:
             return False
+
+
+def _consume_exception(task):
+    # A prefetched page may fail after the caller stopped iterating; nobody awaits it anymore.
+    if not task.cancelled():
+        task.exception()
@@ -1 +1,6 @@
 BASE_URL = "https://iot.myeldom.com"
+
+CONVECTOR_HEATER_MODEL = "HTRCNV"
+FLAT_BOILER_MODEL = "BLR2T"
+
+DEVICE_PAGE_SIZE = 100
@@ -1,9 +1,18 @@
-import json
+import time
+
 import aiohttp
 
+from eldom.codec import read_json
+from eldom.command_queue import CommandQueue
+from eldom.decoding import decode
+from eldom.request_executor import RequestExecutor
+from eldom.shadow import DeviceShadow
+from eldom.status_cache import StatusCache
+from eldom.tracing import span
+
 from .constants import BASE_URL
 from .models import ConvectorHeaterDetails, ConvectorHeaterStateChangeResponse, Device
-from .crc import crc32
+from .direct_request import build_direct_request
 from .token_provider import TokenProvider
 
 
@@ -18,6 +27,11 @@ class ConvectorHeaterClient:
         self,
         session: aiohttp.ClientSession,
         token_provider: TokenProvider,
+        status_cache: StatusCache = None,
+        base_url: str = BASE_URL,
+        request_executor: RequestExecutor = None,
+        command_queue: CommandQueue = None,
+        shadow: DeviceShadow = None,
     ):
         """
         Initialize the Eldom convector heater API client.
@@ -26,9 +40,19 @@ class ConvectorHeaterClient:
 
         :param session: A session object.
         :param token_provider: A token provider object.
+        :param status_cache: An optional cache for the device statuses.
+        :param base_url: The base URL of the API.
+        :param request_executor: An optional request executor, e.g. one with a retry policy. Defaults to plain requests on the session.
+        :param command_queue: An optional queue to serialize and debounce the commands per device.
+        :param shadow: An optional device shadow to keep up to date with the statuses and commands.
         """
         self.session = session
         self.token_provider = token_provider
+        self.status_cache = status_cache
+        self.base_url = base_url
+        self.request_executor = request_executor or RequestExecutor(session)
+        self.command_queue = command_queue
+        self.shadow = shadow
 
     async def get_convector_heater_status(self, device: Device):
         """
@@ -37,13 +61,21 @@ class ConvectorHeaterClient:
         :param device: The device object.
         :return: The response from the server.
         """
-
+        with span("convector_heater.get_status", device=device.uuid):
+            if self.status_cache is None:
+                return await self._fetch_convector_heater_status(device)
+            return await self.status_cache.get(
+                ("convector_heater", device.uuid), lambda: self._fetch_convector_heater_status(device)
+            )
+
+    async def _fetch_convector_heater_status(self, device: Device):
         # Example curl request:
         # curl -H "ionic-idd: <DEVICE_UUID>" -H "authorization: Bearer <TOKEN>" -H "user-agent: Mozilla/5.0 (Linux; Android 14; sdk_gphone64_arm64 Build/UE1A.230829.050; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/113.0.5672.136 Mobile Safari/537.36" -H "content-type: application/json" --data-binary "{\"ID\":\"R7alOFhj9kDslr2X\",\"Req\":\"GetStatus\",\"CID\":\"1\",\"CRC\":\"DD80A782\"}" --compressed "https://iot.myeldom.com/api/direct-req"
 
         # Notes: The 'ionic-idd' header is the device UUID, while the ID in the body is the device pair token, lol
 
-        url = f"{BASE_URL}/api/direct-req"
+        fetched_at = time.monotonic()
+        url = f"{self.base_url}/api/direct-req"
         headers = {
             "ionic-idd": device.uuid,
             "Authorization": f"Bearer {await self.token_provider.provide()}",
@@ -51,25 +83,22 @@ class ConvectorHeaterClient:
             "Content-Type": "application/json",
         }
 
-        payload = {
-            "ID": device.pairTok,
-            "Req": "GetStatus",
-            "CID": "1",
-        }
-        payload["CRC"] = crc32(payload)
+        body = build_direct_request(device.pairTok, "GetStatus")
 
-        response = await self.session.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
+        response = await self.request_executor.request(
+            "POST",
+            url,
+            device_key=device.uuid,
+            idempotent=True,
+            endpoint="/api/direct-req:GetStatus",
+            data=body,
+            headers=headers,
+        )
+        response_json = await read_json(response)
+        status = decode(ConvectorHeaterDetails, response_json)
+        self._report_status(device, status, fetched_at)
 
-        supported_heater_fields = {
-            field.name for field in ConvectorHeaterDetails.__dataclass_fields__.values()
-        }
-        filtered_heater_json = {
-            k: v for k, v in response_json.items() if k in supported_heater_fields
-        }
-
-        return ConvectorHeaterDetails(**filtered_heater_json)
+        return status
 
     async def set_convector_heater_state(self, device: Device, state: int):
         """
@@ -81,7 +110,12 @@ class ConvectorHeaterClient:
         :param state: The state to set (e.g., 0 to turn off, 16 to turn on).
         :return: The response from the server.
         """
+        with span("convector_heater.set_state", device=device.uuid):
+            return await self._submit_command(
+                device, "state", lambda: self._send_convector_heater_state(device, state)
+            )
 
+    async def _send_convector_heater_state(self, device: Device, state: int):
         # Example curl request:
         # curl -H -H "ionic-idd: <DEVICE_UUID>" -H "authorization: Bearer <TOKEN>" -H "user-agent: Mozilla/5.0 (Linux; Android 14; sdk_gphone64_arm64 Build/UE1A.230829.050; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/113.0.5672.136 Mobile Safari/537.36" -H "content-type: application/json" --data-binary "{\"ID\":\"R7alOFhj9kDslr2X\",\"Req\":\"On\",\"CID\":\"1\",\"CRC\":\"81D7BD02\"}" --compressed "https://iot.myeldom.com/api/direct-req"
 
@@ -89,7 +123,10 @@ class ConvectorHeaterClient:
 
         states_map = {0: "Off", 16: "On"}
 
-        url = f"{BASE_URL}/api/direct-req"
+        if state not in states_map:
+            raise ValueError(f"Invalid state: {state}. Supported states (are the keys): {states_map}")
+
+        url = f"{self.base_url}/api/direct-req"
         headers = {
             "ionic-idd": device.uuid,
             "Authorization": f"Bearer {await self.token_provider.provide()}",
@@ -97,26 +134,26 @@ class ConvectorHeaterClient:
             "Content-Type": "application/json",
         }
 
-        payload = {
-            "ID": device.pairTok,
-            "Req": states_map[state],
-            "CID": "1",
-        }
-        payload["CRC"] = crc32(payload)
-
-        response = await self.session.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-
-        supported_heater_fields = {
-            field.name
-            for field in ConvectorHeaterStateChangeResponse.__dataclass_fields__.values()
-        }
-        filtered_heater_json = {
-            k: v for k, v in response_json.items() if k in supported_heater_fields
-        }
-
-        return ConvectorHeaterStateChangeResponse(**filtered_heater_json)
+        body = build_direct_request(device.pairTok, states_map[state])
+
+        try:
+            response = await self.request_executor.request(
+                "POST",
+                url,
+                device_key=device.uuid,
+                safe_write=True,
+                endpoint=f"/api/direct-req:{states_map[state]}",
+                data=body,
+                headers=headers,
+            )
+        finally:
+            self._invalidate_status(device)
+        response_json = await read_json(response)
+        state_change = decode(ConvectorHeaterStateChangeResponse, response_json)
+        if state_change.Code == "0":
+            self._apply_to_shadow(device, {"Operation": str(state)}, confirmed=True)
+
+        return state_change
 
     async def set_convector_heater_temperature(self, device: Device, temperature: int):
         """
@@ -126,13 +163,20 @@ class ConvectorHeaterClient:
         :param temperature: The temperature to set. Use an integer value (e.g., 22 for 22C).
         :return: The response from the server.
         """
-
+        with span("convector_heater.set_temperature", device=device.uuid):
+            return await self._submit_command(
+                device,
+                "temperature",
+                lambda: self._send_convector_heater_temperature(device, temperature),
+            )
+
+    async def _send_convector_heater_temperature(self, device: Device, temperature: int):
         # Example curl request:
         # curl -H "ionic-idd: <DEVICE_UUID>" -H "authorization: Bearer <TOKEN>" -H "user-agent: Mozilla/5.0 (Linux; Android 14; sdk_gphone64_arm64 Build/UE1A.230829.050; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/113.0.5672.136 Mobile Safari/537.36" -H "content-type: application/json" --data-binary "{\"ID\":\"R7alOFhj9kDslr2X\",\"Req\":\"SetParams\",\"TSet\":\"22\",\"AutoTimeSet\":\"1\",\"Rate1\":\"06:00\",\"Rate2\":\"22:00\",\"SystemSettings\":\"1, 2, 2, 0\",\"Lock\":\"0\",\"CID\":\"1\",\"CRC\":\"1A61D4E8\"}" --compressed "https://iot.myeldom.com/api/direct-req"
 
         # Notes: The 'ionic-idd' header is the device UUID, while the ID in the body is the device pair token
 
-        url = f"{BASE_URL}/api/direct-req"
+        url = f"{self.base_url}/api/direct-req"
         headers = {
             "ionic-idd": device.uuid,
             "Authorization": f"Bearer {await self.token_provider.provide()}",
@@ -140,9 +184,7 @@ class ConvectorHeaterClient:
             "Content-Type": "application/json",
         }
 
-        payload = {
-            "ID": device.pairTok,
-            "Req": "SetParams",
+        params = {
             "TSet": str(temperature),
 
             # TODO: Find and replace those parameters with their actual current values instead of hardcoding.
@@ -151,21 +193,41 @@ class ConvectorHeaterClient:
             "Rate2": "22:00",
             "SystemSettings": "1, 2, 2, 0",
             "Lock": "0",
-
-            "CID": "1",
         }
-        payload["CRC"] = crc32(payload)
-
-        response = await self.session.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
-
-        supported_heater_fields = {
-            field.name
-            for field in ConvectorHeaterStateChangeResponse.__dataclass_fields__.values()
-        }
-        filtered_heater_json = {
-            k: v for k, v in response_json.items() if k in supported_heater_fields
-        }
-
-        return ConvectorHeaterStateChangeResponse(**filtered_heater_json)
+        body = build_direct_request(device.pairTok, "SetParams", params)
+
+        try:
+            response = await self.request_executor.request(
+                "POST",
+                url,
+                device_key=device.uuid,
+                safe_write=True,
+                endpoint="/api/direct-req:SetParams",
+                data=body,
+                headers=headers,
+            )
+        finally:
+            self._invalidate_status(device)
+        response_json = await read_json(response)
+        state_change = decode(ConvectorHeaterStateChangeResponse, response_json)
+        if state_change.Code == "0":
+            self._apply_to_shadow(device, {"TSet": str(temperature * 10)}, confirmed=True)
+
+        return state_change
+
+    async def _submit_command(self, device: Device, kind, send):
+        if self.command_queue is None:
+            return await send()
+        return await self.command_queue.submit(device.uuid, kind, send)
+
+    def _report_status(self, device: Device, status, fetched_at):
+        if self.shadow is not None:
+            self.shadow.report(device.uuid, status, fetched_at)
+
+    def _apply_to_shadow(self, device: Device, changes, confirmed=False):
+        if self.shadow is not None:
+            self.shadow.apply(device.uuid, changes, confirmed)
+
+    def _invalidate_status(self, device: Device):
+        if self.status_cache is not None:
+            self.status_cache.invalidate(("convector_heater", device.uuid))
@@ -1,7 +1,6 @@
-import json
 import base64
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
+import binascii
+import json
 
 
 _key = bytes(
@@ -42,27 +41,238 @@ _key = bytes(
 )
 _init_vector = bytes([0] * 16)
 
+_block_size = 16
+
+
+class CryptoError(Exception):
+    """Raised when a payload can't be encrypted or decrypted."""
+
+
+class _CryptographyBackend:
+    """
+    AES backend using the `cryptography` package (OpenSSL).
+    """
+
+    name = "cryptography"
+
+    def __init__(self):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        algorithm = algorithms.AES(_key)
+        self._cbc = Cipher(algorithm, modes.CBC(_init_vector))
+
+        # ECB contexts are stateless between blocks, so they are created once and reused.
+        ecb = Cipher(algorithm, modes.ECB())
+        self.ecb_encrypt = ecb.encryptor().update
+        self.ecb_decrypt = ecb.decryptor().update
+
+    def cbc_encrypt(self, data):
+        encryptor = self._cbc.encryptor()
+        return encryptor.update(data) + encryptor.finalize()
+
+
+class _PycryptodomeBackend:
+    """
+    AES backend using the `pycryptodome` package.
+    """
+
+    name = "pycryptodome"
+
+    def __init__(self):
+        from Crypto.Cipher import AES
+
+        self._aes = AES
+
+        # ECB ciphers are stateless between blocks, so the key schedule is computed once and reused.
+        ecb = AES.new(_key, AES.MODE_ECB)
+        self.ecb_encrypt = ecb.encrypt
+        self.ecb_decrypt = ecb.decrypt
+
+    def cbc_encrypt(self, data):
+        return self._aes.new(_key, self._aes.MODE_CBC, iv=_init_vector).encrypt(data)
+
+
+_backends = {
+    _CryptographyBackend.name: _CryptographyBackend,
+    _PycryptodomeBackend.name: _PycryptodomeBackend,
+}
+_backend = None
+
+
+def use_backend(name):
+    """
+    Select the AES backend explicitly.
+
+    By default the `cryptography` backend is used when it's installed, and `pycryptodome` otherwise.
+
+    :param name: The backend name - "cryptography" or "pycryptodome".
+    """
+    global _backend
+
+    if name not in _backends:
+        raise ValueError(f"Unknown crypto backend: {name}. Supported backends: {list(_backends)}")
 
-def encrypt(payload_dict):
     try:
-        json_str = json.dumps(payload_dict)
-        cipher = AES.new(_key, AES.MODE_CBC, _init_vector)
-        padded_data = pad(json_str.encode("utf-8"), AES.block_size)
-        encrypted_bytes = cipher.encrypt(padded_data)
+        _backend = _backends[name]()
+    except ImportError as e:
+        raise CryptoError(f"Crypto backend {name} is not installed") from e
+
+
+def get_backend():
+    """
+    Get the AES backend in use, loading the default one on first use.
+
+    :return: The backend object.
+    """
+    global _backend
+
+    if _backend is None:
+        for backend_class in _backends.values():
+            try:
+                _backend = backend_class()
+                break
+            except ImportError:
+                continue
+        else:
+            raise CryptoError("No crypto backend installed. Install pycryptodome or cryptography.")
+
+    return _backend
 
-        return base64.b64encode(encrypted_bytes).decode("utf-8")
+
+def encrypt(payload):
+    """
+    Encrypt a payload into the `Msg` envelope format.
+
+    :param payload: The payload - a dict (serialized to JSON), a JSON string or JSON bytes.
+    :return: The base64 encoded ciphertext.
+    :raises CryptoError: If the payload can't be encrypted.
+    """
+    try:
+        encrypted_bytes = get_backend().cbc_encrypt(_pad(_to_bytes(payload)))
+    except CryptoError:
+        raise
     except Exception as e:
-        return f"Encryption Error: {e}"
+        raise CryptoError(f"Encryption error: {e}") from e
+
+    return base64.b64encode(encrypted_bytes).decode("ascii")
+
+
+def encrypt_many(payloads):
+    """
+    Encrypt many payloads at once.
+
+    The payloads are encrypted block by block across all messages, so each step is one call
+    into the AES backend instead of one call per message.
+
+    :param payloads: The payloads, in any format accepted by encrypt.
+    :return: The base64 encoded ciphertexts, in the same order as the payloads.
+    :raises CryptoError: If any of the payloads can't be encrypted.
+    """
+    try:
+        backend = get_backend()
+        padded_payloads = [_pad(_to_bytes(payload)) for payload in payloads]
+        encrypted_payloads = [bytearray() for _ in padded_payloads]
+        previous_blocks = [_init_vector] * len(padded_payloads)
+
+        longest = max((len(padded) for padded in padded_payloads), default=0)
+        for offset in range(0, longest, _block_size):
+            active = [
+                index
+                for index, padded in enumerate(padded_payloads)
+                if len(padded) > offset
+            ]
+            blocks = b"".join(
+                padded_payloads[index][offset:offset + _block_size] for index in active
+            )
+            chain = b"".join(previous_blocks[index] for index in active)
+            encrypted_blocks = backend.ecb_encrypt(_xor(blocks, chain))
+
+            for position, index in enumerate(active):
+                block = encrypted_blocks[position * _block_size:(position + 1) * _block_size]
+                previous_blocks[index] = block
+                encrypted_payloads[index] += block
+    except CryptoError:
+        raise
+    except Exception as e:
+        raise CryptoError(f"Encryption error: {e}") from e
+
+    return [base64.b64encode(encrypted).decode("ascii") for encrypted in encrypted_payloads]
 
 
 def decrypt(base64_ciphertext):
+    """
+    Decrypt a `Msg` envelope.
+
+    :param base64_ciphertext: The base64 encoded ciphertext.
+    :return: The decrypted JSON payload.
+    :raises CryptoError: If the ciphertext can't be decrypted.
+    """
+    return decrypt_many([base64_ciphertext])[0]
+
+
+def decrypt_many(base64_ciphertexts):
+    """
+    Decrypt many `Msg` envelopes at once, with a single call into the AES backend.
+
+    :param base64_ciphertexts: The base64 encoded ciphertexts.
+    :return: The decrypted JSON payloads, in the same order as the ciphertexts.
+    :raises CryptoError: If any of the ciphertexts can't be decrypted.
+    """
     try:
-        encrypted_bytes = base64.b64decode(base64_ciphertext)
-        cipher = AES.new(_key, AES.MODE_CBC, _init_vector)
-        decrypted_padded = cipher.decrypt(encrypted_bytes)
-        decrypted_bytes = unpad(decrypted_padded, AES.block_size)
-        decrypted_string = decrypted_bytes.decode("utf-8")
+        ciphertexts = [
+            base64.b64decode(ciphertext, validate=True) for ciphertext in base64_ciphertexts
+        ]
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise CryptoError(f"Decryption error: invalid base64 ciphertext: {e}") from e
 
-        return json.loads(decrypted_string)
+    for ciphertext in ciphertexts:
+        if not ciphertext or len(ciphertext) % _block_size:
+            raise CryptoError("Decryption error: ciphertext is not a whole number of AES blocks")
+
+    try:
+        # CBC decryption is ECB decryption of every block XOR-ed with the previous ciphertext block.
+        decrypted = _xor(
+            get_backend().ecb_decrypt(b"".join(ciphertexts)),
+            b"".join(_init_vector + ciphertext[:-_block_size] for ciphertext in ciphertexts),
+        )
+    except CryptoError:
+        raise
     except Exception as e:
-        return f"Decryption Error: {e}"
+        raise CryptoError(f"Decryption error: {e}") from e
+
+    payloads = []
+    offset = 0
+    for ciphertext in ciphertexts:
+        plaintext = _unpad(decrypted[offset:offset + len(ciphertext)])
+        offset += len(ciphertext)
+        try:
+            payloads.append(json.loads(plaintext))
+        except ValueError as e:
+            raise CryptoError(f"Decryption error: invalid JSON payload: {e}") from e
+
+    return payloads
+
+
+def _to_bytes(payload):
+    if isinstance(payload, bytes):
+        return payload
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    return json.dumps(payload).encode("utf-8")
+
+
+def _pad(data):
+    padding_length = _block_size - len(data) % _block_size
+    return data + bytes([padding_length]) * padding_length
+
+
+def _unpad(data):
+    padding_length = data[-1] if data else 0
+    padding = bytes([padding_length]) * padding_length
+    if not 1 <= padding_length <= _block_size or not data.endswith(padding):
+        raise CryptoError("Decryption error: invalid padding")
+    return data[:-padding_length]
+
+
+def _xor(left, right):
+    return (int.from_bytes(left, "big") ^ int.from_bytes(right, "big")).to_bytes(len(left), "big")
@@ -0,0 +1,82 @@
+import json
+import zlib
+from functools import lru_cache
+
+from eldom.tracing import span
+
+from .crypto import encrypt
+
+# Eldom's CRC is computed over the compact JSON serialization of the request without its
+# outer braces, and the apps send that same compact serialization as the body. The body is
+# therefore serialized once, and the bytes are used for both the CRC and the request.
+
+_CID = b',"CID":"1"'
+
+
+def build_direct_request(pair_tok, req, params=None):
+    """
+    Build the JSON body of a direct request.
+
+    The body holds the ID, Req, params, CID and CRC fields, in that order. The serialized
+    `"ID":"<pairTok>","Req":"<req>"` prefix and its CRC state are computed once per device
+    and request type, and bodies without params are cached whole.
+
+    :param pair_tok: The device pair token.
+    :param req: The request type, e.g. "GetStatus" or "SetParams".
+    :param params: Optional extra request fields, in the order they should be sent.
+    :return: The JSON body bytes.
+    """
+    with span("crc", req=req):
+        if not params:
+            return _build_static_direct_request(pair_tok, req)
+
+        prefix, prefix_crc = _prefix(pair_tok, req)
+        params_json = json.dumps(params, separators=(",", ":"))
+        rest = b"," + params_json[1:-1].encode("utf-8") + _CID
+
+        return _finish(prefix + rest, zlib.crc32(rest, prefix_crc))
+
+
+def build_encrypted_direct_request(pair_tok, req, params=None):
+    """
+    Build the JSON body of an encrypted direct request, i.e. the direct request wrapped in a `Msg` envelope.
+
+    Encryption is deterministic, so envelopes of requests without params are cached whole.
+
+    :param pair_tok: The device pair token.
+    :param req: The request type, e.g. "GetStatus" or "Off".
+    :param params: Optional extra request fields, in the order they should be sent.
+    :return: The JSON body bytes.
+    """
+    if not params:
+        with span("encrypt", req=req):
+            return _build_static_encrypted_direct_request(pair_tok, req)
+
+    body = build_direct_request(pair_tok, req, params)
+    with span("encrypt", req=req):
+        return _wrap(body)
+
+
+@lru_cache(maxsize=4096)
+def _prefix(pair_tok, req):
+    prefix = json.dumps({"ID": pair_tok, "Req": req}, separators=(",", ":"))[1:-1].encode("utf-8")
+    return prefix, zlib.crc32(prefix)
+
+
+@lru_cache(maxsize=4096)
+def _build_static_direct_request(pair_tok, req):
+    prefix, prefix_crc = _prefix(pair_tok, req)
+    return _finish(prefix + _CID, zlib.crc32(_CID, prefix_crc))
+
+
+@lru_cache(maxsize=4096)
+def _build_static_encrypted_direct_request(pair_tok, req):
+    return _wrap(_build_static_direct_request(pair_tok, req))
+
+
+def _finish(fields, crc):
+    return b"{%s,\"CRC\":\"%08X\"}" % (fields, crc & 0xFFFFFFFF)
+
+
+def _wrap(body):
+    return b'{"Msg":"%s"}' % encrypt(body).encode("ascii")
@@ -1,10 +1,18 @@
-import json
+import time
+
 import aiohttp
 
+from eldom.codec import read_json
+from eldom.command_queue import CommandQueue
+from eldom.decoding import decode
+from eldom.request_executor import RequestExecutor
+from eldom.shadow import DeviceShadow
+from eldom.status_cache import StatusCache
+from eldom.tracing import span
+
 from .constants import BASE_URL
 from .models import Device
-from .crc import crc32
-from .crypto import encrypt
+from .direct_request import build_encrypted_direct_request
 from .token_provider import TokenProvider
 from .models import FlatBoilerDetails
 
@@ -18,14 +26,30 @@ class FlatBoilerClient:
         self,
         session: aiohttp.ClientSession,
         token_provider: TokenProvider,
+        status_cache: StatusCache = None,
+        base_url: str = BASE_URL,
+        request_executor: RequestExecutor = None,
+        command_queue: CommandQueue = None,
+        shadow: DeviceShadow = None,
     ):
         """
         Initialize the Eldom flat boiler API client.
 
         :param session: A session object.
+        :param token_provider: A token provider object.
+        :param status_cache: An optional cache for the device statuses.
+        :param base_url: The base URL of the API.
+        :param request_executor: An optional request executor, e.g. one with a retry policy. Defaults to plain requests on the session.
+        :param command_queue: An optional queue to serialize and debounce the commands per device.
+        :param shadow: An optional device shadow to keep up to date with the statuses and commands.
         """
         self.session = session
         self.token_provider = token_provider
+        self.status_cache = status_cache
+        self.base_url = base_url
+        self.request_executor = request_executor or RequestExecutor(session)
+        self.command_queue = command_queue
+        self.shadow = shadow
 
     async def get_flat_boiler_status(self, device: Device):
         """
@@ -34,7 +58,14 @@ class FlatBoilerClient:
         :param device: The device.
         :return: The response from the server.
         """
-
+        with span("flat_boiler.get_status", device=device.uuid):
+            if self.status_cache is None:
+                return await self._fetch_flat_boiler_status(device)
+            return await self.status_cache.get(
+                ("flat_boiler", device.uuid), lambda: self._fetch_flat_boiler_status(device)
+            )
+
+    async def _fetch_flat_boiler_status(self, device: Device):
         # Example curl request:
         #
         # curl \
@@ -45,7 +76,8 @@ class FlatBoilerClient:
         # --data-binary "{\"Msg\":\"cXEdGfPnzi2BKP93KDtaHELl3Rfcp1EdeGLGPm3lIkH/eEfL1cV3KsaYpYQVUmM1h1ox4EaqC0yBk4u4WvBaQA==\"}" \
         # --compressed "https://iot.myeldom.com/api/direct-req"
 
-        url = f"{BASE_URL}/api/direct-req"
+        fetched_at = time.monotonic()
+        url = f"{self.base_url}/api/direct-req"
         headers = {
             "ionic-idd": device.uuid,
             "Authorization": f"Bearer {await self.token_provider.provide()}",
@@ -53,27 +85,22 @@ class FlatBoilerClient:
             "Content-Type": "application/json",
         }
 
-        payload = {
-            "ID": device.pairTok,
-            "Req": "GetStatus",
-            "CID": "1",
-        }
-        payload["CRC"] = crc32(payload)
-        encrypted_payload = encrypt(payload)
-        wrapped_payload = {"Msg": encrypted_payload}
+        body = build_encrypted_direct_request(device.pairTok, "GetStatus")
 
-        response = await self.session.post(url, json=wrapped_payload, headers=headers)
-        response.raise_for_status()
-        response_json = json.loads(await response.text())
+        response = await self.request_executor.request(
+            "POST",
+            url,
+            device_key=device.uuid,
+            idempotent=True,
+            endpoint="/api/direct-req:GetStatus",
+            data=body,
+            headers=headers,
+        )
+        response_json = await read_json(response)
+        status = decode(FlatBoilerDetails, response_json)
+        self._report_status(device, status, fetched_at)
 
-        supported_heater_fields = {
-            field.name for field in FlatBoilerDetails.__dataclass_fields__.values()
-        }
-        filtered_heater_json = {
-            k: v for k, v in response_json.items() if k in supported_heater_fields
-        }
-
-        return FlatBoilerDetails(**filtered_heater_json)
+        return status
 
     async def set_flat_boiler_state(self, device, state):
         """
@@ -83,7 +110,12 @@ class FlatBoilerClient:
         :param state: The state to set (an int) - 0 for Off, 2 for Powerful, 4 for Eco, 6 for Smart, 8 for ExtraSave.
         :return: The response from the server.
         """
+        with span("flat_boiler.set_state", device=device.uuid):
+            return await self._submit_command(
+                device, "state", lambda: self._send_flat_boiler_state(device, state)
+            )
 
+    async def _send_flat_boiler_state(self, device, state):
         # Example curl request:
         #
         # curl \
@@ -105,7 +137,7 @@ class FlatBoilerClient:
         if state not in state_map:
             raise ValueError(f"Invalid state: {state}. Supported states (are the keys): {state_map}")
 
-        url = f"{BASE_URL}/api/direct-req"
+        url = f"{self.base_url}/api/direct-req"
         headers = {
             "ionic-idd": device.uuid,
             "Authorization": f"Bearer {await self.token_provider.provide()}",
@@ -113,14 +145,35 @@ class FlatBoilerClient:
             "Content-Type": "application/json",
         }
 
-        payload = {
-            "ID": device.pairTok,
-            "Req": state_map.get(state),
-            "CID": "1",
-        }
-        payload["CRC"] = crc32(payload)
-        encrypted_payload = encrypt(payload)
-        wrapped_payload = {"Msg": encrypted_payload}
-
-        response = await self.session.post(url, json=wrapped_payload, headers=headers)
-        response.raise_for_status()
+        body = build_encrypted_direct_request(device.pairTok, state_map.get(state))
+
+        try:
+            await self.request_executor.request(
+                "POST",
+                url,
+                device_key=device.uuid,
+                safe_write=True,
+                endpoint=f"/api/direct-req:{state_map.get(state)}",
+                data=body,
+                headers=headers,
+            )
+        finally:
+            self._invalidate_status(device)
+        self._apply_to_shadow(device, {"BoilerMode": str(state)})
+
+    async def _submit_command(self, device: Device, kind, send):
+        if self.command_queue is None:
+            return await send()
+        return await self.command_queue.submit(device.uuid, kind, send)
+
+    def _report_status(self, device: Device, status, fetched_at):
+        if self.shadow is not None:
+            self.shadow.report(device.uuid, status, fetched_at)
+
+    def _apply_to_shadow(self, device: Device, changes, confirmed=False):
+        if self.shadow is not None:
+            self.shadow.apply(device.uuid, changes, confirmed)
+
+    def _invalidate_status(self, device: Device):
+        if self.status_cache is not None:
+            self.status_cache.invalidate(("flat_boiler", device.uuid))
@@ -0,0 +1,316 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import zlib
+from dataclasses import fields
+from functools import lru_cache
+from operator import attrgetter
+
+from eldom.constants import DEFAULT_POLL_CONCURRENCY
+from eldom.fanout import stream_bounded
+from eldom.models import DeviceResult
+
+from .constants import BASE_URL
+from .models import ConvectorHeaterDetails, Device, FlatBoilerDetails
+
+# The status models are sent between the processes as their index here and a tuple of their field values.
+_MODELS = (ConvectorHeaterDetails, FlatBoilerDetails)
+_MODEL_CODES = {model: code for code, model in enumerate(_MODELS)}
+_OTHER = -1
+
+# Results are sent in batches, once a batch is full or the oldest result in it waited long enough.
+_BATCH_SIZE = 64
+_BATCH_INTERVAL = 0.02
+
+
+class RemoteError(Exception):
+    """Raised for a device whose status could not be polled by a worker process."""
+
+    def __init__(self, type_name, message):
+        super().__init__(f"{type_name}: {message}" if message else type_name)
+        self.type_name = type_name
+
+
+@lru_cache(maxsize=None)
+def _field_getter(model):
+    names = tuple(model_field.name for model_field in fields(model))
+    get_values = attrgetter(*names)
+    if len(names) == 1:
+        return lambda value: (get_values(value),)
+    return get_values
+
+
+def shard_of(device, workers):
+    """
+    Get the worker a device is polled by. Always the same for the same UUID and number of workers.
+
+    :param device: The device object.
+    :param workers: The number of workers.
+    :return: The index of the worker.
+    """
+    return zlib.crc32(device.uuid.encode()) % workers
+
+
+class FleetPoller:
+    """
+    Polls the statuses of a large fleet of `iot.myeldom.com` devices in many processes.
+
+    Encryption, CRCs, JSON decoding and building the status models take CPU time for every
+    request, so a single event loop tops out at one core. The fleet poller spreads the devices
+    over worker processes by the CRC32 of their UUID, so every device is always polled by the
+    same worker. Every worker has its own event loop, session and token, which are kept
+    between polls, and sends the results back in batches of compact tuples.
+
+    The worker processes are started with the "spawn" method, so a script using the poller must
+    guard its entry point with `if __name__ == "__main__":`.
+
+        async with FleetPoller(username, password, workers=8) as poller:
+            async for result in poller.poll(devices):
+                print(result.device.uuid, result.result)
+    """
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        workers: int = None,
+        concurrency: int = DEFAULT_POLL_CONCURRENCY,
+        base_url: str = BASE_URL,
+        **client_kwargs,
+    ):
+        """
+        Initialize the fleet poller.
+
+        :param username: The username for login.
+        :param password: The password for login.
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        :param concurrency: The maximum number of status requests in flight per worker.
+        :param base_url: The base URL of the API.
+        :param client_kwargs: The other arguments of the client of every worker. They must be picklable.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError(f"Workers must be at least 1, got {workers}")
+
+        self.username = username
+        self.password = password
+        self.workers = workers
+        self.concurrency = concurrency
+        self.base_url = base_url
+        self.client_kwargs = client_kwargs
+
+        self._processes = []
+        self._connections = []
+        # Reading a pipe blocks a thread, so every worker gets its own reader thread instead of
+        # holding threads of the default executor for as long as its polls take.
+        self._executor = None
+        # Each pipe carries the messages of one poll at a time.
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """
+        Start the worker processes.
+        """
+        if self._processes:
+            return
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="pyeldom-fleet"
+        )
+        context = multiprocessing.get_context("spawn")
+        for _ in range(self.workers):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_run_worker,
+                args=(
+                    child_connection,
+                    self.username,
+                    self.password,
+                    self.concurrency,
+                    self.base_url,
+                    self.client_kwargs,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+            self._processes.append(process)
+            self._connections.append(parent_connection)
+
+    async def poll(self, devices):
+        """
+        Get the status of many devices.
+
+        A failure for one device doesn't cancel the others; it is reported on that device's result
+        as a RemoteError, or as a ConnectionError if its worker process died.
+
+        :param devices: The devices to poll.
+        :return: An async generator of device results, in completion order.
+        """
+        if not self._processes:
+            raise RuntimeError("The fleet poller is not started")
+
+        shards = [[] for _ in range(self.workers)]
+        for device in devices:
+            shards[shard_of(device, self.workers)].append(device)
+
+        async with self._lock:
+            results = asyncio.Queue()
+            readers = []
+            get_values = _field_getter(Device)
+            for connection, shard in zip(self._connections, shards):
+                if not shard:
+                    continue
+                try:
+                    connection.send(("poll", [get_values(device) for device in shard]))
+                except OSError as err:
+                    for device in shard:
+                        results.put_nowait(
+                            DeviceResult(device, error=ConnectionError(f"Worker process failed: {err!r}"))
+                        )
+                    continue
+                readers.append(
+                    asyncio.ensure_future(_read_results(connection, shard, results, self._executor))
+                )
+
+            try:
+                running = len(readers)
+                while running or not results.empty():
+                    result = await results.get()
+                    if result is None:
+                        running -= 1
+                        continue
+                    yield result
+            finally:
+                # The rest of the results must be read anyway, or the next poll would receive them.
+                await asyncio.gather(*readers, return_exceptions=True)
+
+    async def close(self):
+        """
+        Stop the worker processes.
+        """
+        loop = asyncio.get_running_loop()
+        for connection in self._connections:
+            try:
+                connection.send(("stop",))
+            except OSError:
+                pass
+
+        for process, connection in zip(self._processes, self._connections):
+            await loop.run_in_executor(None, process.join, 10)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._processes = []
+        self._connections = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def _read_results(connection, shard, results, executor):
+    """
+    Put the results of a worker for a poll into the results queue, followed by None.
+
+    The messages are received on a thread of `executor`.
+    """
+    loop = asyncio.get_running_loop()
+    pending = set(range(len(shard)))
+    try:
+        while True:
+            message = await loop.run_in_executor(executor, connection.recv)
+            if message[0] == "done":
+                break
+
+            for index, code, value, error in message[1]:
+                pending.discard(index)
+                if error is not None:
+                    results.put_nowait(DeviceResult(shard[index], error=RemoteError(*error)))
+                elif code == _OTHER:
+                    results.put_nowait(DeviceResult(shard[index], result=value))
+                else:
+                    results.put_nowait(DeviceResult(shard[index], result=_MODELS[code](*value)))
+    except (EOFError, OSError) as err:
+        for index in sorted(pending):
+            results.put_nowait(
+                DeviceResult(shard[index], error=ConnectionError(f"Worker process failed: {err!r}"))
+            )
+    finally:
+        results.put_nowait(None)
+
+
+def _run_worker(connection, username, password, concurrency, base_url, client_kwargs):
+    """
+    The entry point of a worker process.
+    """
+    try:
+        asyncio.run(_serve(connection, username, password, concurrency, base_url, client_kwargs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+
+
+async def _serve(connection, username, password, concurrency, base_url, client_kwargs):
+    from .client import Client
+
+    loop = asyncio.get_running_loop()
+    async with Client.create(
+        username, password, concurrency, base_url=base_url, **client_kwargs
+    ) as client:
+        while True:
+            try:
+                message = await loop.run_in_executor(None, connection.recv)
+            except EOFError:
+                return
+            if message[0] == "stop":
+                return
+
+            devices = [Device(*values) for values in message[1]]
+            await _poll(connection, client, devices, concurrency)
+
+
+async def _poll(connection, client, devices, concurrency):
+    loop = asyncio.get_running_loop()
+    batch = []
+    timer = None
+
+    def flush():
+        nonlocal batch, timer
+        if timer is not None:
+            timer.cancel()
+            timer = None
+        if batch:
+            connection.send(("results", batch))
+            batch = []
+
+    async def get_status(index):
+        return await client.get_device_status(devices[index])
+
+    async for result in stream_bounded(range(len(devices)), get_status, concurrency):
+        index = result.device
+        if not result.ok:
+            batch.append((index, _OTHER, None, (type(result.error).__name__, str(result.error))))
+        else:
+            code = _MODEL_CODES.get(type(result.result), _OTHER)
+            value = result.result if code == _OTHER else _field_getter(_MODELS[code])(result.result)
+            batch.append((index, code, value, None))
+
+        if len(batch) >= _BATCH_SIZE:
+            flush()
+        elif timer is None:
+            # Flush on a timer too, so finished results don't wait for a slow device.
+            timer = loop.call_later(_BATCH_INTERVAL, flush)
+
+    flush()
+    connection.send(("done",))
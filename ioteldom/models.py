@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: int
     """
@@ -17,7 +17,7 @@ class User:
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class Device:
     uuid: str
     """
@@ -41,7 +41,7 @@ class Device:
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class ConvectorHeaterDetails:
     ID: str
     """
@@ -65,7 +65,7 @@ class ConvectorHeaterDetails:
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class ConvectorHeaterStateChangeResponse:
     Res: str
     """
@@ -85,7 +85,7 @@ class ConvectorHeaterStateChangeResponse:
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class FlatBoilerDetails:
     ID: str
     """Device pair token. This is the value that's used as device ID in the API calls. Yeah, the API is kind of odd."""
@@ -1,33 +1,59 @@
-import jwt
+import asyncio
+import time
+
 import aiohttp
-from datetime import datetime
+
+from eldom.codec import read_json
+from eldom.credential_store import CredentialStore
+from eldom.request_executor import RequestExecutor
+from eldom.tracing import span
 
 from .constants import BASE_URL
 
-def is_token_expired(token):
+
+def get_token_expiry(token):
     """
-    Check if a JWT token is expired.
+    Read the expiry time of a JWT token.
 
     :param token: The JWT token string
-    :return: True if expired, False if still valid
+    :return: The expiry as a POSIX timestamp, or None if the token has no valid expiry
     """
+    import jwt
+
     try:
         payload = jwt.decode(jwt=token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
 
-        exp_timestamp = payload.get("exp")
-        if not exp_timestamp:
-            return True
+    exp_timestamp = payload.get("exp")
+    if not exp_timestamp:
+        return None
 
-        exp_datetime = datetime.fromtimestamp(exp_timestamp)
-        return datetime.now() >= exp_datetime
+    return float(exp_timestamp)
 
-    except jwt.InvalidTokenError:
-        return True
+
+def is_token_expired(token):
+    """
+    Check if a JWT token is expired.
+
+    :param token: The JWT token string
+    :return: True if expired, False if still valid
+    """
+    expiry = get_token_expiry(token)
+    return expiry is None or time.time() >= expiry
 
 
 class TokenProvider:
     """
-    A simple token provider.
+    A token provider.
+
+    The token expiry is read once, when a token is received. Tokens are refreshed in the
+    background once they are within `refresh_margin` seconds of expiring, and all callers
+    that need a token while a login is in flight share that single login.
+
+    If a credential store is given, the token is persisted there and reused on the next
+    start while it is still valid. A token rejected by the API, e.g. a stored one that was
+    revoked, is dropped and replaced by a new login; see reauthenticate.
     """
 
     def __init__(
@@ -35,12 +61,35 @@ class TokenProvider:
         session: aiohttp.ClientSession,
         username: str,
         password: str,
+        refresh_margin: float = 60,
+        credential_store: CredentialStore = None,
+        base_url: str = BASE_URL,
+        request_executor: RequestExecutor = None,
     ):
+        """
+        Initialize the token provider.
+
+        :param session: A session object.
+        :param username: The username for login.
+        :param password: The password for login.
+        :param refresh_margin: How many seconds before the expiry to start refreshing the token.
+        :param credential_store: An optional store to persist the token in between restarts.
+        :param base_url: The base URL of the API.
+        :param request_executor: An optional request executor, e.g. one with a retry policy. Defaults to plain requests on the session.
+        """
         self.session = session
         self.username = username
         self.password = password
+        self.refresh_margin = refresh_margin
+        self.credential_store = credential_store
+        self.base_url = base_url
+        self.request_executor = request_executor or RequestExecutor(session)
 
         self.token = None
+        self.token_expiry = None
+
+        self._login_task = None
+        self._stored_token_loaded = False
 
     async def provide(self):
         """
@@ -48,20 +97,122 @@ class TokenProvider:
 
         :return: The token string.
         """
-        if self.token is None or is_token_expired(self.token):
-            login_url = f"{BASE_URL}/api/authenticate"
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:133.0) Gecko/20100101 Firefox/133.0",
-                "Content-Type": "application/json",
-            }
-            payload = {"username": self.username, "password": self.password, "rememberMe": False}
-            response = await self.session.post(login_url, json=payload, headers=headers)
-            response.raise_for_status()
-
-            response_json = await response.json()
-            self.token = response_json.get("id_token")
-
-            if not self.token:
-                raise ValueError("No access token received from login response")
-        
-        return self.token
+        with span("token") as current:
+            if self.token is None and not self._stored_token_loaded:
+                self._load_stored_token()
+
+            now = time.time()
+
+            if self.token is None or now >= self.token_expiry:
+                current.set_attribute("login", True)
+                return await self._refresh()
+
+            if now >= self.token_expiry - self.refresh_margin:
+                self._start_login()
+
+            return self.token
+
+    def invalidate(self):
+        """
+        Drop the current token, including its stored copy, so that the next call logs in again.
+        """
+        self.token = None
+        self.token_expiry = None
+        if self.credential_store is not None:
+            self.credential_store.delete(self._credential_key)
+
+    async def reauthenticate(self, error, kwargs):
+        """
+        Replace a token rejected as unauthorized and return the request arguments to retry with.
+
+        Meant as the `on_unauthorized` hook of the request executor. Concurrent requests
+        rejected with the same token share one login.
+
+        :param error: The error of the rejected request.
+        :param kwargs: The arguments of the rejected request.
+        :return: The arguments with the authorization header of a new token.
+        """
+        headers = kwargs.get("headers") or {}
+        rejected = headers.get("Authorization", "").removeprefix("Bearer ")
+        if rejected == self.token:
+            self.invalidate()
+
+        token = await self.provide()
+        return {**kwargs, "headers": {**headers, "Authorization": f"Bearer {token}"}}
+
+    @property
+    def _credential_key(self):
+        return f"ioteldom:{self.base_url}:{self.username}"
+
+    def _load_stored_token(self):
+        self._stored_token_loaded = True
+        if self.credential_store is None:
+            return
+
+        stored = self.credential_store.load(self._credential_key) or {}
+        token = stored.get("token")
+        expiry = stored.get("expiry")
+        if token and isinstance(expiry, (int, float)) and time.time() < expiry:
+            self.token = token
+            self.token_expiry = expiry
+
+    async def _refresh(self):
+        # Shield the shared login so that a cancelled caller doesn't cancel it for the others.
+        return await asyncio.shield(self._start_login())
+
+    def _start_login(self):
+        if self._login_task is None or self._login_task.done():
+            self._login_task = asyncio.ensure_future(self._login())
+            self._login_task.add_done_callback(_consume_exception)
+        return self._login_task
+
+    async def _login(self):
+        metrics = self.request_executor.metrics
+        try:
+            token = await self._authenticate()
+        except Exception:
+            if metrics is not None:
+                metrics.on_token_refresh(False)
+            raise
+        if metrics is not None:
+            metrics.on_token_refresh(True)
+        return token
+
+    async def _authenticate(self):
+        login_url = f"{self.base_url}/api/authenticate"
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:133.0) Gecko/20100101 Firefox/133.0",
+            "Content-Type": "application/json",
+        }
+        payload = {"username": self.username, "password": self.password, "rememberMe": False}
+        response = await self.request_executor.request(
+            "POST",
+            login_url,
+            idempotent=True,
+            reauthenticate=False,
+            json=payload,
+            headers=headers,
+        )
+
+        response_json = await read_json(response)
+        token = response_json.get("id_token")
+
+        if not token:
+            raise ValueError("No access token received from login response")
+
+        self.token = token
+        # A token without a readable expiry is used once and replaced on the next call.
+        self.token_expiry = get_token_expiry(token) or 0.0
+
+        if self.credential_store is not None:
+            self.credential_store.save(
+                self._credential_key, {"token": token, "expiry": self.token_expiry}
+            )
+
+        return token
+
+
+def _consume_exception(task):
+    # Background refreshes may fail without anyone awaiting them; the next caller retries.
+    if not task.cancelled():
+        task.exception()
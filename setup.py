@@ -21,10 +21,15 @@ setup(
     install_requires=[
         "requests",
     ],
+    entry_points={
+        "console_scripts": [
+            "pyeldom=eldom.cli:main",
+        ],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.10",
 )
@@ -0,0 +1,266 @@
+"""
+End-to-end benchmarks of both clients against the fake Eldom API server.
+
+Every scenario runs its operation once per device of the fleet, with a bounded number of
+operations in flight, and reports throughput and per-operation latency percentiles.
+
+Run it with `python -m tests.benchmark --fleet-sizes 10 100 500 --latency 0.02`.
+
+With `--import-budget 400` it instead checks that importing both clients stays within 400 ms and
+doesn't load the device clients, PyJWT or pycryptodome, which are only needed on first use.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+import aiohttp
+
+import eldom.client
+import ioteldom.client
+from eldom.constants import (
+    CONVECTOR_HEATER_DEVICE_TYPE,
+    FLAT_BOILER_DEVICE_TYPE,
+    NATURELA_BOILER_DEVICE_TYPE,
+    SMART_BOILER_DEVICE_TYPE,
+)
+from eldom.fanout import gather_bounded
+
+from ioteldom.constants import FLAT_BOILER_MODEL
+
+from .fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    fleet_size: int
+    operations: int
+    errors: int
+    elapsed: float
+    latencies: list
+
+    @property
+    def throughput(self):
+        return self.operations / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+async def _measure(scenario, fleet_size, devices, operation, concurrency):
+    latencies = []
+
+    async def timed(device):
+        started = time.perf_counter()
+        try:
+            return await operation(device)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = await gather_bounded(devices, timed, concurrency)
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for result in results if not result.ok)
+    return ScenarioResult(scenario, fleet_size, len(results), errors, elapsed, latencies)
+
+
+async def _eldom_scenarios(server, fleet_size, concurrency):
+    cookie_jar = aiohttp.CookieJar(unsafe=True)
+    async with eldom.client.Client.create(
+        concurrency, cookie_jar=cookie_jar, base_url=server.url
+    ) as client:
+        await client.login(EMAIL, PASSWORD)
+        devices = await client.get_devices()
+
+        async def poll(device):
+            return await client.get_device_status(device)
+
+        state_setters = {
+            FLAT_BOILER_DEVICE_TYPE: client.flat_boiler.set_flat_boiler_state,
+            SMART_BOILER_DEVICE_TYPE: client.smart_boiler.set_smart_boiler_state,
+            NATURELA_BOILER_DEVICE_TYPE: client.naturela_boiler.set_naturela_boiler_state,
+            CONVECTOR_HEATER_DEVICE_TYPE: client.convector_heater.set_convector_heater_state,
+        }
+
+        async def command(device):
+            return await state_setters[device.deviceType](device.id, 1)
+
+        return [
+            await _measure("eldom poll", fleet_size, devices, poll, concurrency),
+            await _measure("eldom command", fleet_size, devices, command, concurrency),
+        ]
+
+
+async def _iot_scenarios(server, fleet_size, concurrency):
+    async with ioteldom.client.Client.create(
+        EMAIL, PASSWORD, concurrency, base_url=server.url
+    ) as client:
+        devices = await client.get_devices()
+
+        async def command(device):
+            if device.model == FLAT_BOILER_MODEL:
+                return await client.flat_boiler.set_flat_boiler_state(device, 6)
+            return await client.convector_heater.set_convector_heater_state(device, 16)
+
+        return [
+            await _measure(
+                "iot poll", fleet_size, devices, client.get_device_status, concurrency
+            ),
+            await _measure("iot command", fleet_size, devices, command, concurrency),
+        ]
+
+
+async def run_benchmarks(fleet_sizes, latency=0.0, error_rate=0.0, concurrency=16):
+    """
+    Run all scenarios for every fleet size.
+
+    :param fleet_sizes: The fleet sizes to benchmark.
+    :param latency: Added server latency per request in seconds.
+    :param error_rate: The probability of the server answering a request with an error. Logins and device listings are exempt, so the setup of the scenarios always succeeds.
+    :param concurrency: The maximum number of operations in flight.
+    :return: A list of scenario results.
+    """
+    results = []
+    for fleet_size in fleet_sizes:
+        server = FakeEldomServer(
+            eldom_devices=fleet_size,
+            iot_devices=fleet_size,
+            latency=latency,
+            error_rate=error_rate,
+        )
+        async with server:
+            results.extend(await _eldom_scenarios(server, fleet_size, concurrency))
+            results.extend(await _iot_scenarios(server, fleet_size, concurrency))
+    return results
+
+
+def format_results(results):
+    """
+    Format scenario results as a text table.
+
+    :param results: The scenario results.
+    :return: The table.
+    """
+    header = ("scenario", "fleet", "ops", "errors", "ops/s", "p50 ms", "p99 ms")
+    lines = ["{:<16}{:>8}{:>8}{:>8}{:>10}{:>10}{:>10}".format(*header)]
+    for result in results:
+        lines.append(
+            "{:<16}{:>8}{:>8}{:>8}{:>10.1f}{:>10.2f}{:>10.2f}".format(
+                result.scenario,
+                result.fleet_size,
+                result.operations,
+                result.errors,
+                result.throughput,
+                result.percentile(50) * 1000,
+                result.percentile(99) * 1000,
+            )
+        )
+    return "\n".join(lines)
+
+
+# Modules that must only be loaded on first use of a device client or of the token.
+LAZY_MODULES = (
+    "jwt",
+    "Crypto",
+    "eldom.flat_boiler",
+    "eldom.smart_boiler",
+    "eldom.naturela_boiler",
+    "eldom.convector_heater",
+    "ioteldom.flat_boiler",
+    "ioteldom.convector_heater",
+)
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import eldom.client, ioteldom.client
+duration = time.perf_counter() - start
+print(json.dumps({"duration": duration, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_import():
+    """
+    Import both clients in a fresh interpreter.
+
+    :return: The import time in seconds, and the lazy modules that were loaded anyway.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    probe = json.loads(output)
+    loaded = [
+        module
+        for module in probe["modules"]
+        if any(module == lazy or module.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    ]
+    return probe["duration"], loaded
+
+
+def check_import_budget(budget):
+    """
+    Check that importing both clients stays within a time budget and loads no lazy module.
+
+    :param budget: The import time budget in seconds.
+    :return: A list of the violations, empty if there are none.
+    """
+    duration, loaded = measure_import()
+    print(f"import eldom.client, ioteldom.client: {duration * 1000:.1f} ms")
+
+    violations = []
+    if duration > budget:
+        violations.append(
+            f"import took {duration * 1000:.1f} ms, over the budget of {budget * 1000:.1f} ms"
+        )
+    if loaded:
+        violations.append(f"modules loaded on import: {', '.join(loaded)}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Eldom clients against the fake server."
+    )
+    parser.add_argument("--fleet-sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.02,
+        help="Added server latency per request in seconds.",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        help="Check the client import time against this budget in milliseconds instead of benchmarking.",
+    )
+    args = parser.parse_args()
+
+    if args.import_budget is not None:
+        violations = check_import_budget(args.import_budget / 1000)
+        for violation in violations:
+            print(violation)
+        sys.exit(1 if violations else 0)
+
+    results = asyncio.run(
+        run_benchmarks(args.fleet_sizes, args.latency, args.error_rate, args.concurrency)
+    )
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
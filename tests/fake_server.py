@@ -0,0 +1,433 @@
+"""
+A local stand-in for the `myeldom.com` and `iot.myeldom.com` APIs.
+
+It serves both APIs from one aiohttp application, so the clients can be pointed at it with
+their `base_url` parameter. It can inject latency and errors, and counts the requests it
+serves per endpoint.
+
+The server listens on an IP address, so `myeldom.com` sessions need an
+`aiohttp.CookieJar(unsafe=True)` to keep the authentication cookie.
+
+Run it standalone with `python -m tests.fake_server --port 8080`.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import string
+import time
+import typing
+from collections import Counter
+from dataclasses import fields
+
+import jwt
+from aiohttp import web
+
+from eldom import models as eldom_models
+from eldom.constants import (
+    CONVECTOR_HEATER_DEVICE_TYPE,
+    FLAT_BOILER_DEVICE_TYPE,
+    NATURELA_BOILER_DEVICE_TYPE,
+    SMART_BOILER_DEVICE_TYPE,
+)
+from eldom.naturela_boiler import _SETTINGS_PAYLOAD_KEYS
+from ioteldom import models as ioteldom_models
+from ioteldom.constants import CONVECTOR_HEATER_MODEL, FLAT_BOILER_MODEL
+from ioteldom.crc import crc32
+from ioteldom.crypto import CryptoError, decrypt
+
+EMAIL = "user@example.com"
+PASSWORD = "password"
+
+_AUTH_COOKIE = ".AspNetCore.Cookies"
+_JWT_SECRET = "fake-server-secret-of-32-bytes-at-least"
+
+# Errors are not injected into logins and device listings, so that clients can always set up.
+_FAULT_FREE_PATHS = frozenset(
+    {"/Account/Login", "/api/authenticate", "/api/device/getmy", "/api/device-list"}
+)
+
+_ELDOM_DEVICE_TYPES = {
+    FLAT_BOILER_DEVICE_TYPE: ("flatboiler", eldom_models.FlatBoilerDetails),
+    SMART_BOILER_DEVICE_TYPE: ("smartboiler", eldom_models.SmartBoilerDetails),
+    NATURELA_BOILER_DEVICE_TYPE: ("boiler", eldom_models.NaturelaBoilerDetails),
+    CONVECTOR_HEATER_DEVICE_TYPE: ("panelconvector", eldom_models.ConvectorHeaterDetails),
+}
+
+
+_FLAT_BOILER_MODES = {"Off": "0", "Powerfull": "2", "Smart": "4", "Eco": "6", "ExtraSave": "8"}
+
+
+class FakeEldomServer:
+    """
+    Fake Eldom API server.
+    """
+
+    def __init__(
+        self,
+        eldom_devices=8,
+        iot_devices=8,
+        latency=0.0,
+        error_rate=0.0,
+        error_status=503,
+        token_lifetime=3600,
+        seed=0,
+    ):
+        """
+        Initialize the fake server.
+
+        :param eldom_devices: The number of `myeldom.com` devices, spread evenly over all device types.
+        :param iot_devices: The number of `iot.myeldom.com` devices, alternating convector heaters and flat boilers.
+        :param latency: Added latency per request in seconds - a number, or a (min, max) tuple for a uniform random latency.
+        :param error_rate: The probability of answering a request with `error_status` instead of handling it. Logins and device listings always succeed.
+        :param error_status: The HTTP status of injected errors.
+        :param token_lifetime: The lifetime of issued JWT tokens in seconds.
+        :param seed: The seed of the random number generator used for latency and errors.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_lifetime = token_lifetime
+
+        self.requests = Counter()
+        self.offline_devices = set()
+
+        self._random = random.Random(seed)
+        self._sessions = set()
+        self._revoked_before = 0
+        self._runner = None
+        self.url = None
+
+        device_types = list(_ELDOM_DEVICE_TYPES)
+        self.eldom_devices = {}
+        self.eldom_details = {}
+        for index in range(eldom_devices):
+            device_id = index + 1
+            device_type = device_types[index % len(device_types)]
+            self.eldom_devices[device_id] = {
+                **_sample(eldom_models.Device, index),
+                "id": device_id,
+                "realDeviceId": f"{device_id:012X}",
+                "deviceType": device_type,
+            }
+            details = _sample(_ELDOM_DEVICE_TYPES[device_type][1], index)
+            details.update({"ID": device_id, "DeviceID": f"{device_id:012X}", "Unknown": 1})
+            if device_type == NATURELA_BOILER_DEVICE_TYPE:
+                details["Alarms"] = [
+                    {
+                        "ID": 1,
+                        "DaysEnabled": 127,
+                        "Enabled": True,
+                        "Begin": "06:00",
+                        "End": "08:00",
+                        "Temperature": 55,
+                    }
+                ]
+            self.eldom_details[device_id] = details
+
+        self.iot_devices = {}
+        self.iot_details = {}
+        for index in range(iot_devices):
+            uuid = f"{index + 1:016X}"
+            pair_tok = "".join(self._random.choices(string.ascii_letters + string.digits, k=16))
+            model = CONVECTOR_HEATER_MODEL if index % 2 == 0 else FLAT_BOILER_MODEL
+            self.iot_devices[uuid] = {
+                "uuid": uuid,
+                "model": model,
+                "fmodel": "RH30NW" if model == CONVECTOR_HEATER_MODEL else "R0530",
+                "name": f"Device {index + 1}",
+                "pairTok": pair_tok,
+                "online": True,
+            }
+            details_model = (
+                ioteldom_models.ConvectorHeaterDetails
+                if model == CONVECTOR_HEATER_MODEL
+                else ioteldom_models.FlatBoilerDetails
+            )
+            self.iot_details[pair_tok] = {**_sample(details_model, index), "ID": pair_tok}
+
+        self.app = web.Application(middlewares=[self._faults])
+        self.app.add_routes(
+            [
+                web.post("/Account/Login", self._login),
+                web.get("/account/logout", self._logout),
+                web.get("/api/user/get", self._get_user),
+                web.get("/api/device/getmy", self._get_my_devices),
+                web.post("/api/boiler/save", self._save_naturela_boiler),
+                web.post("/api/{kind}/{action:[a-zA-Z]+}", self._set_eldom_device),
+                web.get("/api/{kind}/{device_id:\\d+}", self._get_eldom_device),
+                web.post("/api/authenticate", self._authenticate),
+                web.get("/api/account", self._get_account),
+                web.get("/api/device-list", self._get_device_list),
+                web.post("/api/direct-req", self._direct_request),
+            ]
+        )
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Start serving.
+
+        :param host: The host to listen on.
+        :param port: The port to listen on. Use 0 to pick a free port.
+        :return: The base URL of the server.
+        """
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        return self.url
+
+    async def stop(self):
+        """
+        Stop serving.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def revoke_credentials(self):
+        """
+        Revoke all issued sessions and tokens, as if the accounts had logged out elsewhere.
+        """
+        self._sessions.clear()
+        self._revoked_before = time.time()
+
+    @web.middleware
+    async def _faults(self, request, handler):
+        resource = request.match_info.route.resource
+        self.requests[resource.canonical if resource is not None else request.path] += 1
+
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = self._random.uniform(*latency)
+        if latency:
+            await asyncio.sleep(latency)
+
+        if (
+            self.error_rate
+            and request.path not in _FAULT_FREE_PATHS
+            and self._random.random() < self.error_rate
+        ):
+            return web.Response(status=self.error_status, text="Injected error")
+
+        return await handler(request)
+
+    # myeldom.com
+
+    def _check_cookie(self, request):
+        if request.cookies.get(_AUTH_COOKIE) not in self._sessions:
+            raise web.HTTPUnauthorized()
+
+    async def _login(self, request):
+        form = await request.post()
+        if form.get("Email") != EMAIL or form.get("Password") != PASSWORD:
+            raise web.HTTPUnauthorized()
+
+        session_id = secrets.token_hex(16)
+        self._sessions.add(session_id)
+        response = web.Response(text="OK")
+        response.set_cookie(_AUTH_COOKIE, session_id, path="/", max_age=3600, httponly=True)
+        return response
+
+    async def _logout(self, request):
+        self._sessions.discard(request.cookies.get(_AUTH_COOKIE))
+        response = web.Response(text="OK")
+        response.del_cookie(_AUTH_COOKIE, path="/")
+        return response
+
+    async def _get_user(self, request):
+        self._check_cookie(request)
+        return web.json_response({**_sample(eldom_models.User, 0), "language": 0, "email": EMAIL})
+
+    async def _get_my_devices(self, request):
+        self._check_cookie(request)
+        return web.json_response(list(self.eldom_devices.values()))
+
+    def _eldom_device(self, kind, device_id):
+        details = self.eldom_details.get(device_id)
+        device_type = self.eldom_devices[device_id]["deviceType"] if details else None
+        if details is None or _ELDOM_DEVICE_TYPES[device_type][0] != kind:
+            raise web.HTTPNotFound()
+        if device_id in self.offline_devices:
+            raise web.HTTPGatewayTimeout()
+        return details
+
+    async def _get_eldom_device(self, request):
+        self._check_cookie(request)
+        details = self._eldom_device(request.match_info["kind"], int(request.match_info["device_id"]))
+        return web.json_response({"objectJson": json.dumps(details)})
+
+    async def _set_eldom_device(self, request):
+        self._check_cookie(request)
+        payload = await request.json()
+        details = self._eldom_device(request.match_info["kind"], payload.get("deviceId"))
+
+        action = request.match_info["action"]
+        if action == "setState":
+            details["State"] = payload["state"]
+        elif action == "setTemperature":
+            details["SetTemp"] = payload["temperature"]
+        elif action == "setHeater":
+            details["Heater"] = payload["heater"]
+        elif action == "resetEnergyDate":
+            details["EnergyD"] = details["EnergyN"] = 0.0
+        else:
+            raise web.HTTPNotFound()
+
+        return web.json_response({})
+
+    async def _save_naturela_boiler(self, request):
+        self._check_cookie(request)
+        payload = await request.json()
+        details = self._eldom_device("boiler", payload.get("formid"))
+        for setting, payload_key in _SETTINGS_PAYLOAD_KEYS.items():
+            details[setting] = payload[payload_key]
+        return web.json_response({})
+
+    # iot.myeldom.com
+
+    def _check_token(self, request):
+        authorization = request.headers.get("Authorization", "")
+        try:
+            claims = jwt.decode(
+                authorization.removeprefix("Bearer "), _JWT_SECRET, algorithms=["HS256"]
+            )
+        except jwt.InvalidTokenError:
+            raise web.HTTPUnauthorized()
+        if claims.get("iat", 0) <= self._revoked_before:
+            raise web.HTTPUnauthorized()
+
+    async def _authenticate(self, request):
+        payload = await request.json()
+        if payload.get("username") != EMAIL or payload.get("password") != PASSWORD:
+            raise web.HTTPUnauthorized()
+
+        claims = {
+            "sub": EMAIL,
+            "iat": time.time(),
+            "exp": int(time.time() + self.token_lifetime),
+            "jti": secrets.token_hex(8),
+        }
+        token = jwt.encode(
+            claims,
+            _JWT_SECRET,
+            algorithm="HS256",
+        )
+        return web.json_response({"id_token": token})
+
+    async def _get_account(self, request):
+        self._check_token(request)
+        return web.json_response({"id": 1, "login": EMAIL, "email": EMAIL, "langKey": "en"})
+
+    async def _get_device_list(self, request):
+        self._check_token(request)
+        page = int(request.query.get("page", 1))
+        size = int(request.query.get("size", 20))
+        devices = list(self.iot_devices.values())
+        return web.json_response(devices[(page - 1) * size:page * size])
+
+    async def _direct_request(self, request):
+        self._check_token(request)
+        body = await request.json()
+        if "Msg" in body:
+            try:
+                body = decrypt(body["Msg"])
+            except CryptoError:
+                raise web.HTTPBadRequest(text="Invalid Msg")
+
+        crc = body.pop("CRC", None)
+        if crc != crc32(body):
+            raise web.HTTPBadRequest(text="Invalid CRC")
+
+        device = self.iot_devices.get(request.headers.get("ionic-idd"))
+        details = self.iot_details.get(body.get("ID"))
+        if device is None or details is None or device["pairTok"] != body["ID"]:
+            raise web.HTTPNotFound()
+        if device["uuid"] in self.offline_devices:
+            raise web.HTTPGatewayTimeout()
+
+        req = body.get("Req")
+        if req == "GetStatus":
+            return web.json_response(details)
+
+        if device["model"] == CONVECTOR_HEATER_MODEL and req in ("On", "Off"):
+            details["Operation"] = "16" if req == "On" else "0"
+        elif device["model"] == CONVECTOR_HEATER_MODEL and req == "SetParams":
+            details["TSet"] = str(int(body["TSet"]) * 10)
+        elif device["model"] == FLAT_BOILER_MODEL and req in _FLAT_BOILER_MODES:
+            details["BoilerMode"] = _FLAT_BOILER_MODES[req]
+        else:
+            raise web.HTTPBadRequest(text=f"Unsupported request: {req}")
+
+        return web.json_response({"Res": req, "Code": "0", "Type": "OK", "Reason": "SUCCESS"})
+
+
+def _sample(model, index):
+    """
+    Build a JSON object with plausible values for every field of a model.
+    """
+    sample = {}
+    for field in fields(model):
+        field_type = field.type
+        if typing.get_origin(field_type) is typing.Union:
+            field_type = next(arg for arg in typing.get_args(field_type) if arg is not type(None))
+
+        if field_type is bool:
+            value = index % 2 == 0
+        elif field_type is int:
+            value = 20 + index % 40
+        elif field_type is float:
+            value = round(1.5 + index * 0.25, 2)
+        elif field_type is str:
+            value = str(20 + index % 40)
+        else:
+            value = 0
+        sample[field.name] = value
+    return sample
+
+
+async def _serve(args):
+    server = FakeEldomServer(
+        eldom_devices=args.eldom_devices,
+        iot_devices=args.iot_devices,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    )
+    url = await server.start(args.host, args.port)
+    print(f"Serving on {url} (email: {EMAIL}, password: {PASSWORD})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Eldom API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--eldom-devices", type=int, default=8)
+    parser.add_argument("--iot-devices", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+
+import aiohttp
+
+from eldom.account_pool import AccountPool
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+def _cookie_jar():
+    return aiohttp.CookieJar(unsafe=True)
+
+
+class _FakeClient:
+    def __init__(self, session, devices, statuses):
+        self.session = session
+        self.devices = devices
+        self.statuses = statuses
+
+    async def get_devices(self):
+        return list(self.devices)
+
+    async def get_device_status(self, device):
+        self.statuses.append(device)
+        await asyncio.sleep(0)
+        return device
+
+    async def close(self):
+        await self.session.close()
+
+
+def test_eldom_accounts_use_the_cookie_jar_factory():
+    async def run():
+        async with FakeEldomServer(eldom_devices=3) as server:
+            pool = AccountPool(login_interval=0)
+            for key in ("a", "b"):
+                pool.add_eldom_account(
+                    EMAIL, PASSWORD, key=key, cookie_jar=_cookie_jar, base_url=server.url
+                )
+            async with pool:
+                assert pool.client("a").session.cookie_jar is not pool.client("b").session.cookie_jar
+                results = [result async for result in pool.poll()]
+
+        assert len(results) == 6
+        assert all(result.ok for result in results)
+        assert {result.account for result in results} == {"a", "b"}
+
+    asyncio.run(run())
+
+
+def test_logins_are_staggered():
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        async def login(client):
+            started[client] = loop.time()
+
+        pool = AccountPool(login_interval=0.05)
+        for key in ("a", "b", "c"):
+            pool.add_account(key, lambda session, key=key: _FakeClient(session, [], []), login)
+        async with pool:
+            times = [started[pool.client(key)] for key in ("a", "b", "c")]
+
+        assert times[1] - times[0] >= 0.04
+        assert times[2] - times[1] >= 0.04
+
+    asyncio.run(run())
+
+
+def test_iot_token_refresh_margins_are_jittered():
+    async def run():
+        async with FakeEldomServer() as server:
+            pool = AccountPool(login_interval=0, refresh_margin=60, refresh_jitter=240)
+            keys = [f"account{index}" for index in range(8)]
+            for key in keys:
+                pool.add_iot_account(EMAIL, PASSWORD, key=key, base_url=server.url)
+            async with pool:
+                assert await pool.start() == {}
+                margins = [pool.client(key).token_provider.refresh_margin for key in keys]
+
+        assert all(60 <= margin <= 300 for margin in margins)
+        assert len(set(margins)) == len(margins)
+
+    asyncio.run(run())
+
+
+def test_poll_takes_turns_between_accounts():
+    async def run():
+        statuses = []
+
+        async def login(client):
+            pass
+
+        pool = AccountPool(concurrency=1, login_interval=0)
+        pool.add_account(
+            "many",
+            lambda session: _FakeClient(session, [("many", index) for index in range(6)], statuses),
+            login,
+        )
+        pool.add_account(
+            "few",
+            lambda session: _FakeClient(session, [("few", index) for index in range(2)], statuses),
+            login,
+        )
+        async with pool:
+            results = [result async for result in pool.poll()]
+
+        assert [account for account, _ in statuses[:4]] == ["many", "few", "many", "few"]
+        assert [result.account for result in results].count("many") == 6
+        assert all(result.ok for result in results)
+
+    asyncio.run(run())
+
+
+def test_failed_login_does_not_stop_the_other_accounts():
+    async def run():
+        async with FakeEldomServer(eldom_devices=2) as server:
+            pool = AccountPool(login_interval=0)
+            pool.add_eldom_account(
+                EMAIL, PASSWORD, key="good", cookie_jar=_cookie_jar, base_url=server.url
+            )
+            pool.add_eldom_account(
+                EMAIL, "wrong", key="bad", cookie_jar=_cookie_jar, base_url=server.url
+            )
+            try:
+                errors = await pool.start()
+                assert list(errors) == ["bad"]
+                assert isinstance(errors["bad"], aiohttp.ClientResponseError)
+
+                devices = await pool.get_devices(["good"])
+                assert len(devices["good"]) == 2
+            finally:
+                await pool.close()
+
+    asyncio.run(run())
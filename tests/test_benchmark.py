@@ -0,0 +1,17 @@
+import asyncio
+
+from tests.benchmark import format_results, run_benchmarks
+
+
+def test_benchmarks_survive_injected_errors():
+    results = asyncio.run(run_benchmarks([4], error_rate=0.5, concurrency=4))
+
+    assert [result.scenario for result in results] == [
+        "eldom poll",
+        "eldom command",
+        "iot poll",
+        "iot command",
+    ]
+    assert all(result.operations == 4 for result in results)
+    assert sum(result.errors for result in results) > 0
+    assert "eldom poll" in format_results(results)
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from eldom.cli import main
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+@pytest.fixture
+def server_url():
+    loop = asyncio.new_event_loop()
+    server = FakeEldomServer(eldom_devices=4, iot_devices=4)
+    url = loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield url
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _run(capsys, *argv):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--username", EMAIL, "--password", PASSWORD, *argv])
+    lines = capsys.readouterr().out.splitlines()
+    return exit_info.value.code, [json.loads(line) for line in lines]
+
+
+def test_devices_and_poll(server_url, capsys):
+    status, devices = _run(capsys, "--base-url", server_url, "devices")
+    assert status == 0
+    assert len(devices) == 4
+
+    status, results = _run(capsys, "--base-url", server_url, "poll", "1", "unknown")
+    assert status == 1
+    assert {(record.get("device"), record["ok"]) for record in results} == {
+        ("1", True),
+        (None, False),
+    }
+
+
+def test_iot_set_state(server_url, capsys):
+    status, results = _run(
+        capsys, "--api", "iot", "--base-url", server_url, "set-state", "16", "Device 1"
+    )
+    assert status == 0
+    assert [record["ok"] for record in results] == [True]
+
+
+def test_iot_invalid_state_is_reported_clearly(server_url, capsys):
+    status, results = _run(
+        capsys, "--api", "iot", "--base-url", server_url, "set-state", "1", "Device 1"
+    )
+    assert status == 1
+    (record,) = results
+    assert record["error"].startswith("ValueError: Invalid state: 1.")
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from eldom.command_queue import CommandQueue
+
+
+def _recorder(sent):
+    def command(kind, value):
+        async def send():
+            sent.append((kind, value))
+            return value
+
+        return send
+
+    return command
+
+
+def test_latest_command_of_a_kind_wins():
+    async def run():
+        sent = []
+        command = _recorder(sent)
+        queue = CommandQueue(debounce=0.01)
+
+        results = await asyncio.gather(
+            queue.submit("a", "temperature", command("temperature", 20)),
+            queue.submit("a", "temperature", command("temperature", 21)),
+            queue.submit("a", "temperature", command("temperature", 22)),
+        )
+
+        assert sent == [("temperature", 22)]
+        assert results == [22, 22, 22]
+
+    asyncio.run(run())
+
+
+def test_commands_of_other_kinds_and_devices_are_all_sent():
+    async def run():
+        sent = []
+        command = _recorder(sent)
+        queue = CommandQueue()
+
+        await asyncio.gather(
+            queue.submit("a", "state", command("state", 1)),
+            queue.submit("a", "temperature", command("temperature", 50)),
+            queue.submit("b", "state", command("state", 0)),
+        )
+
+        assert sorted(sent) == [("state", 0), ("state", 1), ("temperature", 50)]
+
+    asyncio.run(run())
+
+
+def test_commands_to_a_device_are_sent_one_at_a_time():
+    async def run():
+        in_flight = 0
+        most_in_flight = 0
+
+        async def send():
+            nonlocal in_flight, most_in_flight
+            in_flight += 1
+            most_in_flight = max(most_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        queue = CommandQueue()
+        await asyncio.gather(*(queue.submit("a", kind, send) for kind in range(5)))
+        assert most_in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_failures_reach_every_submitter():
+    async def run():
+        async def send():
+            raise ValueError("rejected")
+
+        queue = CommandQueue(debounce=0.01)
+        results = await asyncio.gather(
+            queue.submit("a", "state", send),
+            queue.submit("a", "state", send),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(run())
+
+
+def test_rejects_negative_debounce():
+    with pytest.raises(ValueError):
+        CommandQueue(debounce=-1)
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from eldom.client import Client as EldomClient
+from eldom.credential_store import CredentialStore, FileCredentialStore
+from ioteldom.client import Client as IotClient, InvalidCredentialsError
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+async def _eldom_client(server, store):
+    session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+    return EldomClient(session, credential_store=store, base_url=server.url)
+
+
+def test_file_store_round_trip(tmp_path):
+    store = FileCredentialStore(str(tmp_path))
+    assert store.load("key") is None
+
+    store.save("key", {"token": "abc"})
+    assert store.load("key") == {"token": "abc"}
+
+    store.delete("key")
+    store.delete("key")
+    assert store.load("key") is None
+
+
+def test_incomplete_store_cannot_be_created():
+    class LoadOnlyStore(CredentialStore):
+        def load(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnlyStore()
+
+
+def test_eldom_restores_cookie_with_max_age(tmp_path):
+    async def run():
+        store = FileCredentialStore(str(tmp_path))
+        async with FakeEldomServer() as server:
+            async with await _eldom_client(server, store) as client:
+                await client.login(EMAIL, PASSWORD)
+            stored = store.load(client._credential_key)
+            assert stored["expiry"] is not None
+            assert stored["expiry"] > time.time()
+
+            async with await _eldom_client(server, store) as client:
+                await client.login(EMAIL, PASSWORD)
+                assert len(await client.get_devices()) == 8
+
+            assert server.requests["/Account/Login"] == 1
+
+    asyncio.run(run())
+
+
+def test_eldom_logs_in_again_when_restored_cookie_is_revoked(tmp_path):
+    async def run():
+        store = FileCredentialStore(str(tmp_path))
+        async with FakeEldomServer() as server:
+            async with await _eldom_client(server, store) as client:
+                await client.login(EMAIL, PASSWORD)
+            server.revoke_credentials()
+
+            async with await _eldom_client(server, store) as client:
+                await client.login(EMAIL, PASSWORD)
+                results = await asyncio.gather(*(client.get_devices() for _ in range(4)))
+                assert all(len(devices) == 8 for devices in results)
+                assert await client.is_connected()
+
+            assert server.requests["/Account/Login"] == 2
+
+    asyncio.run(run())
+
+
+def test_ioteldom_logs_in_again_when_stored_token_is_revoked(tmp_path):
+    async def run():
+        store = FileCredentialStore(str(tmp_path))
+        async with FakeEldomServer() as server:
+            async with aiohttp.ClientSession() as session:
+                client = IotClient(
+                    session, EMAIL, PASSWORD, credential_store=store, base_url=server.url
+                )
+                await client.get_user()
+            server.revoke_credentials()
+
+            async with aiohttp.ClientSession() as session:
+                client = IotClient(
+                    session, EMAIL, PASSWORD, credential_store=store, base_url=server.url
+                )
+                results = await asyncio.gather(*(client.get_user() for _ in range(4)))
+                assert all(user.email == EMAIL for user in results)
+
+            assert server.requests["/api/authenticate"] == 2
+
+    asyncio.run(run())
+
+
+def test_ioteldom_rejected_password_is_reported(tmp_path):
+    async def run():
+        async with FakeEldomServer() as server:
+            async with aiohttp.ClientSession() as session:
+                client = IotClient(session, EMAIL, "wrong", base_url=server.url)
+                with pytest.raises(InvalidCredentialsError):
+                    await client.is_connected()
+
+    asyncio.run(run())
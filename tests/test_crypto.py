@@ -0,0 +1,73 @@
+import base64
+import json
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from ioteldom import crypto
+from ioteldom.crypto import CryptoError, decrypt, decrypt_many, encrypt, encrypt_many
+
+_PAYLOADS = [
+    # Padded to one block.
+    b"",
+    b"{}",
+    b'{"a": 12345678}',
+    # Padded to two blocks, the second one all padding.
+    b'{"a": 123456789}',
+    # Many blocks.
+    json.dumps({"uuid": "0000000000000001", "temperatures": list(range(40))}).encode(),
+]
+
+
+@pytest.fixture(params=["pycryptodome", "cryptography"], autouse=True)
+def backend(request):
+    pytest.importorskip("Crypto" if request.param == "pycryptodome" else "cryptography")
+    previous = crypto._backend
+    crypto.use_backend(request.param)
+    yield request.param
+    crypto._backend = previous
+
+
+def _reference_encrypt(plaintext):
+    cipher = AES.new(crypto._key, AES.MODE_CBC, iv=crypto._init_vector)
+    return base64.b64encode(cipher.encrypt(pad(plaintext, 16))).decode("ascii")
+
+
+def test_encrypt_many_matches_cbc():
+    assert encrypt_many(_PAYLOADS) == [_reference_encrypt(payload) for payload in _PAYLOADS]
+    assert [encrypt(payload) for payload in _PAYLOADS] == encrypt_many(_PAYLOADS)
+    assert encrypt_many([]) == []
+
+
+def test_decrypt_many_matches_cbc():
+    payloads = [payload for payload in _PAYLOADS if payload]
+    ciphertexts = [_reference_encrypt(payload) for payload in payloads]
+
+    assert decrypt_many(ciphertexts) == [json.loads(payload) for payload in payloads]
+    assert decrypt(ciphertexts[-1]) == json.loads(payloads[-1])
+    assert decrypt_many([]) == []
+
+
+def test_round_trip_of_dicts():
+    payloads = [{}, {"cmd": "set_temp", "value": 21}, {"values": list(range(100))}]
+    assert decrypt_many(encrypt_many(payloads)) == payloads
+
+
+@pytest.mark.parametrize("ciphertext", ["not base64!", "QUJD", ""])
+def test_rejects_bad_ciphertexts(ciphertext):
+    with pytest.raises(CryptoError):
+        decrypt(ciphertext)
+
+
+def test_rejects_bad_padding():
+    cipher = AES.new(crypto._key, AES.MODE_CBC, iv=crypto._init_vector)
+    ciphertext = base64.b64encode(cipher.encrypt(b'{"a": 1}' + bytes(8))).decode("ascii")
+
+    with pytest.raises(CryptoError, match="padding"):
+        decrypt(ciphertext)
+
+
+def test_rejects_bad_json():
+    with pytest.raises(CryptoError, match="JSON"):
+        decrypt_many([_reference_encrypt(b"{}"), _reference_encrypt(b"not json")])
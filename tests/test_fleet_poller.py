@@ -0,0 +1,114 @@
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+from ioteldom.fleet_poller import _BATCH_INTERVAL, FleetPoller, _poll, shard_of
+from ioteldom.models import Device
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+class _Connection:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append((time.monotonic() - self.started, message))
+
+
+class _SlowClient:
+    def __init__(self, delays):
+        self.delays = delays
+
+    async def get_device_status(self, device):
+        await asyncio.sleep(self.delays[device.uuid])
+        return device.name
+
+
+def _device(index):
+    return Device(f"{index:016X}", "HTRCNV", "RH30NW", f"Device {index}", f"tok{index}")
+
+
+def test_finished_results_are_not_held_back_by_a_slow_device():
+    devices = [_device(0), _device(1)]
+    client = _SlowClient({devices[0].uuid: 0.0, devices[1].uuid: 0.5})
+    connection = _Connection()
+
+    asyncio.run(_poll(connection, client, devices, concurrency=2))
+
+    batches = [(sent, message) for sent, message in connection.messages if message[0] == "results"]
+    assert [[index for index, *_ in message[1]] for _, message in batches] == [[0], [1]]
+    assert batches[0][0] < 0.5 - _BATCH_INTERVAL
+    assert connection.messages[-1][1] == ("done",)
+
+
+def test_errors_are_sent_by_type_and_message():
+    class FailingClient:
+        async def get_device_status(self, device):
+            raise KeyError("missing")
+
+    connection = _Connection()
+    asyncio.run(_poll(connection, FailingClient(), [_device(0)], concurrency=1))
+
+    (_, (kind, batch)), _ = connection.messages
+    assert kind == "results"
+    assert batch == [(0, -1, None, ("KeyError", "'missing'"))]
+
+
+def test_shards_are_stable():
+    devices = [_device(index) for index in range(100)]
+    shards = [shard_of(device, 4) for device in devices]
+    assert shards == [shard_of(device, 4) for device in devices]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+@pytest.mark.parametrize("workers", [0, -1])
+def test_rejects_invalid_worker_counts(workers):
+    with pytest.raises(ValueError):
+        FleetPoller("user", "password", workers=workers)
+
+
+def test_polls_through_worker_processes():
+    async def run():
+        async with FakeEldomServer(iot_devices=6) as server:
+            devices = [Device(**device) for device in _device_fields(server)]
+            async with FleetPoller(EMAIL, PASSWORD, workers=2, base_url=server.url) as poller:
+                results = [result async for result in poller.poll(devices)]
+
+        assert sorted(result.device.uuid for result in results) == sorted(
+            device.uuid for device in devices
+        )
+        assert all(result.ok for result in results)
+
+    asyncio.run(run())
+
+
+def _device_fields(server):
+    for device in server.iot_devices.values():
+        yield {name: device[name] for name in ("uuid", "model", "fmodel", "name", "pairTok")}
+
+
+def test_results_are_not_read_on_the_default_executor():
+    class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self):
+            super().__init__(max_workers=1)
+            self.calls = []
+
+        def submit(self, fn, *args, **kwargs):
+            self.calls.append(getattr(fn, "__name__", fn))
+            return super().submit(fn, *args, **kwargs)
+
+    async def run():
+        default_executor = RecordingExecutor()
+        asyncio.get_running_loop().set_default_executor(default_executor)
+        async with FakeEldomServer(iot_devices=4) as server:
+            devices = [Device(**device) for device in _device_fields(server)]
+            async with FleetPoller(EMAIL, PASSWORD, workers=2, base_url=server.url) as poller:
+                results = [result async for result in poller.poll(devices)]
+
+        assert len(results) == 4
+        assert "recv" not in default_executor.calls
+
+    asyncio.run(run())
@@ -0,0 +1,15 @@
+from tests.benchmark import measure_import
+
+# Importing both clients, in seconds.
+IMPORT_BUDGET = 0.4
+
+
+def test_import_stays_within_budget():
+    # The best of a few runs, so a busy machine doesn't fail the test.
+    duration = min(measure_import()[0] for _ in range(3))
+    assert duration <= IMPORT_BUDGET, f"import took {duration * 1000:.1f} ms"
+
+
+def test_import_loads_no_lazy_modules():
+    _, loaded = measure_import()
+    assert loaded == []
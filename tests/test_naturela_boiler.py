@@ -0,0 +1,73 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from eldom.client import Client
+from eldom.constants import NATURELA_BOILER_DEVICE_TYPE
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+_STATUS_PATH = "/api/{kind}/{device_id}"
+
+
+def _run_with_boilers(test):
+    async def run():
+        async with FakeEldomServer(eldom_devices=8) as server:
+            session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+            async with Client(session, base_url=server.url) as client:
+                await client.login(EMAIL, PASSWORD)
+                devices = await client.get_devices()
+                boilers = [
+                    device.id
+                    for device in devices
+                    if device.deviceType == NATURELA_BOILER_DEVICE_TYPE
+                ]
+                await test(server, client.naturela_boiler, boilers)
+
+    asyncio.run(run())
+
+
+def test_settings_are_saved_in_one_request():
+    async def test(server, boiler, device_ids):
+        device_id = device_ids[0]
+        await boiler.update_naturela_boiler_settings(
+            device_id, ElSetTemp=61, TankMinTemp=41
+        )
+        assert server.eldom_details[device_id]["ElSetTemp"] == 61
+        assert server.eldom_details[device_id]["TankMinTemp"] == 41
+        assert server.requests["/api/boiler/save"] == 1
+
+        with pytest.raises(ValueError):
+            await boiler.update_naturela_boiler_settings(device_id, NotASetting=1)
+
+    _run_with_boilers(test)
+
+
+def test_snapshots_are_kept_only_when_reused():
+    async def test(server, boiler, device_ids):
+        device_id = device_ids[0]
+        await boiler.get_naturela_boiler_status(device_id)
+        await boiler.set_naturela_boiler_temperature(device_id, 60)
+        assert boiler._snapshots == {}
+
+        await boiler.update_naturela_boiler_settings(device_id, 60, ElSetTemp=62)
+        await boiler.update_naturela_boiler_settings(device_id, 60, TankMinTemp=42)
+        assert server.requests[_STATUS_PATH] == 3
+        assert server.eldom_details[device_id]["ElSetTemp"] == 62
+        assert server.eldom_details[device_id]["TankMinTemp"] == 42
+
+        await boiler.update_naturela_boiler_settings(device_id, ElSetTemp=63)
+        assert boiler._snapshots == {}
+
+    _run_with_boilers(test)
+
+
+def test_expired_snapshots_are_evicted():
+    async def test(server, boiler, device_ids):
+        first, second = device_ids
+        await boiler.update_naturela_boiler_settings(first, 0.01, ElSetTemp=60)
+        await asyncio.sleep(0.02)
+        await boiler.update_naturela_boiler_settings(second, 60, ElSetTemp=60)
+        assert list(boiler._snapshots) == [second]
+
+    _run_with_boilers(test)
@@ -0,0 +1,99 @@
+import math
+import os
+
+import pytest
+
+from eldom.models import FlatBoilerDetails, NaturelaBoilerDetails
+from eldom.recorder import TelemetryRecorder, _Column
+from ioteldom.models import ConvectorHeaterDetails
+from tests.fake_server import _sample
+
+
+def _status(model, index):
+    return model(**_sample(model, index))
+
+
+def test_records_only_numeric_fields(tmp_path):
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        recorder.record(1, _status(FlatBoilerDetails, 1), timestamp=1.0)
+
+        recorded = recorder.recorded_fields(1)
+        assert "SetTemp" in recorded
+        assert "EnergyD" in recorded
+        assert "Heater" in recorded
+        assert "DeviceID" not in recorded
+        assert "LastRefreshDate" not in recorded
+
+
+def test_records_iot_string_readings(tmp_path):
+    status = ConvectorHeaterDetails(**_sample(ConvectorHeaterDetails, 1))
+    status.T = "215"
+    status.TSet = "190"
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        recorder.record("AD5B221071124F28", status, timestamp=1.0)
+
+        assert "ID" not in recorder.recorded_fields("AD5B221071124F28")
+        assert list(recorder.query("AD5B221071124F28", "T")[1]) == [215.0]
+        assert list(recorder.query("AD5B221071124F28", "TSet")[1]) == [190.0]
+
+
+def test_query_range_and_reopen(tmp_path):
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        for index in range(5):
+            recorder.record("a", _status(FlatBoilerDetails, index), timestamp=10.0 + index)
+
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        recorder.record("a", _status(FlatBoilerDetails, 5), timestamp=15.0)
+        timestamps, values = recorder.query("a", "SetTemp", start=11.0, end=15.0)
+
+    assert list(timestamps) == [11.0, 12.0, 13.0, 14.0, 15.0]
+    assert list(values) == [21.0, 22.0, 23.0, 24.0, 25.0]
+
+
+def test_rejects_older_timestamps(tmp_path):
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        recorder.record(1, _status(FlatBoilerDetails, 0), timestamp=2.0)
+        with pytest.raises(ValueError):
+            recorder.record(1, _status(FlatBoilerDetails, 0), timestamp=1.0)
+
+
+def test_failed_append_leaves_no_partial_row(tmp_path, monkeypatch):
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        recorder.record(1, _status(FlatBoilerDetails, 0), timestamp=1.0)
+
+        reserve = _Column.reserve
+
+        def failing_reserve(column, rows):
+            if column.path.endswith("SetTemp.f64") and rows > 1:
+                raise OSError(24, "Too many open files")
+            reserve(column, rows)
+
+        monkeypatch.setattr(_Column, "reserve", failing_reserve)
+        # Grow past the first chunk, so every column has to be resized.
+        with pytest.raises(OSError):
+            for index in range(1, 5000):
+                recorder.record(1, _status(FlatBoilerDetails, index), timestamp=1.0 + index)
+        monkeypatch.setattr(_Column, "reserve", reserve)
+
+        rows = len(recorder.query(1, "_timestamp")[0])
+        for field in recorder.recorded_fields(1):
+            assert len(recorder.query(1, field)[1]) == rows
+
+    with TelemetryRecorder(str(tmp_path)) as recorder:
+        timestamps, values = recorder.query(1, "SetTemp")
+        assert len(timestamps) == len(values) == rows
+        assert not any(math.isnan(value) for value in values)
+
+
+def test_limits_open_columns(tmp_path):
+    recorder = TelemetryRecorder(str(tmp_path), max_open_columns=100)
+    for device in range(20):
+        recorder.record(device, _status(NaturelaBoilerDetails, device), timestamp=1.0)
+        assert recorder._open_columns <= 100 or len(recorder._series) == 1
+    recorder.close()
+
+    assert recorder._open_columns == 0
+    with TelemetryRecorder(str(tmp_path), max_open_columns=100) as recorder:
+        for device in range(20):
+            assert len(recorder.query(device, "ID")[0]) == 1
+    assert os.listdir(tmp_path)
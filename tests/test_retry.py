@@ -0,0 +1,145 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from eldom.client import Client
+from eldom.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+def _response_error(status, headers=None):
+    return aiohttp.ClientResponseError(None, (), status=status, headers=headers)
+
+
+def test_retry_policy_classifies_errors():
+    policy = RetryPolicy()
+    assert policy.is_transient(_response_error(503))
+    assert policy.is_transient(aiohttp.ServerDisconnectedError())
+    assert policy.is_transient(asyncio.TimeoutError())
+    assert not policy.is_transient(_response_error(404))
+    assert not policy.is_transient(ValueError())
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(base_delay=0.1, max_delay=1.0)
+    assert all(0 <= policy.delay(1) <= 0.1 for _ in range(100))
+    assert all(0 <= policy.delay(10) <= 1.0 for _ in range(100))
+    assert policy.delay(1, _response_error(429, {"Retry-After": "0.5"})) >= 0.5
+    assert policy.delay(1, _response_error(429, {"Retry-After": "60"})) <= 1.0
+
+
+def test_retry_policy_rejects_no_attempts():
+    with pytest.raises(ValueError):
+        RetryPolicy(attempts=0)
+
+
+def test_circuit_opens_after_threshold_and_probes_once(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("eldom.retry.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.before_call("a")
+    breaker.record_failure("a")
+    breaker.before_call("a")
+    breaker.record_failure("a")
+    assert breaker.is_open("a")
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("a")
+    breaker.before_call("b")
+
+    now += 10
+    breaker.before_call("a")
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("a")
+
+    breaker.record_success("a")
+    assert not breaker.is_open("a")
+    breaker.before_call("a")
+
+
+def test_failed_probe_opens_the_circuit_again(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("eldom.retry.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+
+    breaker.record_failure("a")
+    now += 10
+    breaker.before_call("a")
+    breaker.record_failure("a")
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("a")
+
+
+def test_calls_started_before_the_circuit_opened_do_not_end_the_probe(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("eldom.retry.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+
+    assert breaker.before_call("a") is False
+    assert breaker.before_call("a") is False
+    breaker.record_failure("a")
+
+    now += 10
+    assert breaker.before_call("a") is True
+    # The second call started before the circuit opened, and fails while the probe runs.
+    breaker.record_failure("a")
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("a")
+
+    breaker.release("a")
+    now += 10
+    assert breaker.before_call("a") is True
+
+
+def _client(server, **kwargs):
+    session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+    return Client(session, base_url=server.url, **kwargs)
+
+
+def test_reads_are_retried_on_transient_errors():
+    async def run():
+        async with FakeEldomServer(eldom_devices=8, error_rate=0.3) as server:
+            policy = RetryPolicy(attempts=10, base_delay=0.001)
+            async with _client(server, retry_policy=policy) as client:
+                await client.login(EMAIL, PASSWORD)
+                devices = await client.get_devices()
+                results = await client.poll_all(devices)
+            status_requests = sum(
+                count for path, count in server.requests.items() if "{kind}" in path
+            )
+        assert all(result.ok for result in results)
+        assert status_requests > len(devices)
+
+    asyncio.run(run())
+
+
+def test_writes_are_not_retried_unless_safe_writes_are_enabled():
+    async def run():
+        async with FakeEldomServer(eldom_devices=1, error_rate=1.0) as server:
+            policy = RetryPolicy(attempts=3, base_delay=0.001)
+            async with _client(server, retry_policy=policy) as client:
+                await client.login(EMAIL, PASSWORD)
+                (device,) = await client.get_devices()
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await client.set_device_temperature(device, 50)
+            writes = sum(count for path, count in server.requests.items() if "{action" in path)
+            assert writes == 1
+
+    asyncio.run(run())
+
+
+def test_circuit_breaker_fails_fast_for_a_failing_device():
+    async def run():
+        async with FakeEldomServer(eldom_devices=1, error_rate=1.0) as server:
+            breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+            async with _client(server, circuit_breaker=breaker) as client:
+                await client.login(EMAIL, PASSWORD)
+                (device,) = await client.get_devices()
+                for _ in range(2):
+                    with pytest.raises(aiohttp.ClientResponseError):
+                        await client.get_device_status(device)
+                with pytest.raises(CircuitOpenError):
+                    await client.get_device_status(device)
+
+    asyncio.run(run())
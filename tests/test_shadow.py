@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import aiohttp
+
+from eldom.client import Client
+from eldom.constants import FLAT_BOILER_DEVICE_TYPE
+from eldom.models import FlatBoilerDetails
+from eldom.shadow import DeviceShadow
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer, _sample
+
+
+def _status(**changes):
+    return FlatBoilerDetails(**{**_sample(FlatBoilerDetails, 0), **changes})
+
+
+def test_commands_apply_to_polled_devices_only():
+    shadow = DeviceShadow()
+    shadow.apply(1, {"SetTemp": 60})
+    assert shadow.get(1) is None
+
+    shadow.report(1, _status(SetTemp=50), time.monotonic())
+    shadow.apply(1, {"SetTemp": 60, "NotAField": 1})
+    assert shadow.get(1).SetTemp == 60
+    assert shadow.pending(1) == {"SetTemp": 60}
+    assert not shadow.is_confirmed(1)
+
+
+def test_poll_started_before_a_command_keeps_its_changes():
+    shadow = DeviceShadow()
+    shadow.report(1, _status(SetTemp=50), time.monotonic())
+
+    started = time.monotonic()
+    shadow.apply(1, {"SetTemp": 60}, confirmed=True)
+    shadow.report(1, _status(SetTemp=50, State=2), started)
+    assert shadow.get(1).SetTemp == 60
+    assert shadow.get(1).State == 2
+    assert shadow.is_confirmed(1)
+
+    shadow.report(1, _status(SetTemp=60), time.monotonic())
+    assert shadow.pending(1) == {}
+
+    shadow.forget(1)
+    assert shadow.get(1) is None
+
+
+def test_client_shadow_follows_polls_and_commands():
+    async def run():
+        async with FakeEldomServer(eldom_devices=4) as server:
+            session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+            async with Client(session, base_url=server.url, device_shadow=True) as client:
+                await client.login(EMAIL, PASSWORD)
+                devices = await client.get_devices()
+                (device,) = [d for d in devices if d.deviceType == FLAT_BOILER_DEVICE_TYPE]
+                assert client.get_device_shadow(device) is None
+
+                await client.poll_all(devices)
+                assert client.get_device_shadow(device) is not None
+
+                await client.set_device_temperature(device, 65)
+                assert client.get_device_shadow(device).SetTemp == 65
+                assert server.eldom_details[device.id]["SetTemp"] == 65
+
+    asyncio.run(run())
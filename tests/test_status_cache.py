@@ -0,0 +1,142 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from eldom.client import Client
+from eldom.status_cache import StatusCache
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+def test_concurrent_reads_share_one_fetch():
+    async def run():
+        cache = StatusCache(0)
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        assert await asyncio.gather(*(cache.get("key", fetch) for _ in range(10))) == [1] * 10
+        # Without a TTL, the next read fetches again.
+        assert await cache.get("key", fetch) == 2
+
+    asyncio.run(run())
+
+
+def test_values_are_cached_for_the_ttl():
+    async def run():
+        cache = StatusCache(60)
+        values = iter(range(10))
+
+        async def fetch():
+            return next(values)
+
+        assert await cache.get("key", fetch) == 0
+        assert await cache.get("key", fetch) == 0
+        assert await cache.get("other", fetch) == 1
+
+        cache.invalidate("key")
+        assert await cache.get("key", fetch) == 2
+        cache.clear()
+        assert await cache.get("other", fetch) == 3
+
+    asyncio.run(run())
+
+
+def test_failures_are_not_cached():
+    async def run():
+        cache = StatusCache(60)
+        attempts = 0
+
+        async def fetch():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise ValueError("failed")
+            return "ok"
+
+        with pytest.raises(ValueError):
+            await cache.get("key", fetch)
+        assert await cache.get("key", fetch) == "ok"
+
+    asyncio.run(run())
+
+
+def test_invalidated_fetch_does_not_fill_the_cache():
+    async def run():
+        cache = StatusCache(60)
+        release = asyncio.Event()
+
+        async def stale_fetch():
+            await release.wait()
+            return "stale"
+
+        async def fresh_fetch():
+            return "fresh"
+
+        stale = asyncio.ensure_future(cache.get("key", stale_fetch))
+        await asyncio.sleep(0)
+        cache.invalidate("key")
+        assert await cache.get("key", fresh_fetch) == "fresh"
+
+        release.set()
+        assert await stale == "stale"
+        assert await cache.get("key", stale_fetch) == "fresh"
+
+    asyncio.run(run())
+
+
+def test_cancelled_reader_does_not_cancel_the_shared_fetch():
+    async def run():
+        cache = StatusCache(0)
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return "value"
+
+        first = asyncio.ensure_future(cache.get("key", fetch))
+        second = asyncio.ensure_future(cache.get("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "value"
+
+    asyncio.run(run())
+
+
+def test_client_coalesces_concurrent_status_reads():
+    async def run():
+        async with FakeEldomServer(eldom_devices=1, latency=0.02) as server:
+            session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+            async with Client(session, base_url=server.url, status_cache_ttl=0) as client:
+                await client.login(EMAIL, PASSWORD)
+                (device,) = await client.get_devices()
+                statuses = await asyncio.gather(
+                    *(client.get_device_status(device) for _ in range(10))
+                )
+            assert len({id(status) for status in statuses}) == 1
+            assert server.requests["/api/{kind}/{device_id}"] == 1
+
+    asyncio.run(run())
+
+
+def test_failed_write_invalidates_the_cached_status():
+    async def run():
+        async with FakeEldomServer(eldom_devices=1) as server:
+            session = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+            async with Client(session, base_url=server.url, status_cache_ttl=60) as client:
+                await client.login(EMAIL, PASSWORD)
+                (device,) = await client.get_devices()
+                await client.get_device_status(device)
+
+                server.error_rate = 1.0
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await client.set_device_temperature(device, 50)
+                server.error_rate = 0.0
+
+                await client.get_device_status(device)
+            assert server.requests["/api/{kind}/{device_id}"] == 2
+
+    asyncio.run(run())
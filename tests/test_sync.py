@@ -0,0 +1,106 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from eldom.sync import SyncClient, _LoopThread, _SyncIterator, _SyncProxy
+from ioteldom.client import Client
+from ioteldom.models import ConvectorHeaterDetails
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+@pytest.fixture
+def server():
+    # The server runs on its own loop thread, so that the blocking calls can wait for it.
+    server_thread = _LoopThread()
+    server = FakeEldomServer(iot_devices=4)
+    server_thread.run(server.start())
+    yield server
+    server_thread.run(server.stop())
+    server_thread.stop()
+
+
+def _sync_client(server, **kwargs):
+    return SyncClient(Client.create(EMAIL, PASSWORD, base_url=server.url), **kwargs)
+
+
+def test_concurrent_callers_share_one_login(server):
+    with _sync_client(server) as client:
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            users = list(executor.map(lambda _: client.get_user(), range(16)))
+            devices = list(executor.map(lambda _: client.get_devices(), range(16)))
+
+    assert all(user.email == EMAIL for user in users)
+    assert all(len(result) == 4 for result in devices)
+    assert server.requests["/api/authenticate"] == 1
+
+
+def test_device_clients_are_proxies(server):
+    with _sync_client(server) as client:
+        device = client.get_devices()[0]
+        convector_heater = client.convector_heater
+
+        assert isinstance(convector_heater, _SyncProxy)
+        assert client.convector_heater is convector_heater
+        status = convector_heater.get_convector_heater_status(device)
+        assert isinstance(status, ConvectorHeaterDetails)
+        assert server.requests["/api/direct-req"] == 1
+
+
+def test_watch_is_a_blocking_iterator(server):
+    with _sync_client(server) as client:
+        devices = client.get_devices()
+        with client.watch(devices, interval=0.05) as changes:
+            assert isinstance(changes, _SyncIterator)
+            first = [next(changes) for _ in devices]
+
+    assert sorted(change.device.uuid for change in first) == sorted(device.uuid for device in devices)
+    assert all(change.ok and change.changes for change in first)
+
+
+def test_timeout_cancels_the_call():
+    cancelled = threading.Event()
+
+    class SlowClient:
+        async def wait(self):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def close(self):
+            pass
+
+    async def create():
+        return SlowClient()
+
+    with SyncClient(create, timeout=0.1) as client:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            client.wait()
+        assert cancelled.wait(1)
+
+
+def test_close_stops_the_loop_thread(server):
+    client = _sync_client(server)
+    client.get_user()
+    loop_thread = client._loop_thread
+
+    client.close()
+    client.close()
+
+    assert not loop_thread._thread.is_alive()
+    assert client.loop.is_closed()
+    assert client.client.session.closed
+
+
+def test_blocking_calls_from_the_loop_thread_are_rejected(server):
+    with _sync_client(server) as client:
+        future = asyncio.run_coroutine_threadsafe(_call_get_user(client), client.loop)
+        with pytest.raises(RuntimeError):
+            future.result(1)
+
+
+async def _call_get_user(client):
+    return client.get_user()
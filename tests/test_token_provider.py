@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import aiohttp
+import jwt
+
+from eldom.credential_store import CredentialStore
+from ioteldom.token_provider import TokenProvider, get_token_expiry, is_token_expired
+from tests.fake_server import EMAIL, PASSWORD, FakeEldomServer
+
+
+class _MemoryStore(CredentialStore):
+    def __init__(self):
+        self.credentials = {}
+
+    def load(self, key):
+        return self.credentials.get(key)
+
+    def save(self, key, credentials):
+        self.credentials[key] = credentials
+
+    def delete(self, key):
+        self.credentials.pop(key, None)
+
+
+def test_token_expiry():
+    token = jwt.encode({"exp": 2_000_000_000}, "secret-of-32-bytes-at-least-long")
+    assert get_token_expiry(token) == 2_000_000_000
+    assert not is_token_expired(token)
+    assert get_token_expiry("not a token") is None
+    assert is_token_expired("not a token")
+
+
+def test_concurrent_callers_share_one_login():
+    async def run():
+        async with FakeEldomServer(latency=0.05) as server:
+            async with aiohttp.ClientSession() as session:
+                provider = TokenProvider(session, EMAIL, PASSWORD, base_url=server.url)
+                tokens = await asyncio.gather(*(provider.provide() for _ in range(20)))
+                assert len(set(tokens)) == 1
+                assert await provider.provide() == tokens[0]
+            assert server.requests["/api/authenticate"] == 1
+
+    asyncio.run(run())
+
+
+def test_token_is_refreshed_in_the_background_before_it_expires():
+    async def run():
+        async with FakeEldomServer(token_lifetime=30) as server:
+            async with aiohttp.ClientSession() as session:
+                provider = TokenProvider(
+                    session, EMAIL, PASSWORD, refresh_margin=60, base_url=server.url
+                )
+                first = await provider.provide()
+                # Still valid, so it is returned while a new one is fetched.
+                assert await provider.provide() == first
+                await provider._login_task
+                assert provider.token != first
+            assert server.requests["/api/authenticate"] == 2
+
+    asyncio.run(run())
+
+
+def test_stored_token_is_reused():
+    async def run():
+        store = _MemoryStore()
+        async with FakeEldomServer() as server:
+            async with aiohttp.ClientSession() as session:
+                provider = TokenProvider(
+                    session, EMAIL, PASSWORD, credential_store=store, base_url=server.url
+                )
+                token = await provider.provide()
+
+                restarted = TokenProvider(
+                    session, EMAIL, PASSWORD, credential_store=store, base_url=server.url
+                )
+                assert await restarted.provide() == token
+            assert server.requests["/api/authenticate"] == 1
+
+    asyncio.run(run())
+
+
+def test_expired_stored_token_is_ignored():
+    async def run():
+        store = _MemoryStore()
+        async with FakeEldomServer() as server:
+            async with aiohttp.ClientSession() as session:
+                provider = TokenProvider(
+                    session, EMAIL, PASSWORD, credential_store=store, base_url=server.url
+                )
+                store.save(provider._credential_key, {"token": "old", "expiry": time.time() - 1})
+                assert await provider.provide() != "old"
+
+    asyncio.run(run())